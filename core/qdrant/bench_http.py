@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-request overhead of bare requests.post vs the pooled http_client session.
+
+기본은 프로세스 안에 Ollama /api/embeddings 흉내를 내는 stub 서버를 띄워 네트워크/모델 시간을 빼고
+HTTP 연결 비용만 비교한다. --url을 주면 실제 Ollama에 같은 요청을 보낸다.
+--check-retry는 stub 서버로 공유 세션의 재시도 정책(응답 도중 끊긴 연결은 재시도, read timeout은 재시도 안 함)을 확인한다.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from bench_payload_index import percentile
+from http_client import DEFAULT_POOL_SIZE, DEFAULT_RETRIES, build_session
+
+STUB_DIM = 1024
+# --check-retry: /slow는 이 시간만큼 늦게 응답하고, 클라이언트 read timeout은 그보다 짧게 둔다
+SLOW_RESPONSE_SEC = 1.0
+CHECK_READ_TIMEOUT = 0.3
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive 허용 (HTTP/1.0이면 매 요청 연결 종료)
+    # 헤더/본문을 따로 write하므로 Nagle이 켜져 있으면 keep-alive 연결에서 delayed ACK(~40ms)에 걸린다.
+    disable_nagle_algorithm = True
+    connections = 0
+    _count_lock = threading.Lock()
+    _body = json.dumps({"embedding": [0.0] * STUB_DIM}).encode("utf-8")
+
+    def setup(self) -> None:
+        super().setup()
+        with StubHandler._count_lock:
+            StubHandler.connections += 1
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._reply()
+
+    def _reply(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self._body)))
+        self.end_headers()
+        self.wfile.write(self._body)
+
+
+class RetryStubHandler(StubHandler):
+    """
+    /reset: 첫 요청은 상태줄 일부만 보내고 연결을 닫는다(풀에 남아 있던 연결이 서버 쪽에서 끊긴 경우), 이후 요청은 정상 응답.
+    /slow: SLOW_RESPONSE_SEC 뒤에 응답 (클라이언트 read timeout 유발).
+    """
+
+    attempts: Dict[str, int] = {}
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with StubHandler._count_lock:
+            attempt = RetryStubHandler.attempts.get(self.path, 0) + 1
+            RetryStubHandler.attempts[self.path] = attempt
+        if self.path == "/reset" and attempt == 1:
+            self.wfile.write(b"HTTP/1.1 20")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if self.path == "/slow":
+            time.sleep(SLOW_RESPONSE_SEC)
+        try:
+            self._reply()
+        except (BrokenPipeError, ConnectionResetError):  # /slow: 클라이언트가 timeout으로 이미 끊음
+            self.close_connection = True
+
+
+def start_stub(handler: type[BaseHTTPRequestHandler] = StubHandler) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def check_retry(retries: int) -> int:
+    """공유 세션 재시도 정책 확인. 기대와 다르면 1을 돌려준다."""
+    server, url = start_stub(RetryStubHandler)
+    session = build_session(retries=retries, backoff=0)
+    failures = 0
+    try:
+        try:
+            outcome = str(session.post(f"{url}/reset", json={}, timeout=5).status_code)
+        except requests.RequestException as exc:
+            outcome = type(exc).__name__
+        ok = outcome == "200" and RetryStubHandler.attempts["/reset"] == 2
+        failures += not ok
+        print(
+            f"[CHECK] closed mid-response: {outcome} "
+            f"attempts={RetryStubHandler.attempts['/reset']} (expect 200, 2) {'OK' if ok else 'FAIL'}"
+        )
+
+        try:
+            session.post(f"{url}/slow", json={}, timeout=CHECK_READ_TIMEOUT)
+            outcome = "no timeout"
+        except requests.exceptions.ReadTimeout:
+            outcome = "ReadTimeout"
+        except requests.RequestException as exc:
+            outcome = type(exc).__name__
+        # 재시도됐다면 그 요청이 서버에 도착할 시간까지 기다린 뒤 센다
+        time.sleep(CHECK_READ_TIMEOUT * (retries + 1))
+        ok = outcome == "ReadTimeout" and RetryStubHandler.attempts["/slow"] == 1
+        failures += not ok
+        print(
+            f"[CHECK] read timeout: {outcome} attempts={RetryStubHandler.attempts['/slow']} "
+            f"(expect ReadTimeout, 1) {'OK' if ok else 'FAIL'}"
+        )
+    finally:
+        session.close()
+        server.shutdown()
+    print(f"[DONE] retry check {'passed' if not failures else f'failed ({failures})'}")
+    return 1 if failures else 0
+
+
+def measure(post, url: str, payload: dict, count: int) -> List[float]:
+    samples: List[float] = []
+    for _ in range(count):
+        start = time.perf_counter()
+        resp = post(f"{url}/api/embeddings", json=payload, timeout=60)
+        resp.raise_for_status()
+        resp.json()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare per-request overhead: requests.post vs pooled session.")
+    parser.add_argument("--url", help="실제 Ollama URL (없으면 내장 stub 서버 사용)")
+    parser.add_argument("--model", default="snowflake-arctic-embed2", help="--url 사용 시 임베딩 모델")
+    parser.add_argument("--requests", type=int, default=500, help="모드별 요청 수")
+    parser.add_argument("--warmup", type=int, default=20, help="측정 전 버리는 요청 수")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--out-json", type=Path, help="결과 JSON 저장 경로")
+    parser.add_argument("--check-retry", action="store_true", help="벤치마크 대신 stub 서버로 재시도 정책만 확인")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="--check-retry 재시도 횟수")
+    args = parser.parse_args(argv)
+    if args.check_retry:
+        return check_retry(args.retries)
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_stub()
+    url = url.rstrip("/")
+    payload = {"model": args.model, "prompt": "CSR 값은?"}
+
+    session = build_session(pool_size=args.pool_size)
+    modes: Dict[str, object] = {"requests.post": requests.post, "pooled_session": session.post}
+    results = []
+    try:
+        for name, post in modes.items():
+            measure(post, url, payload, args.warmup)
+            before = StubHandler.connections
+            samples = measure(post, url, payload, args.requests)
+            row = {
+                "mode": name,
+                "requests": len(samples),
+                "mean_ms": statistics.fmean(samples),
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                # 실제 Ollama를 대상으로 할 때는 서버 측 연결 수를 알 수 없다.
+                "connections": StubHandler.connections - before if server else None,
+            }
+            results.append(row)
+            conns = f" connections={row['connections']}" if server else ""
+            print(
+                f"[BENCH] mode={name:<15} mean={row['mean_ms']:.3f}ms "
+                f"p50={row['p50_ms']:.3f}ms p95={row['p95_ms']:.3f}ms{conns}"
+            )
+    finally:
+        session.close()
+        if server:
+            server.shutdown()
+
+    base, pooled = results
+    print(f"[BENCH] per-request saving mean={base['mean_ms'] - pooled['mean_ms']:.3f}ms "
+          f"({1 - pooled['mean_ms'] / base['mean_ms']:.1%})")
+    if args.out_json:
+        args.out_json.parent.mkdir(parents=True, exist_ok=True)
+        args.out_json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print("[DONE] http benchmark")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Benchmark placeholder resolution latency with vs without keyword payload indexes.
+
+같은 합성 포인트를 index 있는/없는 두 컬렉션에 단계적으로 채우면서, 각 크기에서
+qdrant_qa.fetch_placeholder_payload(id + image_link 필터 scroll) 지연을 측정한다.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from qdrant_ingest import DEFAULT_PAYLOAD_INDEXES, ensure_collection
+from qdrant_qa import fetch_placeholder_payload
+
+DEFAULT_SIZES = "1000,5000,20000"
+UPSERT_BATCH = 512
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def synthetic_payload(i: int) -> Dict[str, object]:
+    # finalize 산출물과 비슷하게 테이블 base/행/요약 + 텍스트 레코드를 섞는다.
+    doc = i // 500
+    kind = i % 4
+    if kind == 0:
+        pid, rtype = f"TB_STR_{i:06d}", "table_str"
+    elif kind == 1:
+        pid, rtype = f"TB_STR_{i - 1:06d}#1", "table_str"
+    elif kind == 2:
+        pid, rtype = f"IMG_SUM_{i:06d}", "image_sum"
+    else:
+        pid, rtype = f"TEXT_{i:06d}", "text"
+    return {
+        "id": pid,
+        "record_type": rtype,
+        "filename": f"TP-030-{doc:03d}-010 bench",
+        "image_link": f"components/bench_{i:06d}.png",
+        "text": f"bench record {i}",
+    }
+
+
+def fill(client: QdrantClient, collections: List[str], start: int, stop: int, dim: int, rng: random.Random) -> None:
+    for batch_start in range(start, stop, UPSERT_BATCH):
+        idx = range(batch_start, min(batch_start + UPSERT_BATCH, stop))
+        batch = qmodels.Batch(
+            ids=[str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench||{i}")) for i in idx],
+            vectors={"dense": [[rng.random() for _ in range(dim)] for _ in idx]},
+            payloads=[synthetic_payload(i) for i in idx],
+        )
+        for name in collections:
+            client.upsert(collection_name=name, points=batch, wait=True)
+
+
+def measure(client: QdrantClient, collection: str, size: int, lookups: int, rng: random.Random) -> List[float]:
+    samples: List[float] = []
+    for _ in range(lookups):
+        payload = synthetic_payload(rng.randrange(size))
+        start = time.monotonic()
+        fetch_placeholder_payload(client, collection, str(payload["id"]), str(payload["image_link"]))
+        samples.append((time.monotonic() - start) * 1000)
+    return samples
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare placeholder lookup latency with/without payload indexes.")
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--collection-prefix", default="bench_payload", help="임시 컬렉션 접두어")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"측정할 컬렉션 크기 목록 (기본: {DEFAULT_SIZES})")
+    parser.add_argument("--lookups", type=int, default=200, help="크기별 placeholder 조회 횟수")
+    parser.add_argument("--dim", type=int, default=64, help="합성 벡터 차원 (필터 조회에는 영향 거의 없음)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-json", type=Path, help="결과 JSON 저장 경로")
+    parser.add_argument("--keep", action="store_true", help="측정 후 임시 컬렉션을 지우지 않음")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    client = QdrantClient(url=args.qdrant_url)
+    plain = f"{args.collection_prefix}_noindex"
+    indexed = f"{args.collection_prefix}_index"
+    for name in (plain, indexed):
+        if client.collection_exists(name):
+            client.delete_collection(name)
+    ensure_collection(client, plain, args.dim, payload_indexes=())
+    ensure_collection(client, indexed, args.dim, payload_indexes=DEFAULT_PAYLOAD_INDEXES)
+
+    rng = random.Random(args.seed)
+    results: List[Dict[str, object]] = []
+    filled = 0
+    try:
+        for size in sizes:
+            fill(client, [plain, indexed], filled, size, args.dim, rng)
+            filled = size
+            for name, has_index in ((plain, False), (indexed, True)):
+                # 조회 ID 순서는 두 컬렉션에서 동일하게
+                samples = measure(client, name, size, args.lookups, random.Random(args.seed + size))
+                row = {
+                    "size": size,
+                    "payload_index": has_index,
+                    "lookups": len(samples),
+                    "mean_ms": statistics.fmean(samples),
+                    "p50_ms": percentile(samples, 50),
+                    "p95_ms": percentile(samples, 95),
+                }
+                results.append(row)
+                print(
+                    f"[BENCH] size={size:>7} index={'on ' if has_index else 'off'} "
+                    f"mean={row['mean_ms']:.2f}ms p50={row['p50_ms']:.2f}ms p95={row['p95_ms']:.2f}ms"
+                )
+    finally:
+        if not args.keep:
+            for name in (plain, indexed):
+                client.delete_collection(name)
+
+    if args.out_json:
+        args.out_json.parent.mkdir(parents=True, exist_ok=True)
+        args.out_json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[DONE] payload index benchmark ({len(results)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Retrieval-only benchmark: search latency and recall@k per collection and query-time setting.
+
+QA CSV sweep은 검색과 생성 시간을 합친 wall time만 남긴다. 여기서는 질문 CSV를 한 번만 임베딩한 뒤
+컬렉션 × 검색 설정(서버 기본 / hnsw_ef=N / exact / 로컬 exact)마다 같은 질문으로 검색만 반복해
+p50/p95/p99 지연과 exact 검색 대비 recall@k를 JSON + 요약 표로 남긴다.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from bench_payload_index import percentile
+from embed_cache import DEFAULT_CACHE_PATH, REPO_ROOT, EmbeddingCache
+from http_client import add_http_args, configure_from_args
+from local_index import LocalIndex, default_index_dir, recall_at_k
+from qa_cache import collection_fingerprint
+from qdrant_ingest import (
+    DEFAULT_COLLECTION,
+    DEFAULT_GRPC_PORT,
+    EMBED_DENSE_ENDPOINT,
+    connect_qdrant,
+    embed_dense,
+    query_dims_from_metadata,
+    truncate_embedding,
+)
+
+DEFAULT_SETTINGS = "default,exact,32,64,128,256"
+DEFAULT_RECALL_K = "1,3,7"
+DEFAULT_OUT_JSON = REPO_ROOT / "logs" / "bench_retrieval.json"
+DEFAULT_OUT_TABLE = REPO_ROOT / "logs" / "bench_retrieval.md"
+# exact 정답: 양자화 컬렉션도 원본 벡터로 전수 비교
+EXACT_PARAMS = qmodels.SearchParams(exact=True, quantization=qmodels.QuantizationSearchParams(ignore=True))
+
+
+def parse_settings(value: str) -> List[str]:
+    """default | exact | local | 정수(hnsw_ef) 목록."""
+    settings = []
+    for token in (t.strip().lower() for t in value.split(",") if t.strip()):
+        if token not in ("default", "exact", "local"):
+            try:
+                if int(token) < 1:
+                    raise ValueError
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"setting must be default, exact, local or a positive hnsw_ef: {token}")
+        settings.append(token)
+    return settings
+
+
+def parse_int_list(value: str) -> List[int]:
+    try:
+        values = [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"comma-separated integers expected: {value}")
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError(f"positive integers expected: {value}")
+    return values
+
+
+def setting_params(setting: str) -> Optional[qmodels.SearchParams]:
+    if setting == "default":
+        return None
+    if setting == "exact":
+        return EXACT_PARAMS
+    return qmodels.SearchParams(hnsw_ef=int(setting))
+
+
+def read_questions(path: Path, question_col: str) -> List[str]:
+    with path.open(newline="", encoding="utf-8-sig") as f:
+        return [q for q in ((row.get(question_col) or "").strip() for row in csv.DictReader(f)) if q]
+
+
+def collection_embed_config(client: QdrantClient, collection: str, default_model: str) -> tuple[str, Optional[int]]:
+    """ingest가 컬렉션 메타데이터에 남긴 embed_model/embed_dims. 없으면 --embed-model, 절단 없음."""
+    info = client.get_collection(collection)
+    metadata = getattr(info.config, "metadata", None) or {}
+    return metadata.get("embed_model") or default_model, query_dims_from_metadata(metadata)
+
+
+def embed_questions(
+    questions: List[str], model: str, url: str, cache: Optional[EmbeddingCache]
+) -> List[List[float]]:
+    cached = cache.get_many(model, questions, EMBED_DENSE_ENDPOINT) if cache else [None] * len(questions)
+    vectors = []
+    for question, vec in zip(questions, cached):
+        if vec is None:
+            vec = embed_dense(question, model, url)
+            if cache:
+                cache.put(model, question, vec, EMBED_DENSE_ENDPOINT)
+        vectors.append(vec)
+    return vectors
+
+
+def exact_truth(
+    client: QdrantClient,
+    collection: str,
+    vectors: List[List[float]],
+    top_k: int,
+    mode: str,
+) -> tuple[List[List[str]], str]:
+    """recall 정답 top_k point id. local 인덱스가 최신(지문 일치)이면 그것을, 아니면 Qdrant exact 검색을 쓴다."""
+    if mode in ("auto", "local"):
+        index_dir = default_index_dir(collection)
+        if (index_dir / "meta.json").exists():
+            index = LocalIndex(index_dir)
+            if index.fingerprint == collection_fingerprint(client, collection):
+                return index.ground_truth(vectors, top_k), "local"
+            print(f"[WARN] local index {index_dir} is stale for '{collection}', using Qdrant exact search")
+        elif mode == "local":
+            print(f"[WARN] local index {index_dir} not found, using Qdrant exact search")
+    truth = [
+        [
+            str(p.id)
+            for p in client.query_points(
+                collection_name=collection, query=vec, using="dense", limit=top_k, search_params=EXACT_PARAMS
+            ).points
+        ]
+        for vec in vectors
+    ]
+    return truth, "qdrant_exact"
+
+
+def run_setting(
+    client: QdrantClient,
+    collection: str,
+    setting: str,
+    vectors: List[List[float]],
+    top_k: int,
+    repeats: int,
+    warmup: int,
+) -> tuple[List[float], List[List[str]]]:
+    """(검색 지연 ms 샘플, 첫 반복의 질문별 결과 id)."""
+    if setting == "local":
+        index = LocalIndex(default_index_dir(collection))
+
+        def search(vec: List[float]) -> List[str]:
+            return [p["id"] for p in index.search(vec, top_k)]
+    else:
+        params = setting_params(setting)
+
+        def search(vec: List[float]) -> List[str]:
+            points = client.query_points(
+                collection_name=collection, query=vec, using="dense", limit=top_k, with_payload=True, search_params=params
+            ).points
+            return [str(p.id) for p in points]
+
+    for vec in vectors[:warmup]:
+        search(vec)
+    samples: List[float] = []
+    retrieved: List[List[str]] = []
+    for rep in range(repeats):
+        for vec in vectors:
+            start = time.perf_counter()
+            ids = search(vec)
+            samples.append((time.perf_counter() - start) * 1000)
+            if rep == 0:
+                retrieved.append(ids)
+    return samples, retrieved
+
+
+def format_table(results: List[Dict[str, object]], recall_ks: List[int]) -> str:
+    header = ["collection", "setting", "p50_ms", "p95_ms", "p99_ms", *[f"recall@{k}" for k in recall_ks]]
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("---" for _ in header) + "|"]
+    for row in results:
+        cells = [
+            str(row["collection"]),
+            str(row["setting"]),
+            f"{row['p50_ms']:.2f}",
+            f"{row['p95_ms']:.2f}",
+            f"{row['p99_ms']:.2f}",
+            *[f"{row['recall'][str(k)]:.4f}" for k in recall_ks],
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Retrieval-only benchmark: latency percentiles and recall@k vs exact search.")
+    parser.add_argument("--csv", type=Path, default=REPO_ROOT / "input.csv", help="질문 CSV (기본: input.csv)")
+    parser.add_argument("--question-col", default="question", help="질문 컬럼명")
+    parser.add_argument(
+        "--collections",
+        type=lambda v: [c.strip() for c in v.split(",") if c.strip()],
+        default=[DEFAULT_COLLECTION],
+        help=f"비교할 컬렉션 목록 (쉼표 구분, 기본: {DEFAULT_COLLECTION})",
+    )
+    parser.add_argument(
+        "--settings",
+        type=parse_settings,
+        default=parse_settings(DEFAULT_SETTINGS),
+        help=(
+            "검색 설정 목록: default(서버 기본 ef), exact(전수 검색), 정수(hnsw_ef), "
+            f"local(export된 로컬 인덱스 exact) (기본: {DEFAULT_SETTINGS})"
+        ),
+    )
+    parser.add_argument("--top-k", type=int, default=7, help="검색 limit (recall-k 최대값보다 작으면 올림)")
+    parser.add_argument("--recall-k", type=parse_int_list, default=parse_int_list(DEFAULT_RECALL_K), help=f"recall@k 목록 (기본: {DEFAULT_RECALL_K})")
+    parser.add_argument("--repeats", type=int, default=3, help="설정마다 질문 전체를 반복 검색하는 횟수 (지연 샘플 수 = 질문 수 × repeats)")
+    parser.add_argument("--warmup", type=int, default=10, help="설정마다 측정 전에 버리는 검색 수")
+    parser.add_argument(
+        "--ground-truth",
+        choices=("auto", "qdrant", "local"),
+        default="auto",
+        help="recall 정답: auto는 최신 로컬 인덱스가 있으면 그것, 없으면 Qdrant exact 검색",
+    )
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--ollama-url", default=os.environ.get("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--prefer-grpc", action="store_true", help="Qdrant gRPC 전송 사용 (기본: REST)")
+    parser.add_argument("--grpc-port", type=int, default=DEFAULT_GRPC_PORT)
+    parser.add_argument("--embed-model", default="snowflake-arctic-embed2", help="컬렉션 메타데이터에 모델이 없을 때 쓸 임베딩 모델")
+    parser.add_argument("--embed-cache", type=Path, default=DEFAULT_CACHE_PATH, help="질문 임베딩 캐시 sqlite 경로")
+    parser.add_argument("--no-embed-cache", action="store_true", help="임베딩 캐시를 사용하지 않음")
+    parser.add_argument("--out-json", type=Path, default=DEFAULT_OUT_JSON, help=f"결과 JSON (기본: {DEFAULT_OUT_JSON})")
+    parser.add_argument("--out-table", type=Path, default=DEFAULT_OUT_TABLE, help=f"요약 표 markdown (기본: {DEFAULT_OUT_TABLE})")
+    add_http_args(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    if args.repeats < 1:
+        parser.error("--repeats must be >= 1")
+    top_k = max(args.top_k, *args.recall_k)
+
+    questions = read_questions(args.csv, args.question_col)
+    if not questions:
+        raise SystemExit(f"No questions in {args.csv} (column '{args.question_col}')")
+    client = connect_qdrant(args.qdrant_url, args.prefer_grpc, args.grpc_port)
+    cache = None if args.no_embed_cache else EmbeddingCache(args.embed_cache)
+
+    results: List[Dict[str, object]] = []
+    full_vectors: Dict[str, List[List[float]]] = {}
+    try:
+        for collection in args.collections:
+            model, dims = collection_embed_config(client, collection, args.embed_model)
+            if model not in full_vectors:
+                start = time.monotonic()
+                full_vectors[model] = embed_questions(questions, model, args.ollama_url, cache)
+                print(f"[INFO] embedded {len(questions)} questions with {model} ({time.monotonic() - start:.2f}s)")
+            vectors = [truncate_embedding(vec, dims) for vec in full_vectors[model]]
+            truth, truth_source = exact_truth(client, collection, vectors, top_k, args.ground_truth)
+            for setting in args.settings:
+                if setting == "local" and not (default_index_dir(collection) / "meta.json").exists():
+                    print(f"[WARN] skip setting=local for '{collection}': no local index (ingest --export-local-index)")
+                    continue
+                samples, retrieved = run_setting(client, collection, setting, vectors, top_k, args.repeats, args.warmup)
+                row = {
+                    "collection": collection,
+                    "setting": setting,
+                    "embed_model": model,
+                    "dims": dims,
+                    "questions": len(questions),
+                    "samples": len(samples),
+                    "top_k": top_k,
+                    "mean_ms": statistics.fmean(samples),
+                    "p50_ms": percentile(samples, 50),
+                    "p95_ms": percentile(samples, 95),
+                    "p99_ms": percentile(samples, 99),
+                    "recall": {str(k): recall_at_k(retrieved, truth, k) for k in args.recall_k},
+                    "ground_truth": truth_source,
+                }
+                results.append(row)
+                recall = " ".join(f"recall@{k}={v:.4f}" for k, v in row["recall"].items())
+                print(
+                    f"[BENCH] collection={collection} setting={setting:<7} p50={row['p50_ms']:.2f}ms "
+                    f"p95={row['p95_ms']:.2f}ms p99={row['p99_ms']:.2f}ms {recall}"
+                )
+    finally:
+        if cache:
+            cache.close()
+        client.close()
+
+    table = format_table(results, args.recall_k)
+    print(table)
+    for path, text in (
+        (args.out_json, json.dumps(results, ensure_ascii=False, indent=2)),
+        (args.out_table, table + "\n"),
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    print(f"[DONE] retrieval benchmark → {args.out_json}, {args.out_table}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Benchmark Qdrant REST vs gRPC: upsert throughput and search latency.
+
+전송 방식마다 임시 컬렉션을 만들어 같은 합성 벡터를 upsert하고, 같은 쿼리로 검색 지연을 잰다.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from qdrant_client.http import models as qmodels
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from bench_payload_index import percentile, synthetic_payload
+from qdrant_ingest import DEFAULT_GRPC_PORT, connect_qdrant, ensure_collection
+
+
+def random_unit_vectors(rng: random.Random, count: int, dim: int) -> List[List[float]]:
+    vectors = []
+    for _ in range(count):
+        vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+        norm = sum(x * x for x in vec) ** 0.5 or 1.0
+        vectors.append([x / norm for x in vec])
+    return vectors
+
+
+def run_transport(args: argparse.Namespace, transport: str) -> Dict[str, object]:
+    client = connect_qdrant(args.qdrant_url, prefer_grpc=transport == "grpc", grpc_port=args.grpc_port)
+    name = f"{args.collection_prefix}_{transport}"
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    ensure_collection(client, name, args.dim)
+    # 두 전송 방식이 같은 데이터/쿼리를 쓰도록 같은 seed로 생성
+    rng = random.Random(args.seed)
+    try:
+        upsert_start = time.monotonic()
+        for start in range(0, args.points, args.batch_size):
+            idx = range(start, min(start + args.batch_size, args.points))
+            client.upsert(
+                collection_name=name,
+                points=qmodels.Batch(
+                    ids=[str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench||{i}")) for i in idx],
+                    vectors={"dense": random_unit_vectors(rng, len(idx), args.dim)},
+                    payloads=[synthetic_payload(i) for i in idx],
+                ),
+                wait=True,
+            )
+        upsert_elapsed = time.monotonic() - upsert_start
+
+        queries = random_unit_vectors(rng, args.queries, args.dim)
+        samples: List[float] = []
+        for vec in queries:
+            start = time.monotonic()
+            client.query_points(collection_name=name, query=vec, using="dense", limit=args.top_k, with_payload=True)
+            samples.append((time.monotonic() - start) * 1000)
+    finally:
+        if not args.keep:
+            client.delete_collection(name)
+        client.close()
+
+    return {
+        "transport": transport,
+        "points": args.points,
+        "dim": args.dim,
+        "upsert_sec": upsert_elapsed,
+        "upsert_points_per_sec": args.points / upsert_elapsed if upsert_elapsed > 0 else 0.0,
+        "queries": len(samples),
+        "search_mean_ms": statistics.fmean(samples) if samples else 0.0,
+        "search_p50_ms": percentile(samples, 50),
+        "search_p95_ms": percentile(samples, 95),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare Qdrant REST vs gRPC upsert throughput and search latency.")
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--grpc-port", type=int, default=DEFAULT_GRPC_PORT)
+    parser.add_argument("--collection-prefix", default="bench_transport", help="임시 컬렉션 접두어")
+    parser.add_argument("--points", type=int, default=5000, help="upsert할 합성 포인트 수")
+    parser.add_argument("--dim", type=int, default=1024, help="벡터 차원 (기본: snowflake-arctic-embed2와 동일)")
+    parser.add_argument("--batch-size", type=int, default=32, help="upsert 배치 크기 (ingest 기본값과 동일)")
+    parser.add_argument("--queries", type=int, default=200, help="검색 횟수")
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-json", type=Path, help="결과 JSON 저장 경로")
+    parser.add_argument("--keep", action="store_true", help="측정 후 임시 컬렉션을 지우지 않음")
+    args = parser.parse_args(argv)
+
+    results = []
+    for transport in ("rest", "grpc"):
+        row = run_transport(args, transport)
+        results.append(row)
+        print(
+            f"[BENCH] transport={transport:<4} upsert={row['upsert_points_per_sec']:.0f} pts/s "
+            f"({row['upsert_sec']:.2f}s) search mean={row['search_mean_ms']:.2f}ms "
+            f"p50={row['search_p50_ms']:.2f}ms p95={row['search_p95_ms']:.2f}ms"
+        )
+
+    if args.out_json:
+        args.out_json.parent.mkdir(parents=True, exist_ok=True)
+        args.out_json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print("[DONE] transport benchmark")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
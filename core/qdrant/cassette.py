@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Record/replay cassette for backend calls (Ollama embed/generate, Qdrant search/placeholder lookup).
+
+record 모드는 실제 함수를 호출하고 (호출 종류, 인자) 키로 응답과 소요 시간을 JSONL에 추가한다.
+replay 모드는 같은 키의 응답을 파일에서 돌려주므로 Ollama/Qdrant 없이 QA 자체 오버헤드
+(placeholder 치환, 프롬프트 조립, CSV/evidence 작성 등)를 측정할 수 있다. 지연은 없음/기록값/고정 ms로 흉내낸다.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+CASSETTE_MODES = ("record", "replay")
+# none: 지연 없음, recorded: 기록된 소요 시간만큼 sleep, 숫자: 호출마다 고정 ms
+DEFAULT_REPLAY_LATENCY = "none"
+
+
+class CassetteMiss(KeyError):
+    """replay 중 기록에 없는 호출. 기록 이후 질문/설정/코드가 바뀌었다는 뜻이다."""
+
+
+def _json_default(obj: object) -> object:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    if hasattr(obj, "dict"):
+        return obj.dict(exclude_none=True)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return repr(obj)
+
+
+def parse_replay_latency(value: str) -> str:
+    if value in ("none", "recorded"):
+        return value
+    try:
+        if float(value) < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"replay latency must be none, recorded or a non-negative ms value: {value}")
+    return value
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: str, latency: str = DEFAULT_REPLAY_LATENCY) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"cassette mode must be one of {CASSETTE_MODES}: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = parse_replay_latency(latency)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {self.path} (record 모드로 먼저 기록)")
+        self._fh = None
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("a", encoding="utf-8")
+
+    @staticmethod
+    def make_key(kind: str, arguments: dict) -> str:
+        raw = json.dumps([kind, arguments], sort_keys=True, ensure_ascii=False, default=_json_default)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _simulate_latency(self, recorded_ms: float) -> None:
+        if self.latency == "none":
+            return
+        delay_ms = recorded_ms if self.latency == "recorded" else float(self.latency)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def wrap(
+        self,
+        kind: str,
+        func: Callable,
+        ignore: Iterable[str] = (),
+        encode: Callable[[object], object] = lambda value: value,
+        decode: Callable[[object], object] = lambda value: value,
+    ) -> Callable:
+        """
+        func를 record/replay 래퍼로 감싼다. 키는 ignore를 뺀 인자(기본값 포함) 전체이므로 연결 객체/URL/세션처럼
+        응답에 영향이 없는 인자는 ignore에 넣는다. encode/decode는 JSON으로 못 담는 반환값 변환용.
+        """
+        signature = inspect.signature(func)
+        ignored = set(ignore)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {k: v for k, v in bound.arguments.items() if k not in ignored}
+            key = self.make_key(kind, arguments)
+            if self.mode == "replay":
+                entry = self._entries.get(key)
+                if entry is None:
+                    with self._lock:
+                        self.misses += 1
+                    raise CassetteMiss(f"{kind}: no recorded response in {self.path}")
+                with self._lock:
+                    self.hits += 1
+                self._simulate_latency(entry["ms"])
+                return decode(entry["response"])
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            entry = {
+                "key": key,
+                "kind": kind,
+                "ms": (time.monotonic() - start) * 1000,
+                "response": encode(result),
+            }
+            line = json.dumps(entry, ensure_ascii=False, default=_json_default)
+            with self._lock:
+                self._entries[key] = entry
+                self._fh.write(line + "\n")
+                self._fh.flush()
+                self.recorded += 1
+            return result
+
+        return wrapper
+
+    def wrap_batch(
+        self,
+        kind: str,
+        func: Callable,
+        items_param: str,
+        item_key: Optional[str] = None,
+        aligned: bool = False,
+        ignore: Iterable[str] = (),
+    ) -> Callable:
+        """
+        여러 항목을 한 번에 조회하는 함수(func(..., items) → {item: 값}, aligned면 items 순서 list)를 항목 단위로
+        기록한다. 캐시 상태/동시 실행 순서에 따라 한 호출에 묶이는 항목이 달라져도 replay가 맞도록 키는 항목별로
+        만든다. item_key를 단건 함수의 인자 이름으로 주면 같은 kind의 단건 wrap 기록과 키를 공유한다.
+        """
+        signature = inspect.signature(func)
+        ignored = set(ignore) | {items_param}
+        item_name = item_key or items_param
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            items = list(bound.arguments[items_param])
+            arguments = {k: v for k, v in bound.arguments.items() if k not in ignored}
+            keys = [self.make_key(kind, {**arguments, item_name: item}) for item in items]
+            if self.mode == "replay":
+                entries = [self._entries.get(key) for key in keys]
+                with self._lock:
+                    self.misses += sum(1 for e in entries if e is None)
+                    self.hits += sum(1 for e in entries if e is not None)
+                if any(e is None for e in entries):
+                    raise CassetteMiss(f"{kind}: no recorded response in {self.path}")
+                self._simulate_latency(sum(e["ms"] for e in entries))
+                values = [e["response"] for e in entries]
+                return values if aligned else dict(zip(items, values))
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            per_item_ms = (time.monotonic() - start) * 1000 / max(len(items), 1)
+            values = list(result) if aligned else [result.get(item) for item in items]
+            lines = [
+                json.dumps(
+                    {"key": key, "kind": kind, "ms": per_item_ms, "response": value},
+                    ensure_ascii=False,
+                    default=_json_default,
+                )
+                for key, value in zip(keys, values)
+            ]
+            with self._lock:
+                for key, line in zip(keys, lines):
+                    self._entries[key] = json.loads(line)
+                    self._fh.write(line + "\n")
+                self._fh.flush()
+                self.recorded += len(lines)
+            return result
+
+        return wrapper
+
+    def stats(self) -> str:
+        if self.mode == "record":
+            return f"cassette=record recorded={self.recorded} entries={len(self._entries)}"
+        return f"cassette=replay hits={self.hits} misses={self.misses} latency={self.latency}"
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
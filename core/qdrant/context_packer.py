@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Token-budgeted packing of retrieved QA contexts.
+
+finalize는 테이블마다 base(`ID`), 행(`ID#n`), 요약(`ID#summary`) 레코드를 따로 만들기 때문에 top-k에
+같은 테이블이 여러 번 들어온다. 같은 테이블 레코드를 하나로 합치고, 거의 같은 텍스트를 버린 뒤
+점수 순으로 토큰 예산 안에서만 프롬프트에 넣는다.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+DEFAULT_CONTEXT_BUDGET = 3000
+DEFAULT_DEDUP_THRESHOLD = 0.9
+SHINGLE_SIZE = 3
+
+_TABLE_SUFFIX_RE = re.compile(r"^(?P<parent>[^#]+)#(?P<suffix>\d+|summary)$")
+_HANGUL_CJK_RE = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3\u4e00-\u9fff]")
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 쓰는 근사치: 한글/한자는 글자당 1토큰, 그 외(영문/숫자/기호)는 3.5자당 1토큰.
+    Qwen2.5 토크나이저 기준으로 한국어 기술 문서에서 대략 맞는 수준이며, 예산 비교용으로만 쓴다.
+    """
+    if not text:
+        return 0
+    cjk = len(_HANGUL_CJK_RE.findall(text))
+    other = len(_WS_RE.sub("", text)) - cjk
+    return cjk + int(other / 3.5 + 0.5)
+
+
+def table_parent(record_id: Optional[str]) -> Optional[str]:
+    """`TB_X#3`, `TB_X#summary` → `TB_X`. 테이블 행/요약이 아니면 None (텍스트 청크 `#cN`은 제외)."""
+    if not record_id:
+        return None
+    match = _TABLE_SUFFIX_RE.match(str(record_id))
+    return match.group("parent") if match else None
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    norm = _WS_RE.sub(" ", text or "").strip()
+    if len(norm) <= size:
+        return {norm} if norm else set()
+    return {norm[i : i + size] for i in range(len(norm) - size + 1)}
+
+
+def containment(small: set[str], large: set[str]) -> float:
+    """small 쪽 shingle 중 large에 포함된 비율. 행 레코드가 base 테이블에 들어있는 경우도 잡는다."""
+    if not small:
+        return 1.0
+    return len(small & large) / len(small)
+
+
+@dataclass
+class PackStats:
+    input_contexts: int = 0
+    output_contexts: int = 0
+    collapsed: int = 0
+    deduped: int = 0
+    over_budget: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def collapse_tables(contexts: List[dict]) -> Tuple[List[dict], int]:
+    """
+    같은 (filename, 부모 테이블 ID)를 가진 레코드를 하나로 합친다.
+    base 레코드가 있으면 행 레코드는 base에 이미 들어 있으므로 버리고, 요약은 앞에 붙인다.
+    검색 결과는 이미 좋은 순서이므로 합친 컨텍스트는 그룹에서 가장 먼저 나온 레코드의 자리/점수를 쓴다
+    (euclid 컬렉션은 score가 작을수록 좋아서 점수 값으로 다시 정렬하지 않는다).
+    """
+    groups: dict[tuple[Optional[str], str], List[dict]] = {}
+    order: List[object] = []
+    parents = {table_parent(c.get("id")) for c in contexts} - {None}
+    for ctx in contexts:
+        rid = ctx.get("id")
+        parent = table_parent(rid) or (rid if rid in parents else None)
+        if parent is None:
+            order.append(ctx)
+            continue
+        key = (ctx.get("filename"), parent)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(ctx)
+
+    collapsed = 0
+    result: List[dict] = []
+    for item in order:
+        if isinstance(item, dict):
+            result.append(item)
+            continue
+        members = groups[item]
+        if len(members) == 1:
+            result.append(members[0])
+            continue
+        collapsed += len(members) - 1
+        parent = item[1]
+        base = next((m for m in members if m.get("id") == parent), None)
+        summary = next((m for m in members if str(m.get("id")).endswith("#summary")), None)
+        rows = [m for m in members if m is not base and m is not summary]
+        parts = [m.get("text", "") for m in (summary, base) if m is not None]
+        if base is None:
+            parts.extend(m.get("text", "") for m in rows)
+        best = members[0]
+        merged = dict(base or best)
+        merged["id"] = parent
+        merged["score"] = best.get("score")
+        merged["text"] = "\n".join(p for p in parts if p)
+        merged["merged_ids"] = [m.get("id") for m in members]
+        result.append(merged)
+    return result, collapsed
+
+
+def pack_contexts(
+    contexts: List[dict],
+    budget_tokens: Optional[int] = DEFAULT_CONTEXT_BUDGET,
+    dedup_threshold: float = DEFAULT_DEDUP_THRESHOLD,
+) -> Tuple[List[dict], PackStats]:
+    """테이블 합치기 → 검색 순위 순으로 근사 중복 제거 → 예산 내 greedy 채우기. contexts는 검색 순위 순이어야 한다."""
+    stats = PackStats(input_contexts=len(contexts))
+    stats.tokens_before = sum(estimate_tokens(c.get("text", "")) for c in contexts)
+
+    merged, stats.collapsed = collapse_tables(contexts)
+    kept: List[dict] = []
+    kept_shingles: List[set[str]] = []
+    used = 0
+    for ctx in merged:
+        sh = shingles(ctx.get("text", ""))
+        if any(containment(sh, other) >= dedup_threshold for other in kept_shingles):
+            stats.deduped += 1
+            continue
+        tokens = estimate_tokens(ctx.get("text", ""))
+        # 큰 컨텍스트 하나가 예산을 넘어도 뒤의 작은 컨텍스트는 계속 시도한다.
+        if budget_tokens and used + tokens > budget_tokens:
+            stats.over_budget += 1
+            continue
+        kept.append(ctx)
+        kept_shingles.append(sh)
+        used += tokens
+
+    stats.output_contexts = len(kept)
+    stats.tokens_after = used
+    return kept, stats
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""On-disk embedding cache keyed by (embed model, Ollama endpoint, normalized text hash).
+
+ingest/QA가 Ollama를 호출하기 전에 조회한다. /api/embed(batch)는 L2 정규화된 벡터를, /api/embeddings(serial,
+QA 질문)는 정규화 전 벡터를 돌려주므로 endpoint를 키에 넣어 두 종류가 섞이지 않게 한다. 벡터는 JSON 리스트가 아니라 float32/float16 바이트로
+sqlite에 저장하고, 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 지운다.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_PATH = REPO_ROOT / "output" / "cache" / "embed_cache.sqlite"
+DEFAULT_CACHE_DTYPE = "float32"
+DEFAULT_CACHE_MAX_MB = 2048
+CACHE_DTYPE_CHOICES = ("float32", "float16")
+# 벡터를 만든 Ollama endpoint (/api/embeddings, /api/embed)
+EMBED_ENDPOINTS = ("embeddings", "embed")
+DEFAULT_EMBED_ENDPOINT = "embeddings"
+_WS_RE = re.compile(r"\s+")
+# sqlite 바인딩 변수 개수 제한(구버전 999)을 넘지 않도록 IN (...) 조회를 나눈다.
+_SQL_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC 정규화 + 공백 축약. 공백/유니코드 조합 차이만 있는 텍스트는 같은 키가 된다."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        dtype: str = DEFAULT_CACHE_DTYPE,
+        max_bytes: Optional[int] = DEFAULT_CACHE_MAX_MB * 1024 * 1024,
+    ) -> None:
+        if dtype not in CACHE_DTYPE_CHOICES:
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.path = Path(path)
+        self.dtype = dtype
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 파이프라인 ingest의 임베딩 워커들이 공유하므로 연결 하나를 lock으로 직렬화한다.
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if columns and "endpoint" not in columns:
+            # endpoint 없이 저장된 옛 캐시는 정규화 여부를 알 수 없으므로 버린다
+            self._conn.execute("DROP TABLE embeddings")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, endpoint, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _check_endpoint(endpoint: str) -> None:
+        if endpoint not in EMBED_ENDPOINTS:
+            raise ValueError(f"Unsupported embed endpoint: {endpoint}")
+
+    def get_many(
+        self, model: str, texts: Sequence[str], endpoint: str = DEFAULT_EMBED_ENDPOINT
+    ) -> List[Optional[List[float]]]:
+        """texts 순서대로 캐시된 벡터(없으면 None)를 돌려주고 hit/miss를 집계한다."""
+        self._check_endpoint(endpoint)
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            found = self._lookup(model, endpoint, hashes)
+            result = [found.get(h) for h in hashes]
+            hit_count = sum(1 for v in result if v is not None)
+            self.hits += hit_count
+            self.misses += len(result) - hit_count
+        return result
+
+    def _lookup(self, model: str, endpoint: str, hashes: Sequence[str]) -> dict[str, List[float]]:
+        found: dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), _SQL_CHUNK):
+            part = unique[start : start + _SQL_CHUNK]
+            marks = ",".join("?" for _ in part)
+            rows = self._conn.execute(
+                f"SELECT text_hash, dtype, vector FROM embeddings "
+                f"WHERE model = ? AND endpoint = ? AND text_hash IN ({marks})",
+                [model, endpoint, *part],
+            ).fetchall()
+            for h, dtype, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND endpoint = ? AND text_hash = ?",
+                [(now, model, endpoint, h) for h in found],
+            )
+            self._conn.commit()
+        return found
+
+    def get(self, model: str, text: str, endpoint: str = DEFAULT_EMBED_ENDPOINT) -> Optional[List[float]]:
+        return self.get_many(model, [text], endpoint)[0]
+
+    def put_many(
+        self,
+        model: str,
+        texts: Sequence[str],
+        vectors: Iterable[Sequence[float]],
+        endpoint: str = DEFAULT_EMBED_ENDPOINT,
+    ) -> None:
+        self._check_endpoint(endpoint)
+        now = time.time()
+        rows = []
+        for text, vec in zip(texts, vectors):
+            arr = np.asarray(vec, dtype=self.dtype)
+            blob = arr.tobytes()
+            rows.append((model, endpoint, text_hash(text), self.dtype, int(arr.shape[0]), blob, len(blob), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, endpoint, text_hash, dtype, dim, vector, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self.evict()
+
+    def put(self, model: str, text: str, vector: Sequence[float], endpoint: str = DEFAULT_EMBED_ENDPOINT) -> None:
+        self.put_many(model, [text], [vector], endpoint)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+        return int(row[0])
+
+    def evict(self) -> int:
+        """max_bytes를 넘은 만큼 last_used가 오래된 항목부터 삭제하고 삭제 건수를 돌려준다."""
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            excess = self.size_bytes() - self.max_bytes
+            if excess <= 0:
+                return 0
+            victims: list[tuple[str, str, str]] = []
+            freed = 0
+            for model, endpoint, h, nbytes in self._conn.execute(
+                "SELECT model, endpoint, text_hash, nbytes FROM embeddings ORDER BY last_used ASC"
+            ):
+                victims.append((model, endpoint, h))
+                freed += nbytes
+                if freed >= excess:
+                    break
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND endpoint = ? AND text_hash = ?", victims
+            )
+            self._conn.commit()
+        return len(victims)
+
+    def stats(self) -> str:
+        return f"cache_hits={self.hits} cache_misses={self.misses}"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
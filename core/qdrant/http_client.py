@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Shared pooled HTTP session for Ollama / Qdrant REST calls.
+
+`requests.post`를 매번 직접 부르면 호출마다 TCP 연결을 새로 맺는다. ingest/QA가 이 모듈의 세션 하나를
+공유해 keep-alive 연결을 재사용하고, 5xx/연결 끊김은 backoff를 두고 재시도한다.
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_CONNECT_TIMEOUT = 5.0
+RETRY_STATUS = (500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_config = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "retries": DEFAULT_RETRIES,
+    "backoff": DEFAULT_BACKOFF,
+    "connect_timeout": DEFAULT_CONNECT_TIMEOUT,
+}
+
+
+class NoReadTimeoutRetry(Retry):
+    """
+    read timeout만 재시도하지 않는 Retry. 서버가 이미 처리 중이던 요청(생성 등)을 다시 보내면 처음부터 다시 돌고
+    --timeout이 재시도 횟수만큼 늘어난다. 같은 read 계열이라도 keep-alive 연결이 끊겨 있던 경우(응답 전 reset/
+    close → ProtocolError)는 재시도해야 풀에서 꺼낸 오래된 연결 하나 때문에 요청이 실패하지 않는다.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            raise error.with_traceback(_stacktrace)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def build_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> requests.Session:
+    """
+    pool_size개 keep-alive 연결을 유지하는 세션. POST도 재시도 대상에 넣는다
+    (임베딩/생성/검색/upsert 모두 같은 요청을 다시 보내도 결과가 같다).
+    연결 실패, 응답 헤더 전 연결 끊김/reset, 5xx 응답을 재시도하고 read timeout은 재시도하지 않는다(NoReadTimeoutRetry).
+    """
+    retry = NoReadTimeoutRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "POST", "PUT", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure(
+    pool_size: Optional[int] = None,
+    retries: Optional[int] = None,
+    backoff: Optional[float] = None,
+    connect_timeout: Optional[float] = None,
+) -> None:
+    """공유 세션 설정을 바꾼다. 다음 get_session() 호출 때 새 설정으로 다시 만든다."""
+    global _session
+    with _lock:
+        for key, value in (
+            ("pool_size", pool_size),
+            ("retries", retries),
+            ("backoff", backoff),
+            ("connect_timeout", connect_timeout),
+        ):
+            if value is not None:
+                _config[key] = value
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = build_session(_config["pool_size"], _config["retries"], _config["backoff"])
+        return _session
+
+
+def post_json(
+    url: str,
+    payload: dict,
+    timeout: float,
+    stream: bool = False,
+    session: Optional[requests.Session] = None,
+) -> requests.Response:
+    """공유 세션(또는 지정 세션)으로 JSON POST. timeout은 읽기 timeout이고 연결 timeout은 따로 짧게 둔다."""
+    return (session or get_session()).post(
+        url,
+        json=payload,
+        timeout=(_config["connect_timeout"], timeout),
+        stream=stream,
+    )
+
+
+def add_http_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--http-pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f"Ollama/Qdrant REST keep-alive 연결 풀 크기 (기본: {DEFAULT_POOL_SIZE})",
+    )
+    parser.add_argument(
+        "--http-retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"5xx/연결 실패·끊김 시 재시도 횟수, read timeout은 재시도 안 함, 0이면 재시도 없음 (기본: {DEFAULT_RETRIES})",
+    )
+    parser.add_argument(
+        "--http-backoff",
+        type=float,
+        default=DEFAULT_BACKOFF,
+        help=f"재시도 backoff 계수(초, 0.5 → 0.5/1/2s…) (기본: {DEFAULT_BACKOFF})",
+    )
+    parser.add_argument(
+        "--http-connect-timeout",
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help=f"연결 timeout(초) (기본: {DEFAULT_CONNECT_TIMEOUT})",
+    )
+
+
+def configure_from_args(args: argparse.Namespace) -> None:
+    configure(
+        pool_size=args.http_pool_size,
+        retries=args.http_retries,
+        backoff=args.http_backoff,
+        connect_timeout=args.http_connect_timeout,
+    )
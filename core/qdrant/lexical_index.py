@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""In-process BM25 index over character n-grams of the final record text.
+
+"환원제비(RAR)", "CSR", "[Si] 제어"처럼 용어를 그대로 찾는 질문은 임베딩 + HNSW보다 용어 일치가 빠르고
+정확하다. 한국어는 조사/어미가 붙어 공백 단위 토큰이 잘 맞지 않으므로 토큰마다 문자 n-gram(기본 2,3)을
+색인한다. ingest --lexical-index가 output/final 레코드로 만들고, qdrant_qa.py --lexical fast|fuse가 쓴다.
+
+인덱스 디렉터리 구성:
+  postings.npz    CSR 형태 역색인 (offsets, docs, tfs) + 문서 길이
+  vocab.json      n-gram 목록 (offsets 순서)
+  payloads.jsonl  {"id": point id, "payload": {...}} (Qdrant payload와 같은 레코드)
+  meta.json       collection, count, ngram, avgdl, k1, b, fingerprint(qa_cache.collection_fingerprint와 동일)
+"""
+from __future__ import annotations
+
+import json
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from embed_cache import REPO_ROOT, normalize_text
+from qa_cache import fingerprint_entry, fingerprint_from_entries
+
+DEFAULT_LEXICAL_INDEX_ROOT = REPO_ROOT / "output" / "lexical_index"
+DEFAULT_NGRAM = (2, 3)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# --lexical fast: 1위 문서가 질의 n-gram(idf 가중)의 이 비율 이상을 포함하면 dense 검색 생략
+DEFAULT_LEXICAL_MIN_MATCH = 0.9
+# RRF 상수: 1/(k + rank). 60은 원 논문/일반적인 기본값
+DEFAULT_RRF_K = 60
+_TOKEN_RE = re.compile(r"\w+")
+# 질문에만 나오는 표현. 문서에는 드물어 idf가 높게 잡히므로 질의 쪽에서만 뺀다.
+QUESTION_FILLERS = {
+    "무엇", "무엇입니까", "무엇인가요", "무엇인가", "무엇인지", "어떻게", "어떤", "어떠한", "왜", "언제",
+    "알려줘", "알려주세요", "설명", "설명해", "설명해줘", "설명하시오", "입니까", "있습니까", "있나요",
+}
+QUESTION_SUFFIXES = ("입니까", "습니까", "합니까", "됩니까", "인가요", "인가", "나요", "이란", "란")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text).lower())
+
+
+def char_ngrams(tokens: Iterable[str], sizes: Sequence[int] = DEFAULT_NGRAM) -> List[str]:
+    """토큰 경계를 넘지 않는 문자 n-gram. 가장 작은 n보다 짧은 토큰은 그대로 한 항목."""
+    grams: List[str] = []
+    smallest = min(sizes)
+    for token in tokens:
+        if len(token) < smallest:
+            grams.append(token)
+            continue
+        for n in sizes:
+            grams.extend(token[i : i + n] for i in range(len(token) - n + 1))
+    return grams
+
+
+def query_tokens(question: str) -> List[str]:
+    tokens = []
+    for token in tokenize(question):
+        if token in QUESTION_FILLERS:
+            continue
+        for suffix in QUESTION_SUFFIXES:
+            if token.endswith(suffix) and len(token) > len(suffix):
+                token = token[: -len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+def default_lexical_dir(collection: str) -> Path:
+    return DEFAULT_LEXICAL_INDEX_ROOT / collection
+
+
+def build_lexical_index(
+    docs: Iterable[Tuple[str, dict]],
+    out_dir: Path,
+    collection: str,
+    ngram: Sequence[int] = DEFAULT_NGRAM,
+) -> Path:
+    """(point id, payload) 목록으로 인덱스를 만들어 저장한다. payload["text"]를 색인한다."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    vocab: Dict[str, int] = {}
+    postings: List[List[Tuple[int, int]]] = []
+    doc_len: List[int] = []
+    entries: List[str] = []
+    with (out_dir / "payloads.jsonl").open("w", encoding="utf-8") as fh:
+        for row, (point_id, payload) in enumerate(docs):
+            counts = Counter(char_ngrams(tokenize(str(payload.get("text") or "")), ngram))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((row, tf))
+            entries.append(fingerprint_entry(point_id, payload))
+            fh.write(json.dumps({"id": str(point_id), "payload": payload}, ensure_ascii=False) + "\n")
+
+    offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    flat = [item for plist in postings for item in plist]
+    np.savez(
+        out_dir / "postings.npz",
+        offsets=offsets,
+        docs=np.asarray([d for d, _ in flat], dtype=np.int32),
+        tfs=np.asarray([tf for _, tf in flat], dtype=np.float32),
+        doc_len=np.asarray(doc_len, dtype=np.float32),
+    )
+    (out_dir / "vocab.json").write_text(json.dumps(list(vocab), ensure_ascii=False), encoding="utf-8")
+    meta = {
+        "collection": collection,
+        "count": len(doc_len),
+        "terms": len(vocab),
+        "ngram": list(ngram),
+        "avgdl": float(np.mean(doc_len)) if doc_len else 0.0,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "fingerprint": fingerprint_from_entries(entries),
+        "built_at": time.time(),
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return out_dir
+
+
+class LexicalIndex:
+    """BM25 검색. 읽기 전용이라 여러 스레드가 동시에 불러도 된다."""
+
+    def __init__(self, index_dir: Path) -> None:
+        self.index_dir = Path(index_dir)
+        meta_path = self.index_dir / "meta.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(f"Lexical index not found: {self.index_dir} (qdrant_ingest.py --lexical-index로 생성)")
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.ngram = tuple(self.meta["ngram"])
+        self.k1 = float(self.meta["k1"])
+        self.b = float(self.meta["b"])
+        data = np.load(self.index_dir / "postings.npz")
+        self.offsets = data["offsets"]
+        self.docs = data["docs"]
+        self.tfs = data["tfs"]
+        self.doc_len = data["doc_len"]
+        vocab = json.loads((self.index_dir / "vocab.json").read_text(encoding="utf-8"))
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.ids: List[str] = []
+        self.payloads: List[dict] = []
+        with (self.index_dir / "payloads.jsonl").open(encoding="utf-8") as fh:
+            for line in fh:
+                item = json.loads(line)
+                self.ids.append(item["id"])
+                self.payloads.append(item["payload"])
+        n = len(self.ids)
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        avgdl = float(self.meta["avgdl"]) or 1.0
+        # 문서별 BM25 길이 정규화 항은 질의와 무관하므로 미리 계산
+        self._norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / avgdl)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, question: str, top_k: int) -> tuple[List[dict], float]:
+        """
+        (Qdrant REST 응답 모양의 상위 top_k point, match 비율). match 비율은 질의 n-gram idf 합 중
+        1위 문서에 실제로 있는 n-gram의 idf 합 비율(0~1)로, 용어를 그대로 포함하는 질문일수록 1에 가깝다.
+        """
+        grams = set(char_ngrams(query_tokens(question), self.ngram))
+        term_ids = sorted({self.vocab[g] for g in grams if g in self.vocab})
+        if not term_ids or not len(self):
+            return [], 0.0
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[term_id] * tfs * (self.k1 + 1.0) / (tfs + self._norm[docs])
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return [], 0.0
+        part = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        rows = part[np.argsort(-scores[part], kind="stable")][:k]
+        best = rows[0]
+        present = 0.0
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # posting은 문서 번호 오름차순
+            pos = np.searchsorted(self.docs[start:end], best)
+            if pos < end - start and self.docs[start + pos] == best:
+                present += float(self.idf[term_id])
+        # 색인에 없는 질의 n-gram도 분모에 넣는다 (가장 높은 idf로 취급)
+        missing = len(grams) - len(term_ids)
+        total = float(self.idf[term_ids].sum()) + missing * float(self.idf.max())
+        points = [{"id": self.ids[row], "score": float(scores[row]), "payload": self.payloads[row]} for row in rows]
+        return points, present / total if total > 0 else 0.0
+
+
+def context_key(ctx: dict) -> str:
+    return f"{ctx.get('filename') or ''}||{ctx.get('id') or ''}"
+
+
+def fuse_rrf(result_lists: Sequence[List[dict]], top_k: int, k: int = DEFAULT_RRF_K) -> List[dict]:
+    """Reciprocal Rank Fusion. 같은 레코드(filename+id)는 하나로 합치고 score를 RRF 점수로 바꾼다."""
+    fused: Dict[str, float] = {}
+    first: Dict[str, dict] = {}
+    for results in result_lists:
+        for rank, ctx in enumerate(results, start=1):
+            key = context_key(ctx)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            first.setdefault(key, ctx)
+    ordered = sorted(fused, key=lambda key: -fused[key])[:top_k]
+    return [{**first[key], "score": round(fused[key], 6)} for key in ordered]
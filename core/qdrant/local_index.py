@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""In-process exact dense search over a memory-mapped vector matrix exported from Qdrant.
+
+코퍼스가 수천 point 규모면 Qdrant HNSW로 HTTP 왕복하는 것보다 프로세스 안에서 float32 행렬곱으로 전부
+채점하는 편이 빠르고 recall도 1.0이다. ingest --export-local-index 또는 qdrant_qa.py --export-local-index로
+컬렉션을 export해 두면 qdrant_qa.py --backend local이 이 인덱스로 검색/placeholder 조회를 하고,
+같은 exact 검색 결과(ground_truth)를 HNSW 컬렉션 recall 측정의 정답으로 쓴다.
+
+인덱스 디렉터리 구성:
+  vectors.npy     (N, dim) float16/float32, np.load(mmap_mode="r")로 매핑
+  payloads.jsonl  scroll(point id) 순서의 {"id": point id, "payload": {...}}
+  meta.json       collection, distance, dim, count, dtype, fingerprint(qa_cache.collection_fingerprint와 동일),
+                  collection_metadata(ingest가 남긴 embed_model/embed_dims/source_dims)
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from embed_cache import REPO_ROOT
+from qa_cache import fingerprint_entry, fingerprint_from_entries
+from query_filter import payload_value_matches
+
+DEFAULT_LOCAL_INDEX_ROOT = REPO_ROOT / "output" / "local_index"
+LOCAL_DTYPE_CHOICES = ("float16", "float32")
+DEFAULT_LOCAL_DTYPE = "float32"
+EXPORT_SCROLL_PAGE = 512
+# float16 행렬은 BLAS를 못 타므로 이 행 수만큼씩 float32로 올려 채점한다.
+SCAN_BLOCK_ROWS = 16384
+
+PlaceholderKey = tuple[str, Optional[str]]
+
+
+def default_index_dir(collection: str) -> Path:
+    return DEFAULT_LOCAL_INDEX_ROOT / collection
+
+
+def _distance_name(distance: object) -> str:
+    return str(getattr(distance, "value", distance)).lower()
+
+
+def export_local_index(
+    client: QdrantClient,
+    collection: str,
+    out_dir: Optional[Path] = None,
+    dtype: str = DEFAULT_LOCAL_DTYPE,
+) -> Path:
+    """컬렉션의 dense 벡터/payload를 point id 순서로 scroll해 인덱스 디렉터리에 저장한다."""
+    out_dir = Path(out_dir or default_index_dir(collection))
+    info = client.get_collection(collection)
+    params = info.config.params.vectors
+    dense_params = params["dense"] if isinstance(params, dict) else params
+    distance = _distance_name(dense_params.distance)
+
+    vectors: List[List[float]] = []
+    entries: List[str] = []
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp_payloads = out_dir / "payloads.jsonl.tmp"
+    offset = None
+    with tmp_payloads.open("w", encoding="utf-8") as fh:
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=EXPORT_SCROLL_PAGE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=["dense"],
+            )
+            for point in points:
+                vec = point.vector["dense"] if isinstance(point.vector, dict) else point.vector
+                vectors.append(vec)
+                entries.append(fingerprint_entry(point.id, point.payload))
+                fh.write(json.dumps({"id": str(point.id), "payload": point.payload or {}}, ensure_ascii=False) + "\n")
+            if offset is None:
+                break
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1 if vectors else dense_params.size)
+    if distance == "cosine":
+        # Qdrant도 cosine 컬렉션은 정규화해 저장하지만, 내적=cosine이 되도록 한 번 더 보장
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+    np.save(out_dir / "vectors.npy", matrix.astype(dtype))
+    tmp_payloads.replace(out_dir / "payloads.jsonl")
+    meta = {
+        "collection": collection,
+        "distance": distance,
+        "dim": int(matrix.shape[1]),
+        "count": int(matrix.shape[0]),
+        "dtype": dtype,
+        "fingerprint": fingerprint_from_entries(entries),
+        "collection_metadata": getattr(info.config, "metadata", None) or {},
+        "exported_at": time.time(),
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return out_dir
+
+
+class LocalIndex:
+    """memmap 행렬 위의 exact top-k 검색. 읽기 전용이라 여러 스레드가 동시에 불러도 된다."""
+
+    def __init__(self, index_dir: Path) -> None:
+        self.index_dir = Path(index_dir)
+        meta_path = self.index_dir / "meta.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(
+                f"Local index not found: {self.index_dir} (qdrant_ingest.py / qdrant_qa.py --export-local-index로 생성)"
+            )
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.collection: str = self.meta["collection"]
+        self.distance: str = self.meta["distance"]
+        self.fingerprint: str = self.meta["fingerprint"]
+        self.matrix = np.load(self.index_dir / "vectors.npy", mmap_mode="r")
+        self.ids: List[str] = []
+        self.payloads: List[dict] = []
+        with (self.index_dir / "payloads.jsonl").open(encoding="utf-8") as fh:
+            for line in fh:
+                item = json.loads(line)
+                self.ids.append(item["id"])
+                self.payloads.append(item["payload"])
+        # placeholder 조회용: payload id → 행 번호 (scroll 순서 유지)
+        self._rows_by_pid: Dict[str, List[int]] = {}
+        for row, payload in enumerate(self.payloads):
+            pid = payload.get("id")
+            if pid is not None:
+                self._rows_by_pid.setdefault(str(pid), []).append(row)
+        self._sq_norms: Optional[np.ndarray] = None
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    def distinct_values(self, key: str) -> List[str]:
+        return sorted({str(p[key]) for p in self.payloads if p.get(key) is not None})
+
+    def row_mask(self, where: Dict[str, Sequence[str]]) -> np.ndarray:
+        """
+        payload 필드 값 조건(필드별 허용 값 중 하나, 필드 간 AND)에 맞는 행. 조건별로 캐시한다.
+        값 목록 필드(furnace)는 query_filter.payload_value_matches와 같이 빈 목록도 통과.
+        """
+        cache_key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        mask = self._masks.get(cache_key)
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+            for key, values in where.items():
+                allowed = set(values)
+                mask &= np.fromiter(
+                    (payload_value_matches(key, p.get(key), allowed) for p in self.payloads), dtype=bool, count=len(self)
+                )
+            self._masks[cache_key] = mask
+        return mask
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """(Q, N) 점수. 클수록 가까움 (euclid는 -거리²)."""
+        if self.distance == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms > 0, norms, 1.0)
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCAN_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start : start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start : start + block.shape[0]] = queries @ block.T
+        if self.distance == "euclid":
+            if self._sq_norms is None:
+                self._sq_norms = np.concatenate(
+                    [
+                        np.einsum("ij,ij->i", b, b)
+                        for b in (
+                            np.asarray(self.matrix[s : s + SCAN_BLOCK_ROWS], dtype=np.float32)
+                            for s in range(0, len(self), SCAN_BLOCK_ROWS)
+                        )
+                    ]
+                )
+            q_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+            scores = -(self._sq_norms[None, :] - 2 * scores + q_sq)
+        return scores
+
+    def top_k_rows(
+        self,
+        queries: Sequence[Sequence[float]],
+        top_k: int,
+        where: Optional[Dict[str, Sequence[str]]] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        질문별 상위 top_k 행 번호와 점수 (점수 내림차순). argpartition으로 전체 정렬을 피한다.
+        where가 있으면 조건에 맞는 행만 후보로 둔다 (Qdrant payload 필터와 같은 의미).
+        """
+        q = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        if q.shape[1] != self.dim:
+            raise ValueError(f"Query dim {q.shape[1]} != local index dim {self.dim} ({self.index_dir})")
+        scores = self._scores(q)
+        k = min(top_k, len(self))
+        if where:
+            mask = self.row_mask(where)
+            scores[:, ~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+        if k <= 0:
+            empty = np.zeros((len(q), 0), dtype=np.int64)
+            return empty, empty.astype(np.float32)
+        if k < len(self):
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(len(self)), (len(q), 1))
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        rows = np.take_along_axis(part, order, axis=1)
+        return rows, np.take_along_axis(part_scores, order, axis=1)
+
+    def _points(self, rows: np.ndarray, scores: np.ndarray) -> List[dict]:
+        # Qdrant REST 응답과 같은 모양({"id", "score", "payload"})이라 points_to_contexts를 그대로 쓴다.
+        if self.distance == "euclid":
+            scores = np.sqrt(np.maximum(-scores, 0.0))
+        return [
+            {"id": self.ids[row], "score": float(score), "payload": self.payloads[row]}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def search(
+        self, dense_vec: Sequence[float], top_k: int, where: Optional[Dict[str, Sequence[str]]] = None
+    ) -> List[dict]:
+        rows, scores = self.top_k_rows([dense_vec], top_k, where)
+        return self._points(rows[0], scores[0])
+
+    def search_batch(
+        self, dense_vecs: Sequence[Sequence[float]], top_k: int, where: Optional[Dict[str, Sequence[str]]] = None
+    ) -> List[List[dict]]:
+        if not dense_vecs:
+            return []
+        rows, scores = self.top_k_rows(dense_vecs, top_k, where)
+        return [self._points(r, s) for r, s in zip(rows, scores)]
+
+    def ground_truth(self, dense_vecs: Sequence[Sequence[float]], top_k: int) -> List[List[str]]:
+        """exact top_k point id 목록 (HNSW recall 측정용 정답)."""
+        rows, _ = self.top_k_rows(dense_vecs, top_k)
+        return [[self.ids[row] for row in r] for r in rows.tolist()]
+
+    def fetch_placeholder_payloads(self, keys: List[PlaceholderKey]) -> Dict[PlaceholderKey, Optional[dict]]:
+        """qdrant_qa.fetch_placeholder_payloads와 같은 규칙(첫 매칭, image_link 힌트 일치)을 메모리에서 적용."""
+        result: Dict[PlaceholderKey, Optional[dict]] = {}
+        for pid, image_link in keys:
+            rows = self._rows_by_pid.get(str(pid), [])
+            if image_link:
+                rows = [row for row in rows if self.payloads[row].get("image_link") == image_link]
+            result[(pid, image_link)] = self.payloads[rows[0]] if rows else None
+        return result
+
+
+def recall_at_k(retrieved: Sequence[Sequence[str]], truth: Sequence[Sequence[str]], k: int) -> float:
+    """질문별 |retrieved[:k] ∩ truth[:k]| / k 의 평균."""
+    if not truth:
+        return 0.0
+    total = 0.0
+    for got, want in zip(retrieved, truth):
+        want_k = set(want[:k])
+        if want_k:
+            total += len(set(str(pid) for pid in got[:k]) & want_k) / len(want_k)
+    return total / len(truth)
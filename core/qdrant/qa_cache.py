@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Persistent QA-side caches shared across sweeps over collection variants.
+
+같은 질문 세트를 컬렉션 변형마다 다시 돌릴 때 검색 결과를, 표현만 다른 같은 질문에는 생성 답변을 재사용한다.
+두 캐시 모두 컬렉션 내용 지문(point id + content_hash 전체의 sha256)을 함께 저장해, 재적재로 내용이 바뀐
+컬렉션의 옛 항목은 쓰지 않고 지운다.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from embed_cache import REPO_ROOT
+
+DEFAULT_SEARCH_CACHE_PATH = REPO_ROOT / "output" / "cache" / "search_cache.sqlite"
+FINGERPRINT_SCROLL_PAGE = 1024
+
+
+def vector_hash(vec: Sequence[float]) -> str:
+    return hashlib.sha256(np.asarray(vec, dtype=np.float32).tobytes()).hexdigest()
+
+
+def collection_fingerprint(client: QdrantClient, collection: str) -> str:
+    """
+    컬렉션 전체 (point id, content_hash)를 정렬해 해시한다. ingest가 content_hash를 남기지 않은 옛 컬렉션은
+    id만 반영되므로 같은 id로 내용만 바뀐 경우는 구분하지 못한다.
+    """
+    entries: List[str] = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=FINGERPRINT_SCROLL_PAGE,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            entries.append(fingerprint_entry(point.id, point.payload))
+        if offset is None:
+            break
+    return fingerprint_from_entries(entries)
+
+
+def fingerprint_entry(point_id: object, payload: Optional[dict]) -> str:
+    return f"{point_id}:{(payload or {}).get('content_hash') or ''}"
+
+
+def fingerprint_from_entries(entries: Sequence[str]) -> str:
+    digest = hashlib.sha256()
+    for entry in sorted(entries):
+        digest.update(entry.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class SearchResultCache:
+    """(collection, 내용 지문, 질문 벡터 hash, top_k, 검색 파라미터) → 검색 컨텍스트 목록."""
+
+    def __init__(self, path: Path = DEFAULT_SEARCH_CACHE_PATH) -> None:
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_results (
+                cache_key TEXT PRIMARY KEY,
+                collection TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                contexts TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(
+        collection: str,
+        fingerprint: str,
+        dense_vec: Sequence[float],
+        top_k: int,
+        params: Optional[dict],
+    ) -> str:
+        raw = json.dumps(
+            [collection, fingerprint, vector_hash(dense_vec), top_k, params or {}],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT contexts FROM search_results WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, collection: str, fingerprint: str, contexts: List[dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (cache_key, collection, fingerprint, contexts, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, collection, fingerprint, json.dumps(contexts, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def drop_stale(self, collection: str, fingerprint: str) -> int:
+        """같은 컬렉션의 다른 지문(재적재 이전) 결과를 지우고 삭제 건수를 돌려준다."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM search_results WHERE collection = ? AND fingerprint != ?", (collection, fingerprint)
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self) -> str:
+        return f"search_cache_hits={self.hits} search_cache_misses={self.misses}"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+DEFAULT_ANSWER_CACHE_PATH = REPO_ROOT / "output" / "cache" / "answer_cache.sqlite"
+DEFAULT_ANSWER_SIMILARITY = 0.95
+
+
+def context_signature(contexts: Sequence[dict]) -> str:
+    """검색된 컨텍스트 집합의 식별자 (payload id + filename, 순서 무관)."""
+    ids = sorted(f"{ctx.get('filename') or ''}||{ctx.get('id') or ''}" for ctx in contexts)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+def _unit(vec: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm > 0 else arr
+
+
+class SemanticAnswerCache:
+    """
+    표현만 조금 다른 같은 질문에 생성 답변을 재사용한다. 질문 벡터 cosine 유사도가 threshold 이상이고
+    검색된 컨텍스트 집합까지 같을 때만 hit. config(LLM/프롬프트/top_k 등 답변을 바꾸는 설정 해시)와
+    컬렉션 내용 지문이 다른 항목은 쓰지 않는다.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        fingerprint: str,
+        config: str,
+        path: Path = DEFAULT_ANSWER_CACHE_PATH,
+        threshold: float = DEFAULT_ANSWER_SIMILARITY,
+    ) -> None:
+        self.path = Path(path)
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.config = config
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                collection TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                config TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                context_sig TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                evidence TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers(collection, config)")
+        # 컬렉션 내용이 바뀌었으면 이전 지문의 답변은 근거가 달라졌으므로 삭제
+        self.dropped = self._conn.execute(
+            "DELETE FROM answers WHERE collection = ? AND fingerprint != ?", (collection, fingerprint)
+        ).rowcount
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT vector, context_sig, answer, evidence FROM answers WHERE collection = ? AND config = ?",
+            (collection, config),
+        ).fetchall()
+        self._entries = [(sig, answer, evidence) for _, sig, answer, evidence in rows]
+        self._matrix = (
+            np.stack([np.frombuffer(blob, dtype=np.float32) for blob, *_ in rows])
+            if rows
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def lookup(self, dense_vec: Sequence[float], contexts: Sequence[dict]) -> Optional[tuple[str, str, float]]:
+        """(answer, evidence, similarity) 또는 None. 유사도 높은 후보부터 컨텍스트 집합이 같은 것을 찾는다."""
+        sig = context_signature(contexts)
+        query = _unit(dense_vec)
+        with self._lock:
+            if not self._entries or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._matrix @ query
+            for idx in np.argsort(-sims):
+                if sims[idx] < self.threshold:
+                    break
+                entry_sig, answer, evidence = self._entries[idx]
+                if entry_sig == sig:
+                    self.hits += 1
+                    return answer, evidence, float(sims[idx])
+            self.misses += 1
+        return None
+
+    def put(self, question: str, dense_vec: Sequence[float], contexts: Sequence[dict], answer: str, evidence: str) -> None:
+        vec = _unit(dense_vec)
+        sig = context_signature(contexts)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (collection, fingerprint, config, question, vector, context_sig, answer, evidence, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.collection, self.fingerprint, self.config, question, vec.tobytes(), sig, answer, evidence, time.time()),
+            )
+            self._conn.commit()
+            self._entries.append((sig, answer, evidence))
+            self._matrix = vec[None, :] if self._matrix.size == 0 else np.vstack([self._matrix, vec])
+
+    def stats(self) -> str:
+        return f"answer_cache_hits={self.hits} answer_cache_misses={self.misses}"
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Long-running QA HTTP service over Qdrant + Ollama.
+
+qdrant_qa.py의 dense 검색(--quant-* 검색 파라미터, --query-filter payload 필터와 빈 결과 시 완화 포함)/
+placeholder 치환/프롬프트 로직을 그대로 쓰되, Qdrant 클라이언트와 Ollama 연결을 프로세스 수명 동안
+재사용하고 keep_alive로 모델을 메모리에 올려둔다. 검색/답변 캐시, --lexical, --backend local은 배치 QA 전용이다.
+
+엔드포인트:
+  GET  /health                          → 상태/설정
+  POST /search {"question", "top_k"?}  → 검색 컨텍스트(placeholder 치환 후)
+  POST /ask    {"question", "top_k"?}  → 답변 + 컨텍스트 + 단계별 ms
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from context_packer import DEFAULT_CONTEXT_BUDGET, DEFAULT_DEDUP_THRESHOLD, pack_contexts
+from http_client import add_http_args, configure_from_args, get_session
+from qdrant_ingest import DEFAULT_GRPC_PORT, connect_qdrant, truncate_embedding
+from qdrant_qa import (
+    DEFAULT_COLLECTION,
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_PLACEHOLDER_CACHE_SIZE,
+    DEFAULT_TEMPERATURE,
+    QUANT_RESCORE_CHOICES,
+    PlaceholderCache,
+    applied_filter,
+    build_prompt,
+    build_search_params,
+    collection_embed_dims,
+    detect_search_api,
+    embed_dense,
+    filter_result,
+    filtered_search,
+    generate,
+    resolve_placeholders,
+    resolve_query_dims,
+    search_params_json,
+)
+from query_filter import FILTER_FIELDS, QueryAnalyzer, collection_filenames
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8008
+DEFAULT_KEEP_ALIVE = "30m"
+WARMUP_TEXT = "warm-up"
+# 응답 JSON에 넣을 컨텍스트 필드
+CONTEXT_FIELDS = ("id", "score", "record_type", "filename", "page", "image_link", "text")
+
+
+class QAService:
+    """요청 간에 공유하는 클라이언트/세션/캐시. 핸들러 스레드들이 동시에 호출한다."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.client = connect_qdrant(args.qdrant_url, args.prefer_grpc, args.grpc_port)
+        # Ollama 연결 재사용: http_client 공유 세션(--http-pool-size개 keep-alive 연결)
+        self.session = get_session()
+        self.placeholder_cache = PlaceholderCache(args.placeholder_cache_size)
+        self.search_api: Optional[str] = None
+        # --dims가 없으면 컬렉션 메타데이터의 ingest 절단 차원, 있으면 컬렉션 차원과 일치 확인 (불일치는 ValueError)
+        self.dims = resolve_query_dims(self.client, args.collection, args.dims)
+        self.search_params = build_search_params(
+            quant_rescore=QUANT_RESCORE_CHOICES[args.quant_rescore],
+            quant_oversampling=args.quant_oversampling,
+            quant_ignore=args.quant_ignore,
+        )
+        # --query-filter: 문서 목록은 시작 시 한 번만 읽는다 (ingest 후 문서가 추가되면 재시작)
+        self.analyzer: Optional[QueryAnalyzer] = None
+        if args.query_filter:
+            self.analyzer = QueryAnalyzer(collection_filenames(self.client, args.collection), args.query_filter_fields)
+        self.started_at = time.time()
+        self.warmup_ms: Dict[str, float] = {}
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+    def warmup(self) -> None:
+        """임베딩/생성 모델을 keep_alive로 로드하고 검색 경로를 확정해, 첫 질문이 로드 지연을 내지 않게 한다."""
+        args = self.args
+        start = time.monotonic()
+        self.search_api = detect_search_api(self.client, args.collection, args.qdrant_url)
+        self.warmup_ms["qdrant"] = (time.monotonic() - start) * 1000
+
+        start = time.monotonic()
+        vec = embed_dense(WARMUP_TEXT, args.embed_model, args.ollama_url, session=self.session, keep_alive=args.keep_alive)
+        self.warmup_ms["embed"] = (time.monotonic() - start) * 1000
+        # 임베딩 모델/절단 차원이 컬렉션과 다르면 첫 질문의 Qdrant 오류 대신 시작 시 알린다
+        size, _ = collection_embed_dims(self.client, args.collection)
+        query_size = len(truncate_embedding(vec, self.dims))
+        if query_size != size:
+            raise ValueError(
+                f"query embedding size {query_size} ({args.embed_model}, dims={self.dims}) "
+                f"does not match dense vector size {size} of collection '{args.collection}'"
+            )
+
+        start = time.monotonic()
+        generate(
+            WARMUP_TEXT,
+            args.llm_model,
+            args.ollama_url,
+            max_tokens=1,
+            session=self.session,
+            keep_alive=args.keep_alive,
+        )
+        self.warmup_ms["generate"] = (time.monotonic() - start) * 1000
+
+    def search(self, question: str, top_k: Optional[int] = None) -> tuple[List[dict], Dict[str, float], dict]:
+        """검색 컨텍스트, 단계별 ms, 적용된 필터(filter_result)."""
+        args = self.args
+        timings: Dict[str, float] = {}
+        start = time.monotonic()
+        dense_vec = embed_dense(question, args.embed_model, args.ollama_url, session=self.session, keep_alive=args.keep_alive)
+        dense_vec = truncate_embedding(dense_vec, self.dims)
+        timings["embed_ms"] = (time.monotonic() - start) * 1000
+
+        query_filter = (self.analyzer.analyze(question) or None) if self.analyzer is not None else None
+        start = time.monotonic()
+        contexts = filtered_search(
+            self.client,
+            args.collection,
+            dense_vec,
+            args.qdrant_url,
+            top_k or args.top_k,
+            self.search_params,
+            self.search_api,
+            query_filter,
+        )
+        timings["search_ms"] = (time.monotonic() - start) * 1000
+        filter_info = filter_result(query_filter, applied_filter(query_filter, contexts))
+
+        start = time.monotonic()
+        contexts = resolve_placeholders(self.client, args.collection, contexts, self.placeholder_cache)
+        timings["placeholder_ms"] = (time.monotonic() - start) * 1000
+        if args.pack_contexts:
+            contexts, stats = pack_contexts(contexts, args.context_budget, args.dedup_threshold)
+            timings["ctx_tokens_saved"] = stats.tokens_saved
+        return contexts, timings, filter_info
+
+    def ask(self, question: str, top_k: Optional[int] = None) -> tuple[str, List[dict], Dict[str, float], dict]:
+        args = self.args
+        contexts, timings, filter_info = self.search(question, top_k)
+        start = time.monotonic()
+        answer = generate(
+            build_prompt(question, contexts),
+            args.llm_model,
+            args.ollama_url,
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=DEFAULT_MAX_TOKENS,
+            session=self.session,
+            keep_alive=args.keep_alive,
+        )
+        timings["gen_ms"] = (time.monotonic() - start) * 1000
+        return answer, contexts, timings, filter_info
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests_served += 1
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "collection": self.args.collection,
+            "embed_model": self.args.embed_model,
+            "llm_model": self.args.llm_model,
+            "dims": self.dims,
+            "search_api": self.search_api,
+            "search_params": search_params_json(self.search_params),
+            "query_filter": self.analyzer.stats() if self.analyzer is not None else None,
+            "keep_alive": self.args.keep_alive,
+            "warmup_ms": self.warmup_ms,
+            "uptime_sec": round(time.time() - self.started_at, 1),
+            "requests_served": self.requests_served,
+            "placeholder_cache": self.placeholder_cache.stats(),
+        }
+
+
+def context_view(ctx: dict) -> dict:
+    return {key: ctx.get(key) for key in CONTEXT_FIELDS}
+
+
+def make_handler(service: QAService) -> type[BaseHTTPRequestHandler]:
+    class QAHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # keep-alive 연결에서 헤더/본문 분리 write가 delayed ACK(~40ms)에 걸리지 않도록
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt: str, *args) -> None:
+            if not service.args.quiet:
+                super().log_message(fmt, *args)
+
+        def _send_json(self, status: int, obj: dict) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") == "/health":
+                self._send_json(200, service.health())
+            else:
+                self._send_json(404, {"error": f"unknown path: {self.path}"})
+
+        def do_POST(self) -> None:
+            route = self.path.rstrip("/")
+            if route not in ("/ask", "/search"):
+                self._send_json(404, {"error": f"unknown path: {self.path}"})
+                return
+            try:
+                body = self._read_json()
+            except (ValueError, UnicodeDecodeError) as exc:
+                self._send_json(400, {"error": f"invalid JSON body: {exc}"})
+                return
+            if not isinstance(body, dict):
+                self._send_json(400, {"error": f"JSON body must be an object, got {type(body).__name__}"})
+                return
+            question = str(body.get("question") or "").strip()
+            if not question:
+                self._send_json(400, {"error": "'question' is required"})
+                return
+            top_k = body.get("top_k")
+            if top_k is not None and (not isinstance(top_k, int) or top_k < 1):
+                self._send_json(400, {"error": "'top_k' must be a positive integer"})
+                return
+            start = time.monotonic()
+            try:
+                if route == "/search":
+                    contexts, timings, filter_info = service.search(question, top_k)
+                    result = {"question": question, "contexts": [context_view(c) for c in contexts]}
+                else:
+                    answer, contexts, timings, filter_info = service.ask(question, top_k)
+                    result = {"question": question, "answer": answer, "contexts": [context_view(c) for c in contexts]}
+                result.update(filter_info)
+            except Exception as exc:  # backend 오류는 502로 돌려주고 서비스는 계속 유지
+                self._send_json(502, {"error": f"{type(exc).__name__}: {exc}"})
+                return
+            timings["elapsed_ms"] = (time.monotonic() - start) * 1000
+            result["timings"] = {k: round(v, 1) for k, v in timings.items()}
+            service.count_request()
+            self._send_json(200, result)
+
+    return QAHandler
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="QA HTTP service (/ask, /search, /health) over Qdrant + Ollama.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Qdrant 컬렉션명")
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--ollama-url", default=os.environ.get("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--prefer-grpc", action="store_true", help="Qdrant gRPC 전송 사용 (기본: REST)")
+    parser.add_argument("--grpc-port", type=int, default=DEFAULT_GRPC_PORT)
+    parser.add_argument("--embed-model", default="snowflake-arctic-embed2", help="Ollama 임베딩 모델명")
+    parser.add_argument("--llm-model", default="qwen2.5:14b-instruct", help="답변 생성 모델명 (Ollama)")
+    parser.add_argument("--top-k", type=int, default=7, help="기본 retrieval 개수 (요청의 top_k로 덮어씀)")
+    parser.add_argument("--dims", type=int, help="질문 임베딩 절단 차원 (기본: 컬렉션 메타데이터의 ingest --dims)")
+    parser.add_argument(
+        "--quant-rescore",
+        choices=tuple(QUANT_RESCORE_CHOICES),
+        default="auto",
+        help="qdrant_qa.py --quant-rescore와 동일 (auto: 서버 기본값)",
+    )
+    parser.add_argument("--quant-oversampling", type=float, help="qdrant_qa.py --quant-oversampling과 동일")
+    parser.add_argument("--quant-ignore", action="store_true", help="qdrant_qa.py --quant-ignore와 동일")
+    parser.add_argument("--query-filter", action="store_true", help="qdrant_qa.py --query-filter와 동일")
+    parser.add_argument(
+        "--query-filter-fields",
+        nargs="+",
+        choices=FILTER_FIELDS,
+        default=list(FILTER_FIELDS),
+        help=f"--query-filter로 거를 payload 필드 (기본: {' '.join(FILTER_FIELDS)})",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        default=DEFAULT_KEEP_ALIVE,
+        help=f"Ollama keep_alive (모델을 메모리에 유지할 시간, -1이면 무기한) (기본: {DEFAULT_KEEP_ALIVE})",
+    )
+    parser.add_argument("--placeholder-cache-size", type=int, default=DEFAULT_PLACEHOLDER_CACHE_SIZE)
+    parser.add_argument("--pack-contexts", action="store_true", help="qdrant_qa.py --pack-contexts와 동일")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD)
+    parser.add_argument("--no-warmup", action="store_true", help="시작 시 모델 로드/검색 경로 확인 생략")
+    parser.add_argument("--quiet", action="store_true", help="요청 access log 끄기")
+    add_http_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    configure_from_args(args)
+    try:
+        service = QAService(args)
+        if not args.no_warmup:
+            service.warmup()
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    if args.dims is None and service.dims:
+        print(f"[INFO] query embedding dims={service.dims} (collection metadata)")
+    if service.analyzer is not None:
+        print(f"[INFO] query filter: {service.analyzer.stats()}")
+    if not args.no_warmup:
+        warm = " ".join(f"{k}={v:.0f}ms" for k, v in service.warmup_ms.items())
+        print(f"[INFO] warm-up done ({warm}, search_api={service.search_api})")
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+    print(f"[INFO] QA service listening on http://{args.host}:{args.port} (collection={args.collection})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.session.close()
+        service.client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
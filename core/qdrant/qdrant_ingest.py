@@ -3,10 +3,19 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import math
 import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import product
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import sys
 import uuid
 import time
 
@@ -15,6 +24,23 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 from enum import Enum
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from embed_cache import (
+    CACHE_DTYPE_CHOICES,
+    DEFAULT_CACHE_DTYPE,
+    DEFAULT_CACHE_MAX_MB,
+    DEFAULT_CACHE_PATH,
+    EmbeddingCache,
+    normalize_text,
+)
+from http_client import add_http_args, configure_from_args, post_json
+from lexical_index import build_lexical_index, default_lexical_dir
+from local_index import DEFAULT_LOCAL_DTYPE, LOCAL_DTYPE_CHOICES, default_index_dir, export_local_index
+from query_filter import furnace_numbers
+
 
 class Collection(Enum):
     FINAL = "final_embeddings"
@@ -26,6 +52,74 @@ DEFAULT_HNSW_M = 16
 DEFAULT_HNSW_EF_CONSTRUCT = 100
 DEFAULT_ON_DISK = False
 DISTANCE_CHOICES = {"cosine", "dot", "euclid", "euclidean", "l2"}
+QUANTIZATION_CHOICES = ("none", "scalar", "product", "binary")
+DEFAULT_QUANTIZATION = "none"
+PQ_COMPRESSION_CHOICES = ("x4", "x8", "x16", "x32", "x64")
+DEFAULT_PQ_COMPRESSION = "x16"
+DEFAULT_SCALAR_QUANTILE = 0.99
+DATATYPE_CHOICES = ("float32", "float16", "uint8")
+DEFAULT_DATATYPE = "float32"
+# 컬렉션명 suffix 용 약어
+QUANTIZATION_SUFFIX = {"scalar": "sq8", "product": "pq", "binary": "bq"}
+DATATYPE_SUFFIX = {"float16": "f16", "uint8": "u8"}
+# qdrant_qa.fetch_placeholder_payload, --query-filter 등이 필터로 쓰는 필드 (keyword payload index 생성 대상)
+DEFAULT_PAYLOAD_INDEXES = ("id", "image_link", "filename", "record_type", "furnace")
+# serial: 레코드당 /api/embeddings 1회, batch: --batch-size 개씩 /api/embed 1회.
+# /api/embed는 L2 정규화된 벡터를, /api/embeddings는 정규화 전 벡터를 돌려주므로 두 모드가 같은 컬렉션을
+# 만드는 것은 저장 시 정규화하는 cosine 컬렉션뿐이다 (dot/euclid에서 batch 모드는 거부).
+EMBED_MODE_CHOICES = ("serial", "batch")
+# 임베딩 캐시 키의 endpoint (embed_cache.EMBED_ENDPOINTS): embed_dense, embed_dense_batch 순
+EMBED_DENSE_ENDPOINT = "embeddings"
+EMBED_DENSE_BATCH_ENDPOINT = "embed"
+EMBED_ENDPOINT_BY_MODE = {"serial": EMBED_DENSE_ENDPOINT, "batch": EMBED_DENSE_BATCH_ENDPOINT}
+DEFAULT_EMBED_MODE = "serial"
+DEFAULT_EMBED_CONCURRENCY = 2
+DEFAULT_UPSERT_WORKERS = 2
+DEFAULT_QUEUE_DEPTH = 4
+# wait=False upsert 후 consistency barrier로 쓰는 no-op delete 대상 (존재하지 않는 ID)
+BARRIER_POINT_ID = str(uuid.uuid5(uuid.NAMESPACE_URL, "__qdrant_ingest_barrier__"))
+DEFAULT_GRPC_PORT = 6334
+# Qdrant 기본 optimizer indexing_threshold(KB). --bulk-load 종료 후 이 값으로 복원한다.
+DEFAULT_INDEXING_THRESHOLD = 20000
+DEFAULT_INDEX_WAIT_TIMEOUT = 1800.0
+# --incremental 에서 기존 point 조회/삭제 시 한 번에 보내는 ID 수
+ID_CHUNK_SIZE = 256
+
+
+@dataclass(frozen=True)
+class CollectionVariant:
+    name: str  # suffix 규칙까지 적용된 최종 컬렉션명
+    distance: str = DEFAULT_DISTANCE
+    hnsw_m: int = DEFAULT_HNSW_M
+    hnsw_ef_construct: int = DEFAULT_HNSW_EF_CONSTRUCT
+    on_disk: bool = DEFAULT_ON_DISK
+    payload_indexes: Tuple[str, ...] = DEFAULT_PAYLOAD_INDEXES
+    quantization: str = DEFAULT_QUANTIZATION
+    quantization_always_ram: bool = False
+    pq_compression: str = DEFAULT_PQ_COMPRESSION
+    scalar_quantile: float = DEFAULT_SCALAR_QUANTILE
+    datatype: str = DEFAULT_DATATYPE
+    dims: Optional[int] = None  # Matryoshka 절단 차원 (None이면 모델 전체 차원)
+
+    def describe(self) -> str:
+        desc = (
+            f"distance={self.distance}, hnsw_m={self.hnsw_m}, "
+            f"ef_construct={self.hnsw_ef_construct}, on_disk={self.on_disk}"
+        )
+        if self.quantization != DEFAULT_QUANTIZATION:
+            desc += f", quantization={self.quantization}, always_ram={self.quantization_always_ram}"
+        if self.datatype != DEFAULT_DATATYPE:
+            desc += f", datatype={self.datatype}"
+        if self.dims:
+            desc += f", dims={self.dims}"
+        return desc
+
+
+def connect_qdrant(url: str, prefer_grpc: bool = False, grpc_port: int = DEFAULT_GRPC_PORT) -> QdrantClient:
+    """REST(기본) 또는 gRPC 클라이언트. gRPC는 벡터를 JSON 텍스트 대신 protobuf float로 보낸다."""
+    if prefer_grpc:
+        return QdrantClient(url=url, prefer_grpc=True, grpc_port=grpc_port)
+    return QdrantClient(url=url)
 
 
 def load_json(path: Path):
@@ -78,15 +172,74 @@ def iter_records(base_dir: Path) -> Iterable[Dict[str, object]]:
             ]:
                 if key in item:
                     rec[key] = item.get(key)
+            # qdrant_qa --query-filter의 고로 번호 필터용 (언급 없는 레코드는 필드 없음 = 모든 고로 공통)
+            furnaces = furnace_numbers(text)
+            if furnaces:
+                rec["furnace"] = furnaces
             yield rec
 
 
-def embed_dense(text: str, model: str, url: str, timeout: float = 120.0) -> List[float]:
-    resp = requests.post(
-        f"{url.rstrip('/')}/api/embeddings",
-        json={"model": model, "prompt": text},
-        timeout=timeout,
-    )
+def make_point_id(rec: Dict[str, object]) -> str | int:
+    """
+    Qdrant point id 생성: 동일 id를 여러 문서에서 재사용해도 충돌하지 않도록
+    record_type/id/placeholder/filename/image_link/section_path/page를 모두 포함해 UUID5를 만든다.
+    """
+    parts = [
+        rec.get("record_type") or "",
+        rec.get("id") or rec.get("placeholder") or "",
+        rec.get("filename") or "",
+        rec.get("image_link") or "",
+        rec.get("section_path") or "",
+        rec.get("page") or "",
+    ]
+    key = "||".join(str(p) for p in parts)
+    # UUID string을 입력해도 동일 결과가 나오도록 한번 더 UUID5로 감싼다.
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def unique_records(records: Iterable[Dict[str, object]]) -> Tuple[List[Dict[str, object]], int]:
+    """
+    point id 기준 중복 제거(같은 청크가 입력에 반복되면 마지막 레코드, plan_incremental과 같은 규칙)와 제거한 수.
+    같은 id가 서로 다른 batch에 실리면 --pipeline(임베딩 워커 여러 개, wait=False upsert 워커 여러 개)에서
+    적용 순서가 정해지지 않아 어느 payload가 남을지 실행마다 달라지므로 batch를 만들기 전에 없앤다.
+    """
+    by_id: Dict[str, Dict[str, object]] = {}
+    total = 0
+    for rec in records:
+        total += 1
+        by_id[str(make_point_id(rec))] = rec
+    return list(by_id.values()), total - len(by_id)
+
+
+def content_hash(text: str, model: str) -> str:
+    """임베딩 결과를 결정하는 (임베딩 모델, 정규화 텍스트) 해시. payload의 content_hash로 저장된다."""
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def truncate_embedding(vec: List[float], dims: Optional[int]) -> List[float]:
+    """Matryoshka 절단: 앞 dims 차원만 남기고 L2 재정규화한다. dims가 없거나 전체 이상이면 그대로."""
+    if not dims or dims >= len(vec):
+        return vec
+    head = vec[:dims]
+    norm = math.sqrt(sum(x * x for x in head))
+    if norm == 0:
+        return list(head)
+    return [x / norm for x in head]
+
+
+def embed_dense(
+    text: str,
+    model: str,
+    url: str,
+    timeout: float = 120.0,
+    session: Optional[requests.Session] = None,
+    keep_alive: Optional[str] = None,
+) -> List[float]:
+    """Ollama /api/embeddings 단건 임베딩. ingest/QA/서비스 공용 (연결은 http_client 공유 세션)."""
+    payload = {"model": model, "prompt": text}
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    resp = post_json(f"{url.rstrip('/')}/api/embeddings", payload, timeout=timeout, session=session)
     resp.raise_for_status()
     data = resp.json()
     embedding = data.get("embedding")
@@ -95,6 +248,380 @@ def embed_dense(text: str, model: str, url: str, timeout: float = 120.0) -> List
     return embedding
 
 
+def embed_dense_batch(texts: List[str], model: str, url: str, timeout: float = 300.0) -> List[List[float]]:
+    """Ollama /api/embed (list input)로 여러 텍스트를 한 번에 임베딩한다. 입력 순서대로 반환."""
+    resp = post_json(f"{url.rstrip('/')}/api/embed", {"model": model, "input": texts}, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    embeddings = data.get("embeddings")
+    if not embeddings or len(embeddings) != len(texts):
+        raise RuntimeError(
+            f"Ollama /api/embed returned {len(embeddings or [])} embeddings for {len(texts)} inputs: {data.get('error')}"
+        )
+    return embeddings
+
+
+def chunked(items: Iterable[Dict[str, object]], size: int) -> Iterator[List[Dict[str, object]]]:
+    chunk: List[Dict[str, object]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_embeddings(
+    records: Iterable[Dict[str, object]],
+    model: str,
+    url: str,
+    mode: str = DEFAULT_EMBED_MODE,
+    batch_size: int = 32,
+    concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+    cache: Optional[EmbeddingCache] = None,
+) -> Iterator[Tuple[Dict[str, object], List[float]]]:
+    """
+    (record, dense) 를 입력 레코드 순서 그대로 돌려준다.
+    batch 모드는 batch_size 단위 요청을 최대 concurrency 개까지 동시에 보내고, 완료 순서와 무관하게 제출 순서로 내보낸다.
+    cache가 주어지면 캐시에 있는 텍스트는 Ollama를 호출하지 않고, 새로 받은 벡터는 캐시에 저장한다.
+    """
+    endpoint = EMBED_ENDPOINT_BY_MODE[mode]
+    if mode == "serial":
+        for rec in records:
+            text = str(rec.get("text") or "").strip()
+            dense = cache.get(model, text, endpoint) if cache else None
+            if dense is None:
+                dense = embed_dense(text, model=model, url=url)
+                if cache:
+                    cache.put(model, text, dense, endpoint)
+            yield rec, dense
+        return
+
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def submit(chunk: List[Dict[str, object]]):
+            texts = [str(rec.get("text") or "").strip() for rec in chunk]
+            vectors = cache.get_many(model, texts, endpoint) if cache else [None] * len(texts)
+            miss_idx = [i for i, vec in enumerate(vectors) if vec is None]
+            future = None
+            if miss_idx:
+                future = pool.submit(embed_dense_batch, [texts[i] for i in miss_idx], model, url)
+            return chunk, texts, vectors, miss_idx, future
+
+        def resolve(entry) -> Iterator[Tuple[Dict[str, object], List[float]]]:
+            chunk, texts, vectors, miss_idx, future = entry
+            if future is not None:
+                fresh = future.result()
+                for i, vec in zip(miss_idx, fresh):
+                    vectors[i] = vec
+                if cache:
+                    cache.put_many(model, [texts[i] for i in miss_idx], fresh, endpoint)
+            return zip(chunk, vectors)
+
+        pending: deque = deque()
+        for chunk in chunked(records, max(1, batch_size)):
+            pending.append(submit(chunk))
+            if len(pending) >= concurrency:
+                yield from resolve(pending.popleft())
+        while pending:
+            yield from resolve(pending.popleft())
+
+
+def embed_chunk(
+    texts: List[str],
+    model: str,
+    url: str,
+    mode: str = DEFAULT_EMBED_MODE,
+    cache: Optional[EmbeddingCache] = None,
+) -> List[List[float]]:
+    """텍스트 묶음을 캐시 조회 후 miss만 임베딩한다 (파이프라인 임베딩 워커용)."""
+    endpoint = EMBED_ENDPOINT_BY_MODE[mode]
+    vectors = cache.get_many(model, texts, endpoint) if cache else [None] * len(texts)
+    miss_idx = [i for i, vec in enumerate(vectors) if vec is None]
+    if miss_idx:
+        miss_texts = [texts[i] for i in miss_idx]
+        if mode == "batch":
+            fresh = embed_dense_batch(miss_texts, model, url)
+        else:
+            fresh = [embed_dense(t, model=model, url=url) for t in miss_texts]
+        for i, vec in zip(miss_idx, fresh):
+            vectors[i] = vec
+        if cache:
+            cache.put_many(model, miss_texts, fresh, endpoint)
+    return vectors
+
+
+class StageStats:
+    """파이프라인 stage별 busy(작업)/idle(큐 대기) 시간 합계. 워커 여러 개면 워커 시간의 합."""
+
+    def __init__(self, name: str, workers: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.idle = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy: float = 0.0, idle: float = 0.0, items: int = 0) -> None:
+        with self._lock:
+            self.busy += busy
+            self.idle += idle
+            self.items += items
+
+    def describe(self) -> str:
+        total = self.busy + self.idle
+        util = (self.busy / total * 100) if total > 0 else 0.0
+        return (
+            f"{self.name}(x{self.workers}) busy={self.busy:.2f}s idle={self.idle:.2f}s "
+            f"util={util:.0f}% batches={self.items}"
+        )
+
+
+_STAGE_DONE = object()
+
+
+def _queue_put(q: queue.Queue, item: object, stats: StageStats, stop: threading.Event) -> bool:
+    wait_start = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    finally:
+        stats.add(idle=time.monotonic() - wait_start)
+
+
+def _queue_get(q: queue.Queue, stats: StageStats, stop: threading.Event) -> object:
+    wait_start = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STAGE_DONE
+    finally:
+        stats.add(idle=time.monotonic() - wait_start)
+
+
+def pipelined_ingest(
+    client: QdrantClient,
+    records: Iterable[Dict[str, object]],
+    variants: List[CollectionVariant],
+    model: str,
+    url: str,
+    mode: str = DEFAULT_EMBED_MODE,
+    batch_size: int = 32,
+    embed_workers: int = DEFAULT_EMBED_CONCURRENCY,
+    upsert_workers: int = DEFAULT_UPSERT_WORKERS,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    cache: Optional[EmbeddingCache] = None,
+    bulk_load: bool = False,
+) -> Tuple[int, List[StageStats], Dict[str, float], float]:
+    """
+    reader → 임베딩 워커 → upsert 워커를 bounded queue로 연결해 임베딩과 upsert를 겹쳐 실행한다.
+    큐가 차면 앞 stage가 대기(backpressure)하므로 메모리에는 최대 (2*queue_depth + 워커 수) 배치만 존재한다.
+    upsert는 wait=False로 보내고, 끝에서 컬렉션마다 wait=True no-op 연산으로 적용 완료를 확인한다.
+    반환: (processed, stage 통계, 컬렉션별 upsert 시간, barrier 시간)
+    """
+    embed_workers = max(1, embed_workers)
+    upsert_workers = max(1, upsert_workers)
+    embed_q: queue.Queue = queue.Queue(maxsize=max(1, queue_depth))
+    upsert_q: queue.Queue = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    reader_stats = StageStats("reader", 1)
+    embed_stats = StageStats("embed", embed_workers)
+    upsert_stats = StageStats("upsert", upsert_workers)
+    upsert_time_by_collection: Dict[str, float] = {v.name: 0.0 for v in variants}
+    state_lock = threading.Lock()
+    state = {"processed": 0, "embed_alive": embed_workers, "collections_ready": False}
+
+    def fail(exc: BaseException) -> None:
+        with state_lock:
+            errors.append(exc)
+        stop.set()
+
+    def reader() -> None:
+        try:
+            it = chunked(records, max(1, batch_size))
+            while True:
+                work_start = time.monotonic()
+                chunk = next(it, None)
+                reader_stats.add(busy=time.monotonic() - work_start, items=0 if chunk is None else 1)
+                if chunk is None:
+                    break
+                if not _queue_put(embed_q, chunk, reader_stats, stop):
+                    return
+        except BaseException as exc:  # noqa: BLE001 - 워커 예외는 main에서 다시 올린다
+            fail(exc)
+        finally:
+            for _ in range(embed_workers):
+                _queue_put(embed_q, _STAGE_DONE, reader_stats, stop)
+
+    def embedder() -> None:
+        try:
+            while True:
+                chunk = _queue_get(embed_q, embed_stats, stop)
+                if chunk is _STAGE_DONE:
+                    break
+                work_start = time.monotonic()
+                texts = [str(rec.get("text") or "").strip() for rec in chunk]
+                vectors = embed_chunk(texts, model, url, mode, cache)
+                embed_stats.add(busy=time.monotonic() - work_start, items=1)
+                if not _queue_put(upsert_q, (chunk, vectors), embed_stats, stop):
+                    return
+        except BaseException as exc:  # noqa: BLE001
+            fail(exc)
+        finally:
+            with state_lock:
+                state["embed_alive"] -= 1
+                last = state["embed_alive"] == 0
+            if last:
+                for _ in range(upsert_workers):
+                    _queue_put(upsert_q, _STAGE_DONE, embed_stats, stop)
+
+    def upserter() -> None:
+        try:
+            while True:
+                item = _queue_get(upsert_q, upsert_stats, stop)
+                if item is _STAGE_DONE:
+                    break
+                chunk, vectors = item
+                work_start = time.monotonic()
+                with state_lock:
+                    if not state["collections_ready"]:
+                        for variant in variants:
+                            check_vector(variant, vectors[0])
+                            ensure_variant(client, variant, len(vectors[0]), model)
+                            if bulk_load:
+                                disable_indexing(client, variant.name)
+                        state["collections_ready"] = True
+                batches = build_batches(variants, [make_point_id(rec) for rec in chunk], vectors, chunk)
+                for variant in variants:
+                    upsert_start = time.monotonic()
+                    client.upsert(collection_name=variant.name, points=batches[variant.name], wait=False)
+                    elapsed = time.monotonic() - upsert_start
+                    with state_lock:
+                        upsert_time_by_collection[variant.name] += elapsed
+                with state_lock:
+                    state["processed"] += len(chunk)
+                upsert_stats.add(busy=time.monotonic() - work_start, items=1)
+        except BaseException as exc:  # noqa: BLE001
+            fail(exc)
+
+    threads = [threading.Thread(target=reader, name="ingest-reader", daemon=True)]
+    threads += [threading.Thread(target=embedder, name=f"ingest-embed-{i}", daemon=True) for i in range(embed_workers)]
+    threads += [threading.Thread(target=upserter, name=f"ingest-upsert-{i}", daemon=True) for i in range(upsert_workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    # consistency barrier: wait=True 연산은 앞서 큐잉된 wait=False upsert가 모두 적용된 뒤에 끝난다.
+    barrier_start = time.monotonic()
+    if state["collections_ready"]:
+        for variant in variants:
+            client.delete(
+                collection_name=variant.name,
+                points_selector=qmodels.PointIdsList(points=[BARRIER_POINT_ID]),
+                wait=True,
+            )
+    barrier_time = time.monotonic() - barrier_start
+    return state["processed"], [reader_stats, embed_stats, upsert_stats], upsert_time_by_collection, barrier_time
+
+
+def fetch_existing_hashes(client: QdrantClient, collection: str, ids: List[str]) -> Dict[str, Optional[str]]:
+    """결정적 UUID5 ID로 기존 point를 retrieve해 {id: content_hash} 를 만든다 (없는 ID는 빠짐)."""
+    existing: Dict[str, Optional[str]] = {}
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        points = client.retrieve(
+            collection_name=collection,
+            ids=ids[start : start + ID_CHUNK_SIZE],
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            existing[str(point.id)] = (point.payload or {}).get("content_hash")
+    return existing
+
+
+def scroll_point_ids(client: QdrantClient, collection: str) -> set[str]:
+    ids: set[str] = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(p.id) for p in points)
+        if offset is None:
+            break
+    return ids
+
+
+def plan_incremental(
+    client: QdrantClient,
+    variants: List[CollectionVariant],
+    records: List[Dict[str, object]],
+) -> Tuple[List[Dict[str, object]], Dict[str, Dict[str, int]], Dict[str, List[str]]]:
+    """
+    레코드를 컬렉션별 기존 content_hash와 비교해 added/updated/unchanged로 나누고, 소스에서 사라진 point를 찾는다.
+    반환: (다시 임베딩할 레코드 — 어느 한 컬렉션이라도 필요하면 포함, 컬렉션별 카운트, 컬렉션별 삭제 대상 ID)
+    """
+    wanted: Dict[str, Dict[str, object]] = {}
+    for rec in records:
+        wanted[str(make_point_id(rec))] = rec  # 같은 ID가 반복되면 마지막 레코드가 적재된다
+    wanted_ids = list(wanted)
+    dirty: set[str] = set()
+    counts: Dict[str, Dict[str, int]] = {}
+    stale: Dict[str, List[str]] = {}
+    for variant in variants:
+        if client.collection_exists(variant.name):
+            existing = fetch_existing_hashes(client, variant.name, wanted_ids)
+            stale[variant.name] = sorted(scroll_point_ids(client, variant.name) - set(wanted_ids))
+        else:
+            existing = {}
+            stale[variant.name] = []
+        added = updated = unchanged = 0
+        for pid, rec in wanted.items():
+            if pid not in existing:
+                added += 1
+                dirty.add(pid)
+            elif existing[pid] != rec.get("content_hash"):
+                updated += 1
+                dirty.add(pid)
+            else:
+                unchanged += 1
+        counts[variant.name] = {
+            "added": added,
+            "updated": updated,
+            "unchanged": unchanged,
+            "deleted": len(stale[variant.name]),
+        }
+    to_embed = [rec for pid, rec in wanted.items() if pid in dirty]
+    return to_embed, counts, stale
+
+
+def delete_points(client: QdrantClient, collection: str, ids: List[str]) -> None:
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        client.delete(
+            collection_name=collection,
+            points_selector=qmodels.PointIdsList(points=ids[start : start + ID_CHUNK_SIZE]),
+            wait=True,
+        )
+
+
 def resolve_distance(name: str) -> qmodels.Distance:
     name = (name or "").strip().lower()
     if name == "dot":
@@ -104,6 +631,135 @@ def resolve_distance(name: str) -> qmodels.Distance:
     return qmodels.Distance.COSINE
 
 
+def derive_collection_name(
+    base_collection: str,
+    distance: str = DEFAULT_DISTANCE,
+    hnsw_m: int = DEFAULT_HNSW_M,
+    hnsw_ef_construct: int = DEFAULT_HNSW_EF_CONSTRUCT,
+    on_disk: bool = DEFAULT_ON_DISK,
+    quantization: str = DEFAULT_QUANTIZATION,
+    pq_compression: str = DEFAULT_PQ_COMPRESSION,
+    datatype: str = DEFAULT_DATATYPE,
+    dims: Optional[int] = None,
+) -> str:
+    # suffix 규칙: cosine + 기본 HNSW + on_disk False 는 그대로, 나머지는 <distance>[_mX-efY][_disk][_sq8|_pq-x16|_bq][_f16|_u8][_dN] suffix 부여
+    base_collection = base_collection or DEFAULT_COLLECTION
+    suffix_parts: list[str] = []
+    if distance != DEFAULT_DISTANCE:
+        suffix_parts.append(distance)
+    if hnsw_m != DEFAULT_HNSW_M or hnsw_ef_construct != DEFAULT_HNSW_EF_CONSTRUCT:
+        suffix_parts.append(f"m{hnsw_m}-ef{hnsw_ef_construct}")
+    if on_disk:
+        suffix_parts.append("disk")
+    if quantization != DEFAULT_QUANTIZATION:
+        suffix = QUANTIZATION_SUFFIX[quantization]
+        suffix_parts.append(f"{suffix}-{pq_compression}" if quantization == "product" else suffix)
+    if datatype != DEFAULT_DATATYPE:
+        suffix_parts.append(DATATYPE_SUFFIX[datatype])
+    if dims:
+        suffix_parts.append(f"d{dims}")
+    if suffix_parts:
+        return f"{base_collection}_{'_'.join(suffix_parts)}"
+    return base_collection
+
+
+def parse_grid_distances(value: str) -> List[str]:
+    names = [v.strip().lower() for v in value.split(",") if v.strip()]
+    bad = [n for n in names if n not in DISTANCE_CHOICES]
+    if bad or not names:
+        raise argparse.ArgumentTypeError(f"distance must be one of {sorted(DISTANCE_CHOICES)}: {value}")
+    return names
+
+
+def parse_grid_hnsw(value: str) -> List[Tuple[int, int]]:
+    pairs: List[Tuple[int, int]] = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            m, ef = item.split(":")
+            pairs.append((int(m), int(ef)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"HNSW grid item must be M:EF_CONSTRUCT (e.g. 16:100): {item}")
+    if not pairs:
+        raise argparse.ArgumentTypeError(f"empty HNSW grid: {value}")
+    return pairs
+
+
+def parse_grid_on_disk(value: str) -> List[bool]:
+    mapping = {"true": True, "disk": True, "1": True, "false": False, "memory": False, "0": False}
+    flags: List[bool] = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if item not in mapping:
+            raise argparse.ArgumentTypeError(f"on_disk grid item must be true/false: {item}")
+        flags.append(mapping[item])
+    if not flags:
+        raise argparse.ArgumentTypeError(f"empty on_disk grid: {value}")
+    return flags
+
+
+def parse_grid_dims(value: str) -> List[Optional[int]]:
+    dims: List[Optional[int]] = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if item in {"full", "0"}:
+            dims.append(None)
+            continue
+        try:
+            dims.append(int(item))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"dims grid item must be an integer or 'full': {item}")
+    if not dims:
+        raise argparse.ArgumentTypeError(f"empty dims grid: {value}")
+    return dims
+
+
+def build_variants(args: argparse.Namespace) -> List[CollectionVariant]:
+    """--grid-* 옵션의 곱집합(없으면 단일 설정)을 컬렉션 변형 목록으로 만든다. 이름이 같은 변형은 한 번만 적재."""
+    distances = args.grid_distance or [(args.distance or DEFAULT_DISTANCE).lower()]
+    hnsw_pairs = args.grid_hnsw or [(args.hnsw_m, args.hnsw_ef_construct)]
+    on_disks = args.grid_on_disk or [args.on_disk]
+    dims_list = args.grid_dims or [args.dims or None]
+    payload_indexes = () if args.no_payload_index else tuple(args.payload_index)
+    variants: Dict[str, CollectionVariant] = {}
+    for distance, (hnsw_m, hnsw_ef), on_disk, dims in product(distances, hnsw_pairs, on_disks, dims_list):
+        name = derive_collection_name(
+            args.collection,
+            distance,
+            hnsw_m,
+            hnsw_ef,
+            on_disk,
+            args.quantization,
+            args.pq_compression,
+            args.vector_datatype,
+            dims,
+        )
+        variants.setdefault(
+            name,
+            CollectionVariant(
+                name,
+                distance,
+                hnsw_m,
+                hnsw_ef,
+                on_disk,
+                payload_indexes,
+                quantization=args.quantization,
+                quantization_always_ram=args.quantization_always_ram,
+                pq_compression=args.pq_compression,
+                scalar_quantile=args.scalar_quantile,
+                datatype=args.vector_datatype,
+                dims=dims,
+            ),
+        )
+    return list(variants.values())
+
+
 def ensure_collection(
     client: QdrantClient,
     name: str,
@@ -112,6 +768,10 @@ def ensure_collection(
     hnsw_m: int = DEFAULT_HNSW_M,
     hnsw_ef_construct: int = DEFAULT_HNSW_EF_CONSTRUCT,
     on_disk: bool = DEFAULT_ON_DISK,
+    payload_indexes: Iterable[str] = DEFAULT_PAYLOAD_INDEXES,
+    quantization_config: Optional[qmodels.QuantizationConfig] = None,
+    datatype: str = DEFAULT_DATATYPE,
+    metadata: Optional[Dict[str, object]] = None,
 ) -> None:
     if client.collection_exists(name):
         return
@@ -121,9 +781,154 @@ def ensure_collection(
             distance=resolve_distance(distance),
             hnsw_config=qmodels.HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct),
             on_disk=on_disk,
+            quantization_config=quantization_config,
+            datatype=qmodels.Datatype(datatype) if datatype != DEFAULT_DATATYPE else None,
         )
     }
-    client.create_collection(collection_name=name, vectors_config=vectors_config)
+    client.create_collection(collection_name=name, vectors_config=vectors_config, metadata=metadata)
+    # placeholder 조회(id/image_link 필터) 등이 전체 스캔이 되지 않도록 keyword index를 만든다.
+    for field in payload_indexes:
+        client.create_payload_index(
+            collection_name=name,
+            field_name=field,
+            field_schema=qmodels.PayloadSchemaType.KEYWORD,
+            wait=True,
+        )
+
+
+def build_quantization_config(variant: CollectionVariant) -> Optional[qmodels.QuantizationConfig]:
+    if variant.quantization == "scalar":
+        return qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(
+                type=qmodels.ScalarType.INT8,
+                quantile=variant.scalar_quantile,
+                always_ram=variant.quantization_always_ram,
+            )
+        )
+    if variant.quantization == "product":
+        return qmodels.ProductQuantization(
+            product=qmodels.ProductQuantizationConfig(
+                compression=qmodels.CompressionRatio(variant.pq_compression),
+                always_ram=variant.quantization_always_ram,
+            )
+        )
+    if variant.quantization == "binary":
+        return qmodels.BinaryQuantization(
+            binary=qmodels.BinaryQuantizationConfig(always_ram=variant.quantization_always_ram)
+        )
+    return None
+
+
+def check_vector(variant: CollectionVariant, dense: List[float]) -> None:
+    """첫 임베딩으로 변형 설정을 검증한다 (절단 차원, uint8 datatype)."""
+    if variant.dims and variant.dims > len(dense):
+        raise SystemExit(
+            f"Collection '{variant.name}': --dims {variant.dims} exceeds the embedding size {len(dense)}"
+        )
+    # uint8 datatype은 0~255 정수 벡터만 손실 없이 저장된다. float 임베딩이면 scalar 양자화를 쓰도록 막는다.
+    if variant.datatype != "uint8":
+        return
+    if any(v < 0 or v > 255 or float(v) != int(v) for v in dense):
+        raise SystemExit(
+            f"Collection '{variant.name}': --vector-datatype uint8 requires integer embeddings in [0, 255]; "
+            "the embed model returned float values. Use --quantization scalar instead."
+        )
+
+
+def query_dims_from_metadata(metadata: Optional[dict]) -> Optional[int]:
+    """ensure_variant가 남긴 컬렉션 메타데이터에서 질문 임베딩 절단 차원. 절단하지 않은 컬렉션/메타데이터 없음이면 None."""
+    metadata = metadata or {}
+    dims = metadata.get("embed_dims")
+    if dims and metadata.get("source_dims") and dims >= metadata["source_dims"]:
+        return None
+    return dims or None
+
+
+def ensure_variant(
+    client: QdrantClient, variant: CollectionVariant, full_size: int, embed_model: Optional[str] = None
+) -> None:
+    dense_size = min(variant.dims or full_size, full_size)
+    ensure_collection(
+        client,
+        variant.name,
+        dense_size,
+        variant.distance,
+        variant.hnsw_m,
+        variant.hnsw_ef_construct,
+        variant.on_disk,
+        variant.payload_indexes,
+        build_quantization_config(variant),
+        variant.datatype,
+        # QA/벤치마크가 쿼리 벡터를 같은 차원으로 절단할 수 있도록 컬렉션 메타데이터에 남긴다.
+        {"embed_model": embed_model, "embed_dims": dense_size, "source_dims": full_size},
+    )
+
+
+def disable_indexing(client: QdrantClient, name: str) -> None:
+    """bulk load 동안 HNSW 그래프를 만들지 않도록 m=0, indexing_threshold=0 으로 바꾼다."""
+    client.update_collection(
+        collection_name=name,
+        vectors_config={"dense": qmodels.VectorParamsDiff(hnsw_config=qmodels.HnswConfigDiff(m=0))},
+        optimizers_config=qmodels.OptimizersConfigDiff(indexing_threshold=0),
+    )
+
+
+def enable_indexing(
+    client: QdrantClient, variant: CollectionVariant, indexing_threshold: int = DEFAULT_INDEXING_THRESHOLD
+) -> None:
+    client.update_collection(
+        collection_name=variant.name,
+        vectors_config={
+            "dense": qmodels.VectorParamsDiff(
+                hnsw_config=qmodels.HnswConfigDiff(m=variant.hnsw_m, ef_construct=variant.hnsw_ef_construct)
+            )
+        },
+        optimizers_config=qmodels.OptimizersConfigDiff(indexing_threshold=indexing_threshold),
+    )
+
+
+def wait_for_green(client: QdrantClient, name: str, timeout: float = DEFAULT_INDEX_WAIT_TIMEOUT) -> bool:
+    """optimizer가 끝나 컬렉션 status가 green이 될 때까지 대기. timeout이면 False."""
+    deadline = time.monotonic() + timeout
+    # 설정 변경 직후에는 optimizer가 아직 시작 전이라 잠깐 green으로 보일 수 있다.
+    time.sleep(0.5)
+    while time.monotonic() < deadline:
+        if client.get_collection(name).status == qmodels.CollectionStatus.GREEN:
+            return True
+        time.sleep(1.0)
+    return False
+
+
+def estimate_vector_mb(client: QdrantClient, variant: CollectionVariant) -> Optional[float]:
+    """원본 dense 벡터 저장 크기 추정 (points × dims × datatype 바이트, 양자화/HNSW 그래프 제외)."""
+    try:
+        info = client.get_collection(variant.name)
+        params = info.config.params.vectors["dense"]
+        points = info.points_count or 0
+    except Exception:
+        return None
+    bytes_per_dim = {"float32": 4, "float16": 2, "uint8": 1}[variant.datatype]
+    return points * params.size * bytes_per_dim / (1024 * 1024)
+
+
+def build_batches(
+    variants: List[CollectionVariant],
+    ids: List[str | int],
+    vectors: List[List[float]],
+    payloads: List[Dict[str, object]],
+) -> Dict[str, qmodels.Batch]:
+    """변형별 upsert Batch. 절단 차원이 같은 변형은 같은 Batch를 공유한다."""
+    by_dims: Dict[Optional[int], qmodels.Batch] = {}
+    batches: Dict[str, qmodels.Batch] = {}
+    for variant in variants:
+        if variant.dims not in by_dims:
+            by_dims[variant.dims] = qmodels.Batch(
+                ids=ids,
+                vectors={"dense": [truncate_embedding(vec, variant.dims) for vec in vectors]},
+                payloads=payloads,
+            )
+        batches[variant.name] = by_dims[variant.dims]
+    return batches
 
 
 def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
@@ -131,6 +936,8 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser.add_argument("--base-dir", default="output/final", type=Path, help="final JSON 루트")
     parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
     parser.add_argument("--ollama-url", default=os.environ.get("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--prefer-grpc", action="store_true", help="Qdrant gRPC 전송 사용 (기본: REST)")
+    parser.add_argument("--grpc-port", type=int, default=DEFAULT_GRPC_PORT, help=f"Qdrant gRPC 포트 (기본: {DEFAULT_GRPC_PORT})")
     parser.add_argument("--embed-model", default="snowflake-arctic-embed2", help="Ollama 임베딩 모델명")
     parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Qdrant 컬렉션명 (기본: final_embeddings)")
     parser.add_argument("--batch-size", type=int, default=32)
@@ -158,62 +965,197 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
         default=DEFAULT_ON_DISK,
         help="벡터를 디스크에 저장 (기본: 메모리)",
     )
+    parser.add_argument(
+        "--embed-mode",
+        default=DEFAULT_EMBED_MODE,
+        choices=EMBED_MODE_CHOICES,
+        help=(
+            "serial: 레코드당 /api/embeddings 호출, batch: --batch-size 개씩 /api/embed 호출 "
+            "(정규화된 벡터를 받으므로 cosine 컬렉션만) (기본: serial)"
+        ),
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=DEFAULT_EMBED_CONCURRENCY,
+        help=f"batch 모드에서 동시에 보내는 임베딩 요청 수 (기본: {DEFAULT_EMBED_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="reader/임베딩/upsert를 bounded queue 파이프라인으로 겹쳐 실행 (upsert는 wait=False + 마지막 barrier)",
+    )
+    parser.add_argument(
+        "--upsert-workers",
+        type=int,
+        default=DEFAULT_UPSERT_WORKERS,
+        help=f"--pipeline upsert 워커 수 (기본: {DEFAULT_UPSERT_WORKERS}, 임베딩 워커 수는 --embed-concurrency)",
+    )
+    parser.add_argument(
+        "--queue-depth",
+        type=int,
+        default=DEFAULT_QUEUE_DEPTH,
+        help=f"--pipeline stage 사이 큐 최대 배치 수 (기본: {DEFAULT_QUEUE_DEPTH})",
+    )
+    parser.add_argument(
+        "--quantization",
+        default=DEFAULT_QUANTIZATION,
+        choices=QUANTIZATION_CHOICES,
+        help="벡터 양자화: scalar(int8), product, binary (기본: none)",
+    )
+    parser.add_argument(
+        "--quantization-always-ram",
+        action="store_true",
+        help="양자화 벡터를 항상 RAM에 유지 (원본은 --on-disk 로 디스크에 둘 수 있음)",
+    )
+    parser.add_argument(
+        "--pq-compression",
+        default=DEFAULT_PQ_COMPRESSION,
+        choices=PQ_COMPRESSION_CHOICES,
+        help=f"product 양자화 압축률 (기본: {DEFAULT_PQ_COMPRESSION})",
+    )
+    parser.add_argument(
+        "--scalar-quantile",
+        type=float,
+        default=DEFAULT_SCALAR_QUANTILE,
+        help=f"scalar 양자화 범위 계산에 쓰는 quantile (기본: {DEFAULT_SCALAR_QUANTILE})",
+    )
+    parser.add_argument(
+        "--vector-datatype",
+        default=DEFAULT_DATATYPE,
+        choices=DATATYPE_CHOICES,
+        help="저장 datatype: float16은 메모리 절반, uint8은 0~255 정수 임베딩 전용 (기본: float32)",
+    )
+    parser.add_argument(
+        "--dims",
+        type=int,
+        help="Matryoshka 절단 차원 (예: 256, 512). 앞 N차원만 남기고 재정규화, 컬렉션명에 _dN suffix",
+    )
+    parser.add_argument(
+        "--grid-dims",
+        type=parse_grid_dims,
+        help="fan-out 적재할 절단 차원 목록 (예: 256,512,full). 지정 시 --dims 대신 사용",
+    )
+    parser.add_argument(
+        "--payload-index",
+        type=lambda v: [f.strip() for f in v.split(",") if f.strip()],
+        default=list(DEFAULT_PAYLOAD_INDEXES),
+        help=f"컬렉션 생성 시 keyword payload index를 만들 필드 (기본: {','.join(DEFAULT_PAYLOAD_INDEXES)})",
+    )
+    parser.add_argument("--no-payload-index", action="store_true", help="payload index를 만들지 않음")
+    parser.add_argument(
+        "--bulk-load",
+        action="store_true",
+        help="인덱싱(HNSW m=0, indexing_threshold=0)을 끈 채 전부 upsert한 뒤, 설정된 HNSW로 인덱싱을 켜고 완료까지 대기",
+    )
+    parser.add_argument(
+        "--indexing-threshold",
+        type=int,
+        default=DEFAULT_INDEXING_THRESHOLD,
+        help=f"--bulk-load 종료 후 복원할 optimizer indexing_threshold(KB) (기본: {DEFAULT_INDEXING_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--index-wait-timeout",
+        type=float,
+        default=DEFAULT_INDEX_WAIT_TIMEOUT,
+        help=f"--bulk-load 인덱스 빌드 대기 최대 시간(초) (기본: {DEFAULT_INDEX_WAIT_TIMEOUT:.0f})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="payload content_hash를 비교해 바뀐 레코드만 재임베딩하고, 소스에서 사라진 point는 삭제",
+    )
+    parser.add_argument(
+        "--grid-distance",
+        type=parse_grid_distances,
+        help="fan-out 적재할 distance 목록 (예: cosine,dot,euclid). 지정 시 --distance 대신 사용",
+    )
+    parser.add_argument(
+        "--grid-hnsw",
+        type=parse_grid_hnsw,
+        help="fan-out 적재할 HNSW m:ef_construct 목록 (예: 16:100,32:200). 지정 시 --hnsw-m/--hnsw-ef-construct 대신 사용",
+    )
+    parser.add_argument(
+        "--grid-on-disk",
+        type=parse_grid_on_disk,
+        help="fan-out 적재할 on_disk 목록 (예: false,true). 지정 시 --on-disk 대신 사용",
+    )
+    parser.add_argument(
+        "--embed-cache",
+        type=Path,
+        default=DEFAULT_CACHE_PATH,
+        help="임베딩 캐시 sqlite 경로 (기본: output/cache/embed_cache.sqlite)",
+    )
+    parser.add_argument("--no-embed-cache", action="store_true", help="임베딩 캐시를 사용하지 않음")
+    parser.add_argument(
+        "--embed-cache-dtype",
+        default=DEFAULT_CACHE_DTYPE,
+        choices=CACHE_DTYPE_CHOICES,
+        help="캐시 저장 dtype (기본: float32, float16은 절반 크기지만 정밀도 손실)",
+    )
+    parser.add_argument(
+        "--embed-cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"캐시 최대 크기(MB), 초과 시 오래 안 쓴 항목부터 삭제 (기본: {DEFAULT_CACHE_MAX_MB}, 0이면 무제한)",
+    )
+    parser.add_argument(
+        "--export-local-index",
+        action="store_true",
+        help="적재 후 컬렉션별 벡터/payload를 output/local_index/<collection>에 export (qdrant_qa.py --backend local용)",
+    )
+    parser.add_argument(
+        "--local-index-dtype",
+        choices=LOCAL_DTYPE_CHOICES,
+        default=DEFAULT_LOCAL_DTYPE,
+        help=f"--export-local-index 저장 dtype (기본: {DEFAULT_LOCAL_DTYPE})",
+    )
+    parser.add_argument(
+        "--lexical-index",
+        action="store_true",
+        help="적재 후 레코드 text의 문자 n-gram BM25 색인을 output/lexical_index/<collection>에 저장 (qdrant_qa.py --lexical용)",
+    )
+    add_http_args(parser)
     return parser.parse_args(argv)
 
 
 def main(argv: Optional[List[str]] = None) -> int:
     args = parse_args(argv)
-    base_collection = args.collection or DEFAULT_COLLECTION
-    distance_name = (args.distance or DEFAULT_DISTANCE).lower()
-    # suffix 규칙: cosine + 기본 HNSW + on_disk False + final_embeddings 은 그대로, 나머지는 suffix 부여
-    use_defaults = (
-        base_collection == DEFAULT_COLLECTION
-        and distance_name == DEFAULT_DISTANCE
-        and args.hnsw_m == DEFAULT_HNSW_M
-        and args.hnsw_ef_construct == DEFAULT_HNSW_EF_CONSTRUCT
-        and args.on_disk == DEFAULT_ON_DISK
-    )
-    suffix_parts: list[str] = []
-    if distance_name != DEFAULT_DISTANCE:
-        suffix_parts.append(distance_name)
-    if args.hnsw_m != DEFAULT_HNSW_M or args.hnsw_ef_construct != DEFAULT_HNSW_EF_CONSTRUCT:
-        suffix_parts.append(f"m{args.hnsw_m}-ef{args.hnsw_ef_construct}")
-    if args.on_disk:
-        suffix_parts.append("disk")
-    if suffix_parts and not use_defaults:
-        args.collection = f"{base_collection}_{'_'.join(suffix_parts)}"
-    else:
-        args.collection = base_collection
+    configure_from_args(args)
+    variants = build_variants(args)
+    if args.embed_mode == "batch":
+        non_cosine = [v.name for v in variants if v.distance != "cosine"]
+        if non_cosine:
+            raise SystemExit(
+                f"--embed-mode batch requires cosine distance (/api/embed returns L2-normalized vectors, "
+                f"serial /api/embeddings does not): {', '.join(non_cosine)}"
+            )
     if not args.base_dir.exists():
         raise SystemExit(f"Base dir not found: {args.base_dir}")
 
-    client = QdrantClient(url=args.qdrant_url)
+    client = connect_qdrant(args.qdrant_url, args.prefer_grpc, args.grpc_port)
+    cache: Optional[EmbeddingCache] = None
+    if not args.no_embed_cache:
+        cache = EmbeddingCache(
+            args.embed_cache,
+            dtype=args.embed_cache_dtype,
+            max_bytes=args.embed_cache_max_mb * 1024 * 1024 if args.embed_cache_max_mb > 0 else None,
+        )
 
     buffer: List[Dict[str, object]] = []
     dense_vectors: List[List[float]] = []
-    sparse_vectors: List[Dict[str, List[float]]] = []
     dense_size: Optional[int] = None
     processed = 0
     start_ts = time.monotonic()
     embed_time_total = 0.0
     upsert_time_total = 0.0
+    upsert_time_by_collection: Dict[str, float] = {v.name: 0.0 for v in variants}
+    upsert_pool = ThreadPoolExecutor(max_workers=len(variants))
 
-    def make_point_id(rec: Dict[str, object]) -> str | int:
-        """
-        Qdrant point id 생성: 동일 id를 여러 문서에서 재사용해도 충돌하지 않도록
-        record_type/id/placeholder/filename/image_link/section_path/page를 모두 포함해 UUID5를 만든다.
-        """
-        parts = [
-            rec.get("record_type") or "",
-            rec.get("id") or rec.get("placeholder") or "",
-            rec.get("filename") or "",
-            rec.get("image_link") or "",
-            rec.get("section_path") or "",
-            rec.get("page") or "",
-        ]
-        key = "||".join(str(p) for p in parts)
-        # UUID string을 입력해도 동일 결과가 나오도록 한번 더 UUID5로 감싼다.
-        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+    def upsert_one(collection: str, batch: qmodels.Batch) -> float:
+        upsert_start = time.monotonic()
+        client.upsert(collection_name=collection, points=batch)
+        return time.monotonic() - upsert_start
 
     def flush_batch():
         nonlocal buffer, dense_vectors, upsert_time_total
@@ -223,62 +1165,153 @@ def main(argv: Optional[List[str]] = None) -> int:
         ids: List[str | int] = []
         for rec in buffer:
             ids.append(make_point_id(rec))
+        batches = build_batches(variants, ids, dense_vectors, buffer)
         flush_start = time.monotonic()
-        client.upsert(
-            collection_name=args.collection,
-            points=qmodels.Batch(ids=ids, vectors={"dense": dense_vectors}, payloads=buffer),
-        )
+        # 임베딩은 한 번만 계산하고 모든 컬렉션 변형에 동시에 upsert
+        futures = {v.name: upsert_pool.submit(upsert_one, v.name, batches[v.name]) for v in variants}
+        for name, future in futures.items():
+            upsert_time_by_collection[name] += future.result()
         upsert_time_total += (time.monotonic() - flush_start)
-        buffer.clear()
-        dense_vectors.clear()
+        buffer = []
+        dense_vectors = []
 
-    for record in iter_records(args.base_dir):
-        content = (record.get("text") or "").strip()
-        if not content:
-            continue
-        embed_start = time.monotonic()
-        dense = embed_dense(content, model=args.embed_model, url=args.ollama_url)
-        embed_time_total += (time.monotonic() - embed_start)
-        if dense_size is None:
-            dense_size = len(dense)
-            ensure_collection(
-                client,
-                args.collection,
-                dense_size,
-                distance_name,
-                args.hnsw_m,
-                args.hnsw_ef_construct,
-                args.on_disk,
-            )
-        buffer.append(record)
-        dense_vectors.append(dense)
-        processed += 1
-
-        if len(buffer) >= args.batch_size:
-            flush_batch()
+    def tag_hash(rec: Dict[str, object]) -> Dict[str, object]:
+        # 다음 --incremental 실행에서 비교할 수 있도록 모든 적재에 content_hash/embed_model을 남긴다.
+        rec["content_hash"] = content_hash(str(rec.get("text") or "").strip(), args.embed_model)
+        rec["embed_model"] = args.embed_model
+        return rec
 
-    if buffer:
-        if dense_size is None:
-            raise RuntimeError("No embeddings generated.")
-        ensure_collection(
+    records, duplicates = unique_records(
+        tag_hash(rec) for rec in iter_records(args.base_dir) if (rec.get("text") or "").strip()
+    )
+    if duplicates:
+        print(f"[INFO] skipped {duplicates} duplicate records (same point id, last one kept)")
+    all_records = records
+    incremental_counts: Dict[str, Dict[str, int]] = {}
+    stale_ids: Dict[str, List[str]] = {}
+    if args.incremental:
+        records, incremental_counts, stale_ids = plan_incremental(client, variants, records)
+    stage_stats: List[StageStats] = []
+    barrier_time = 0.0
+    if args.pipeline:
+        processed, stage_stats, upsert_time_by_collection, barrier_time = pipelined_ingest(
             client,
-            args.collection,
-            dense_size,
-            distance_name,
-            args.hnsw_m,
-            args.hnsw_ef_construct,
-            args.on_disk,
+            records,
+            variants,
+            model=args.embed_model,
+            url=args.ollama_url,
+            mode=args.embed_mode,
+            batch_size=args.batch_size,
+            embed_workers=args.embed_concurrency,
+            upsert_workers=args.upsert_workers,
+            queue_depth=args.queue_depth,
+            cache=cache,
+            bulk_load=args.bulk_load,
         )
-        flush_start = time.monotonic()
-        flush_batch()
-        upsert_time_total += (time.monotonic() - flush_start)
+        embed_time_total = stage_stats[1].busy
+        upsert_time_total = stage_stats[2].busy + barrier_time
+    else:
+        embedded = iter_embeddings(
+            records,
+            model=args.embed_model,
+            url=args.ollama_url,
+            mode=args.embed_mode,
+            batch_size=args.batch_size,
+            concurrency=args.embed_concurrency,
+            cache=cache,
+        )
+        while True:
+            # batch 모드에서는 임베딩 결과를 기다린 시간만 embed_time 으로 집계된다.
+            embed_start = time.monotonic()
+            item = next(embedded, None)
+            embed_time_total += (time.monotonic() - embed_start)
+            if item is None:
+                break
+            record, dense = item
+            if dense_size is None:
+                dense_size = len(dense)
+                for variant in variants:
+                    check_vector(variant, dense)
+                    ensure_variant(client, variant, dense_size, args.embed_model)
+                    if args.bulk_load:
+                        disable_indexing(client, variant.name)
+            buffer.append(record)
+            dense_vectors.append(dense)
+            processed += 1
+
+            if len(buffer) >= args.batch_size:
+                flush_batch()
+
+        if buffer:
+            flush_batch()
+    upsert_pool.shutdown()
+    for name, ids in stale_ids.items():
+        if ids:
+            delete_points(client, name, ids)
+
+    index_time_by_collection: Dict[str, Tuple[float, bool]] = {}
+    load_time = time.monotonic() - start_ts
+    if args.bulk_load and (dense_size is not None or processed):
+        # 적재가 끝난 뒤에 설정된 HNSW 파라미터로 인덱싱을 켜고 optimizer 완료까지 기다린다.
+        for variant in variants:
+            index_start = time.monotonic()
+            enable_indexing(client, variant, args.indexing_threshold)
+            ready = wait_for_green(client, variant.name, args.index_wait_timeout)
+            index_time_by_collection[variant.name] = (time.monotonic() - index_start, ready)
 
     elapsed = time.monotonic() - start_ts
-    print(
-        f"[DONE] Ingested {processed} points into collection '{args.collection}' "
-        f"(distance={distance_name}, hnsw_m={args.hnsw_m}, ef_construct={args.hnsw_ef_construct}, on_disk={args.on_disk}) "
-        f"elapsed={elapsed:.2f}s embed_time={embed_time_total:.2f}s upsert_time={upsert_time_total:.2f}s"
-    )
+    export_time_by_collection: Dict[str, Tuple[float, Path]] = {}
+    if args.export_local_index:
+        # upsert는 wait=True(또는 pipeline barrier)로 끝났으므로 scroll에 전부 보인다.
+        for variant in variants:
+            export_start = time.monotonic()
+            out_dir = export_local_index(client, variant.name, default_index_dir(variant.name), args.local_index_dtype)
+            export_time_by_collection[variant.name] = (time.monotonic() - export_start, out_dir)
+    lexical_time_by_collection: Dict[str, Tuple[float, Path]] = {}
+    if args.lexical_index:
+        # --incremental이어도 색인은 소스 전체로 다시 만든다 (임베딩이 없어 수 초 이내)
+        lexical_docs = [(make_point_id(rec), rec) for rec in all_records]
+        for variant in variants:
+            lexical_start = time.monotonic()
+            out_dir = build_lexical_index(lexical_docs, default_lexical_dir(variant.name), variant.name)
+            lexical_time_by_collection[variant.name] = (time.monotonic() - lexical_start, out_dir)
+    cache_stats = cache.stats() if cache else "cache=off"
+    if cache:
+        cache.close()
+    # 변형마다 한 줄씩 기존 포맷으로 출력 (embed_time/elapsed는 모든 변형이 공유)
+    for variant in variants:
+        vector_mb = estimate_vector_mb(client, variant)
+        mem_part = f" vector_mem={vector_mb:.2f}MB" if vector_mb is not None else ""
+        print(
+            f"[DONE] Ingested {processed} points into collection '{variant.name}' "
+            f"({variant.describe()}, embed_mode={args.embed_mode}) "
+            f"elapsed={elapsed:.2f}s embed_time={embed_time_total:.2f}s "
+            f"upsert_time={upsert_time_by_collection[variant.name]:.2f}s {cache_stats}{mem_part}"
+        )
+    for name, counts in incremental_counts.items():
+        print(
+            f"[INCREMENTAL] collection '{name}' added={counts['added']} updated={counts['updated']} "
+            f"unchanged={counts['unchanged']} deleted={counts['deleted']}"
+        )
+    for name, (index_time, ready) in index_time_by_collection.items():
+        print(
+            f"[BULK] collection '{name}' load_time={load_time:.2f}s index_time={index_time:.2f}s"
+            + ("" if ready else f" (timeout after {args.index_wait_timeout:.0f}s, status not green)")
+        )
+    for name, (export_time, out_dir) in export_time_by_collection.items():
+        print(f"[LOCAL] collection '{name}' exported to {out_dir} ({export_time:.2f}s, dtype={args.local_index_dtype})")
+    for name, (lexical_time, out_dir) in lexical_time_by_collection.items():
+        print(f"[LEXICAL] collection '{name}' indexed to {out_dir} ({lexical_time:.2f}s)")
+    if stage_stats:
+        # busy 비율이 높은 stage가 병목
+        print(
+            "[PIPELINE] " + " | ".join(st.describe() for st in stage_stats) + f" | barrier={barrier_time:.2f}s"
+        )
+    if len(variants) > 1:
+        print(
+            f"[DONE] fan-out {len(variants)} collections, upsert_wall_time={upsert_time_total:.2f}s "
+            f"(single embedding pass)"
+        )
     return 0
 
 
@@ -3,11 +3,18 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
+import hashlib
 import json
 import os
 import re
+import sys
+import threading
 import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import List, Dict, Optional
 
@@ -15,6 +22,40 @@ import requests
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.append(str(SCRIPT_DIR))
+
+from cassette import CASSETTE_MODES, DEFAULT_REPLAY_LATENCY, Cassette, parse_replay_latency
+from context_packer import DEFAULT_CONTEXT_BUDGET, DEFAULT_DEDUP_THRESHOLD, pack_contexts
+from embed_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+from http_client import add_http_args, configure_from_args, post_json
+from lexical_index import DEFAULT_LEXICAL_MIN_MATCH, LexicalIndex, default_lexical_dir, fuse_rrf
+from local_index import (
+    DEFAULT_LOCAL_DTYPE,
+    LOCAL_DTYPE_CHOICES,
+    LocalIndex,
+    default_index_dir,
+    export_local_index,
+)
+from qa_cache import (
+    DEFAULT_ANSWER_CACHE_PATH,
+    DEFAULT_ANSWER_SIMILARITY,
+    DEFAULT_SEARCH_CACHE_PATH,
+    SearchResultCache,
+    SemanticAnswerCache,
+    collection_fingerprint,
+)
+from qdrant_ingest import (
+    DEFAULT_GRPC_PORT,
+    EMBED_DENSE_ENDPOINT,
+    connect_qdrant,
+    embed_dense,
+    query_dims_from_metadata,
+    truncate_embedding,
+)
+from query_filter import FILTER_FIELDS, QueryAnalyzer, QueryFilter, collection_filenames
+
 
 # ----- 사용자 조정용 상수 -----
 # build_prompt 참고 
@@ -27,72 +68,210 @@ SYSTEM_PROMPT = (
 DEFAULT_COLLECTION = "final_embeddings"
 DEFAULT_TEMPERATURE = 0.0
 DEFAULT_MAX_TOKENS = 512
+# build_prompt가 요구하는 답변 문장 수. --early-stop 시 이 문장 수를 채우면 생성을 끊는다.
+ANSWER_MAX_SENTENCES = 5
+# backend별 동시 요청 수. 생성은 Ollama OLLAMA_NUM_PARALLEL 이하로 맞춘다.
+DEFAULT_EMBED_CONCURRENCY = 4
+DEFAULT_SEARCH_CONCURRENCY = 8
+DEFAULT_GEN_CONCURRENCY = 1
+DEFAULT_MAX_INFLIGHT = 16
+# --quant-rescore 선택지 → QuantizationSearchParams.rescore (auto: 서버 기본값)
+QUANT_RESCORE_CHOICES = {"auto": None, "on": True, "off": False}
 
 
-def embed_dense(text: str, model: str, url: str, timeout: float = 60.0) -> List[float]:
-    resp = requests.post(
-        f"{url.rstrip('/')}/api/embeddings",
-        json={"model": model, "prompt": text},
-        timeout=timeout,
+def build_search_params(
+    quant_rescore: Optional[bool] = None,
+    quant_oversampling: Optional[float] = None,
+    quant_ignore: bool = False,
+) -> Optional[qmodels.SearchParams]:
+    """양자화 컬렉션용 query-time 파라미터. 아무것도 지정하지 않으면 None(서버 기본값)."""
+    if quant_rescore is None and quant_oversampling is None and not quant_ignore:
+        return None
+    return qmodels.SearchParams(
+        quantization=qmodels.QuantizationSearchParams(
+            ignore=quant_ignore,
+            rescore=quant_rescore,
+            oversampling=quant_oversampling,
+        )
     )
-    resp.raise_for_status()
-    data = resp.json()
-    embedding = data.get("embedding")
-    if not embedding:
-        raise RuntimeError(f"Ollama response missing embedding: {data}")
-    return embedding
 
 
-def hybrid_search(
+def search_params_json(params: Optional[qmodels.SearchParams]) -> Optional[dict]:
+    if params is None:
+        return None
+    if hasattr(params, "model_dump"):
+        return params.model_dump(exclude_none=True)
+    return params.dict(exclude_none=True)
+
+
+# 검색 경로 우선순위. detect_search_api가 시작 시 한 번 probe해서 고정한다.
+# "local"은 --backend local 전용 (client 자리에 LocalIndex가 들어온다).
+SEARCH_APIS = ("query_points", "search", "search_points", "rest")
+BATCH_SEARCH_APIS = ("query_batch_points", "search_batch", "rest")
+DEFAULT_SEARCH_BATCH_SIZE = 64
+
+
+def run_search(
+    api: str,
     client: QdrantClient,
     collection: str,
     dense_vec: List[float],
     qdrant_url: str,
     top_k: int,
-) -> list[dict]:
+    search_params: Optional[qmodels.SearchParams] = None,
+    query_filter: Optional[QueryFilter] = None,
+) -> list:
+    if api == "local":
+        return client.search(dense_vec, top_k, query_filter.conditions() if query_filter else None)
+    flt = query_filter.to_qdrant() if query_filter else None
     vector_named = qmodels.NamedVector(name="dense", vector=dense_vec)
-
-    # 1) 최신 클라이언트: search
-    try:
-        results = client.search(
+    # query_points: qdrant-client >= 1.10 (search/search_points 제거된 버전 포함). gRPC 클라이언트도 이 경로를 탄다.
+    if api == "query_points":
+        return client.query_points(
+            collection_name=collection,
+            query=dense_vec,
+            using="dense",
+            query_filter=flt,
+            limit=top_k,
+            with_payload=True,
+            search_params=search_params,
+        ).points
+    # 구버전 클라이언트: search
+    if api == "search":
+        return client.search(
             collection_name=collection,
             query_vector=vector_named,
+            query_filter=flt,
             limit=top_k,
             with_payload=True,
+            search_params=search_params,
         )
-    except Exception:
-        results = None
+    # search_points (일부 버전)
+    if api == "search_points":
+        return client.search_points(
+            collection_name=collection,
+            query_vector=vector_named,
+            query_filter=flt,
+            limit=top_k,
+            with_payload=True,
+            search_params=search_params,
+        ).points
+    # HTTP fallback (REST API)
+    body = {
+        "vector": {"name": "dense", "vector": dense_vec},
+        "limit": top_k,
+        "with_payload": True,
+    }
+    params_json = search_params_json(search_params)
+    if params_json:
+        body["params"] = params_json
+    if flt is not None:
+        body["filter"] = flt.model_dump(exclude_none=True)
+    resp = post_json(f"{qdrant_url.rstrip('/')}/collections/{collection}/points/search", body, timeout=30)
+    resp.raise_for_status()
+    return resp.json().get("result", [])
 
-    # 2) search_points (일부 버전)
-    if results is None:
-        try:
-            results = client.search_points(
-                collection_name=collection,
-                query_vector=vector_named,
+
+def run_batch_search(
+    api: str,
+    client: QdrantClient,
+    collection: str,
+    dense_vecs: List[List[float]],
+    qdrant_url: str,
+    top_k: int,
+    search_params: Optional[qmodels.SearchParams] = None,
+    query_filter: Optional[QueryFilter] = None,
+) -> List[list]:
+    """여러 질문 벡터를 요청 한 번으로 검색. 결과는 dense_vecs 순서. query_filter는 모든 질문에 같이 적용."""
+    if api == "local":
+        return client.search_batch(dense_vecs, top_k, query_filter.conditions() if query_filter else None)
+    flt = query_filter.to_qdrant() if query_filter else None
+    if api == "query_batch_points":
+        requests_ = [
+            qmodels.QueryRequest(
+                query=vec, using="dense", filter=flt, limit=top_k, with_payload=True, params=search_params
+            )
+            for vec in dense_vecs
+        ]
+        return [res.points for res in client.query_batch_points(collection_name=collection, requests=requests_)]
+    if api == "search_batch":
+        requests_ = [
+            qmodels.SearchRequest(
+                vector=qmodels.NamedVector(name="dense", vector=vec),
+                filter=flt,
                 limit=top_k,
                 with_payload=True,
-            ).points
+                params=search_params,
+            )
+            for vec in dense_vecs
+        ]
+        return client.search_batch(collection_name=collection, requests=requests_)
+    params_json = search_params_json(search_params)
+    searches = []
+    for vec in dense_vecs:
+        body = {"vector": {"name": "dense", "vector": vec}, "limit": top_k, "with_payload": True}
+        if params_json:
+            body["params"] = params_json
+        if flt is not None:
+            body["filter"] = flt.model_dump(exclude_none=True)
+        searches.append(body)
+    resp = post_json(
+        f"{qdrant_url.rstrip('/')}/collections/{collection}/points/search/batch", {"searches": searches}, timeout=60
+    )
+    resp.raise_for_status()
+    return resp.json().get("result", [])
+
+
+def dense_vector_size(client: QdrantClient, collection: str) -> int:
+    vectors = client.get_collection(collection).config.params.vectors
+    return vectors["dense"].size if isinstance(vectors, dict) else vectors.size
+
+
+def collection_embed_dims(client: QdrantClient | LocalIndex, collection: str) -> tuple[int, Optional[int]]:
+    """(dense 벡터 차원, ingest가 메타데이터에 남긴 질문 절단 차원). local 인덱스는 export 때 복사한 메타데이터."""
+    if isinstance(client, LocalIndex):
+        return client.dim, query_dims_from_metadata(client.meta.get("collection_metadata"))
+    info = client.get_collection(collection)
+    vectors = info.config.params.vectors
+    size = vectors["dense"].size if isinstance(vectors, dict) else vectors.size
+    return size, query_dims_from_metadata(getattr(info.config, "metadata", None))
+
+
+def resolve_query_dims(client: QdrantClient | LocalIndex, collection: str, dims: Optional[int]) -> Optional[int]:
+    """
+    질문 임베딩 절단 차원. --dims가 없으면 컬렉션 메타데이터 값을 쓰고, 지정했으면 컬렉션 dense 차원과 맞는지
+    시작 시 확인한다 (틀린 값은 첫 검색에서야 Qdrant 차원 불일치 오류로 드러난다).
+    """
+    size, metadata_dims = collection_embed_dims(client, collection)
+    if dims is None:
+        return metadata_dims
+    if dims != size:
+        hint = f"ingest --dims {metadata_dims}" if metadata_dims else "not truncated at ingest, omit --dims"
+        raise ValueError(f"--dims {dims} does not match dense vector size {size} of collection '{collection}' ({hint})")
+    return dims
+
+
+def detect_search_api(client: QdrantClient, collection: str, qdrant_url: str, batch: bool = False) -> str:
+    """
+    클라이언트/서버가 실제로 받아주는 검색 경로를 limit=1 probe로 한 번만 확인한다.
+    질문마다 실패하는 경로를 거치며 왕복을 낭비하지 않도록 이후에는 고른 경로만 쓴다.
+    """
+    probe = [0.0] * dense_vector_size(client, collection)
+    probe[0] = 1.0
+    candidates = BATCH_SEARCH_APIS if batch else SEARCH_APIS
+    for api in candidates:
+        try:
+            if batch:
+                run_batch_search(api, client, collection, [probe], qdrant_url, 1)
+            else:
+                run_search(api, client, collection, probe, qdrant_url, 1)
+            return api
         except Exception:
-            results = None
-
-    # 3) HTTP fallback (REST API)
-    if results is None:
-        import requests
-
-        base = qdrant_url.rstrip("/")
-        resp = requests.post(
-            f"{base}/collections/{collection}/points/search",
-            json={
-                "vector": {"name": "dense", "vector": dense_vec},
-                "limit": top_k,
-                "with_payload": True,
-            },
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json().get("result", [])
-        results = data
+            continue
+    raise RuntimeError(f"No working search API for collection '{collection}' (tried: {', '.join(candidates)})")
 
+
+def points_to_contexts(results: list) -> list[dict]:
     contexts = []
     for point in results:
         payload = getattr(point, "payload", {}) if hasattr(point, "payload") else point.get("payload", {}) or {}
@@ -100,6 +279,7 @@ def hybrid_search(
         contexts.append(
             {
                 "score": score,
+                "id": payload.get("id"),
                 "text": payload.get("text") or payload.get("content") or "",
                 "placeholder": payload.get("placeholder"),
                 "record_type": payload.get("record_type"),
@@ -107,12 +287,78 @@ def hybrid_search(
                 "filename": payload.get("filename"),
                 "page": payload.get("page"),
                 "image_link": payload.get("image_link"),
+                "furnace": payload.get("furnace"),
                 "placeholders": payload.get("placeholders") or {},
             }
         )
     return contexts
 
 
+def hybrid_search(
+    client: QdrantClient,
+    collection: str,
+    dense_vec: List[float],
+    qdrant_url: str,
+    top_k: int,
+    search_params: Optional[qmodels.SearchParams] = None,
+    api: Optional[str] = None,
+    query_filter: Optional[QueryFilter] = None,
+) -> list[dict]:
+    """
+    api를 지정하면 그 경로만 사용하고, 없으면 SEARCH_APIS 순서로 실패 시 다음 경로를 시도한다.
+    query_filter가 있으면 filename/record_type payload 필터를 걸어 해당 point 안에서만 검색한다.
+    """
+    if api:
+        return points_to_contexts(
+            run_search(api, client, collection, dense_vec, qdrant_url, top_k, search_params, query_filter)
+        )
+    for candidate in SEARCH_APIS[:-1]:
+        try:
+            results = run_search(candidate, client, collection, dense_vec, qdrant_url, top_k, search_params, query_filter)
+        except Exception:
+            continue
+        return points_to_contexts(results)
+    return points_to_contexts(
+        run_search("rest", client, collection, dense_vec, qdrant_url, top_k, search_params, query_filter)
+    )
+
+
+def filtered_search(
+    client: QdrantClient,
+    collection: str,
+    dense_vec: List[float],
+    qdrant_url: str,
+    top_k: int,
+    search_params: Optional[qmodels.SearchParams] = None,
+    api: Optional[str] = None,
+    query_filter: Optional[QueryFilter] = None,
+) -> list[dict]:
+    """
+    hybrid_search + 필터 완화. 필터 결과가 비면(분석 오탐, 해당 문서에 그 유형 레코드 없음)
+    QueryFilter.relaxed() 순서로 조건을 풀어 다시 검색한다.
+    """
+    attempt = query_filter
+    while True:
+        contexts = hybrid_search(client, collection, dense_vec, qdrant_url, top_k, search_params, api, attempt)
+        if contexts or not attempt:
+            return contexts
+        attempt = attempt.relaxed()
+
+
+def batch_search(
+    client: QdrantClient,
+    collection: str,
+    dense_vecs: List[List[float]],
+    qdrant_url: str,
+    top_k: int,
+    search_params: Optional[qmodels.SearchParams],
+    api: str,
+    query_filter: Optional[QueryFilter] = None,
+) -> List[list[dict]]:
+    results = run_batch_search(api, client, collection, dense_vecs, qdrant_url, top_k, search_params, query_filter)
+    return [points_to_contexts(points) for points in results]
+
+
 def fetch_placeholder_payload(
     client: QdrantClient, collection: str, placeholder_id: str, image_link: Optional[str] = None
 ) -> Optional[dict]:
@@ -132,6 +378,169 @@ def fetch_placeholder_payload(
     return payload or None
 
 
+PLACEHOLDER_PATTERN = re.compile(r"\{\{([^{}#]+(?:#[^{}]+)?)\}\}")
+PLACEHOLDER_SCROLL_PAGE = 256
+DEFAULT_PLACEHOLDER_CACHE_SIZE = 4096
+
+PlaceholderKey = tuple[str, Optional[str]]
+
+
+class PlaceholderCache:
+    """(collection, placeholder id, image_link) → payload(None 포함) LRU. 질문/스레드 간 공유."""
+
+    def __init__(self, max_entries: int = DEFAULT_PLACEHOLDER_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str, Optional[str]], Optional[dict]] = OrderedDict()
+
+    def get_many(self, collection: str, keys: List[PlaceholderKey]) -> tuple[Dict[PlaceholderKey, Optional[dict]], List[PlaceholderKey]]:
+        """캐시된 항목과 조회가 필요한 key 목록을 돌려준다."""
+        found: Dict[PlaceholderKey, Optional[dict]] = {}
+        missing: List[PlaceholderKey] = []
+        with self._lock:
+            for key in keys:
+                full_key = (collection, *key)
+                if full_key in self._entries:
+                    self._entries.move_to_end(full_key)
+                    found[key] = self._entries[full_key]
+                    self.hits += 1
+                else:
+                    missing.append(key)
+                    self.misses += 1
+        return found, missing
+
+    def put_many(self, collection: str, items: Dict[PlaceholderKey, Optional[dict]]) -> None:
+        with self._lock:
+            for key, payload in items.items():
+                full_key = (collection, *key)
+                self._entries[full_key] = payload
+                self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> str:
+        return f"placeholder_hits={self.hits} placeholder_misses={self.misses}"
+
+
+def fetch_placeholder_payloads(
+    client: QdrantClient, collection: str, keys: List[PlaceholderKey]
+) -> Dict[PlaceholderKey, Optional[dict]]:
+    """
+    여러 placeholder를 id MatchAny scroll 한 번(페이지 단위)으로 조회한다.
+    point id는 record_type/filename/section_path까지 섞인 UUID5라 placeholder id만으로는 만들 수 없어
+    retrieve 대신 payload 필터를 쓴다. key별로 scroll 순서상 첫 매칭(image_link 힌트가 있으면 일치하는 것)을
+    고르므로 fetch_placeholder_payload(limit=1)와 같은 결과가 나온다.
+    조회 중 오류가 나면 그때까지 찾은 key만 돌려준다(빠진 key는 "없음"으로 확정된 것이 아니므로 캐시하지 않고 다음에 다시 조회).
+    """
+    if isinstance(client, LocalIndex):
+        return client.fetch_placeholder_payloads(keys)
+    result: Dict[PlaceholderKey, Optional[dict]] = {key: None for key in keys}
+    if not keys:
+        return result
+    ids = sorted({pid for pid, _ in keys})
+    flt = qmodels.Filter(must=[qmodels.FieldCondition(key="id", match=qmodels.MatchAny(any=ids))])
+    offset = None
+    try:
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                scroll_filter=flt,
+                limit=PLACEHOLDER_SCROLL_PAGE,
+                offset=offset,
+                with_payload=True,
+            )
+            for point in points:
+                payload = point.payload if hasattr(point, "payload") else point.get("payload", {}) or {}
+                if not payload:
+                    continue
+                pid = payload.get("id")
+                for key in ((pid, None), (pid, payload.get("image_link"))):
+                    if key in result and result[key] is None:
+                        result[key] = payload
+            if offset is None or all(v is not None for v in result.values()):
+                break
+    except Exception as exc:
+        # 일시적인 Qdrant 오류가 None(없음)으로 캐시되어 프로세스 수명 동안 치환이 끊기지 않도록 찾은 것만 반환
+        found = {key: payload for key, payload in result.items() if payload is not None}
+        print(
+            f"[WARN] placeholder lookup failed in '{collection}' "
+            f"({len(result) - len(found)}/{len(result)} ids unresolved, not cached): {type(exc).__name__}: {exc}"
+        )
+        return found
+    return result
+
+
+def placeholder_marker(pid: str) -> str:
+    # 적재 실패/빈 본문 시 플레이스홀더 존재만 표시
+    pid_upper = pid.upper()
+    if pid_upper.startswith("IMG"):
+        return "[이미지 있음]"
+    if pid_upper.startswith("TB"):
+        return "[테이블 있음]"
+    return "[참고 있음]"
+
+
+def placeholder_text(pid: str, fetched_payload: Optional[dict]) -> str:
+    if not fetched_payload:
+        return placeholder_marker(pid)
+    comp_type = fetched_payload.get("record_type") or fetched_payload.get("component_type") or ""
+    body = fetched_payload.get("original") or fetched_payload.get("text") or fetched_payload.get("content") or ""
+    # 비어있거나 No Description이면 사용하지 않음
+    if not body or str(body).strip().lower() == "no description":
+        return placeholder_marker(pid)
+    label = "[참고]"
+    if "image" in str(comp_type):
+        label = "[이미지 참고]"
+    elif "table" in str(comp_type):
+        label = "[테이블 참고]"
+    return f"{label} {body}"
+
+
+def placeholder_keys(ctx: dict) -> List[PlaceholderKey]:
+    placeholders_map = ctx.get("placeholders") or {}
+    keys = []
+    for match in PLACEHOLDER_PATTERN.finditer(ctx.get("text", "")):
+        pid = match.group(1)
+        if "#" in pid:
+            continue
+        image_link_hint = placeholders_map.get(pid) if isinstance(placeholders_map, dict) else None
+        keys.append((pid, image_link_hint))
+    return keys
+
+
+def resolve_placeholders(
+    client: QdrantClient,
+    collection: str,
+    contexts: list[dict],
+    lookup_cache: PlaceholderCache,
+) -> list[dict]:
+    """컨텍스트 텍스트의 {{ID}}를 컬렉션에서 조회한 본문으로 치환한 사본을 돌려준다. 캐시에 없는 ID는 한 번에 조회."""
+    keys = list(dict.fromkeys(key for ctx in contexts for key in placeholder_keys(ctx)))
+    resolved, missing = lookup_cache.get_many(collection, keys)
+    if missing:
+        # 조회에 실패한 key는 fetched에 없다: 이번 질문은 존재 표시로 대체하고 캐시하지 않는다
+        fetched = fetch_placeholder_payloads(client, collection, missing)
+        lookup_cache.put_many(collection, fetched)
+        resolved.update(fetched)
+
+    augmented = []
+    for ctx in contexts:
+        placeholders_map = ctx.get("placeholders") or {}
+
+        def replace_placeholder(match: re.Match) -> str:
+            pid = match.group(1)
+            if "#" in pid:
+                return match.group(0)
+            image_link_hint = placeholders_map.get(pid) if isinstance(placeholders_map, dict) else None
+            return placeholder_text(pid, resolved.get((pid, image_link_hint)))
+
+        ctx = dict(ctx)
+        ctx["text"] = PLACEHOLDER_PATTERN.sub(replace_placeholder, ctx.get("text", ""))
+        augmented.append(ctx)
+    return augmented
+
 def build_prompt(question: str, contexts: list[dict]) -> str:
     ctx_lines = []
     for idx, ctx in enumerate(contexts, start=1):
@@ -148,33 +557,633 @@ def build_prompt(question: str, contexts: list[dict]) -> str:
     system = SYSTEM_PROMPT
     user = (
         f"질문: {question}\n\n"
-        "컨텍스트를 참고해 5문장 이내로 답변하라. 모르면 모른다고 말해라.\n\n"
+        f"컨텍스트를 참고해 {ANSWER_MAX_SENTENCES}문장 이내로 답변하라. 모르면 모른다고 말해라.\n\n"
         f"{ctx_block if ctx_block else '(컨텍스트 없음)'}"
     )
     return f"{system}\n\n{user}"
 
 
-def generate(prompt: str, model: str, url: str, timeout: float = 120.0, temperature: float = DEFAULT_TEMPERATURE, max_tokens: int = DEFAULT_MAX_TOKENS) -> str:
-    resp = requests.post(
-        f"{url.rstrip('/')}/api/generate",
-        json={
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {"temperature": temperature, "num_predict": max_tokens},
-        },
-        timeout=timeout,
-    )
+def generate(
+    prompt: str,
+    model: str,
+    url: str,
+    timeout: float = 120.0,
+    temperature: float = DEFAULT_TEMPERATURE,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    session: Optional[requests.Session] = None,
+    keep_alive: Optional[str] = None,
+) -> str:
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+    }
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    resp = post_json(f"{url.rstrip('/')}/api/generate", payload, timeout=timeout, session=session)
     resp.raise_for_status()
     data = resp.json()
     return data.get("response", "").strip()
 
 
+# 문장 끝: 종결 부호 뒤에 공백이 와야 확정 ("1.5" 같은 소수점은 끊지 않음)
+SENTENCE_END_RE = re.compile(r"[.!?。](?=\s)")
+
+
+@dataclass
+class StreamResult:
+    text: str
+    ttft_ms: Optional[float]
+    prompt_eval_ms: Optional[float]
+    eval_ms: Optional[float]
+    eval_count: Optional[int]
+    early_stop: bool = False
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if not self.eval_count or not self.eval_ms:
+            return None
+        return self.eval_count / (self.eval_ms / 1000)
+
+
+def generate_stream(
+    prompt: str,
+    model: str,
+    url: str,
+    timeout: float = 120.0,
+    temperature: float = DEFAULT_TEMPERATURE,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    max_sentences: Optional[int] = None,
+    session: Optional[requests.Session] = None,
+    keep_alive: Optional[str] = None,
+) -> StreamResult:
+    """
+    Ollama NDJSON 스트림을 읽으며 첫 토큰까지 시간(TTFT)과 prompt_eval/eval 시간을 기록한다.
+    max_sentences를 주면 그만큼 문장이 끝난 시점에 연결을 끊어 생성을 멈춘다(Ollama는 연결 종료 시 생성 중단).
+    조기 종료 시 마지막 통계 chunk가 없으므로 eval은 받은 chunk 수/첫 토큰 이후 경과로 대신한다.
+    """
+    start = time.monotonic()
+    first_token_at: Optional[float] = None
+    parts: List[str] = []
+    chunks = 0
+    final: dict = {}
+    early_stop = False
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+    }
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    with post_json(f"{url.rstrip('/')}/api/generate", payload, timeout=timeout, stream=True, session=session) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            piece = data.get("response", "")
+            if piece:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                parts.append(piece)
+                chunks += 1
+            if data.get("done"):
+                final = data
+                break
+            if max_sentences:
+                text = "".join(parts)
+                ends = [m.end() for m in SENTENCE_END_RE.finditer(text)]
+                if len(ends) >= max_sentences:
+                    parts = [text[: ends[max_sentences - 1]]]
+                    early_stop = True
+                    break
+    end = time.monotonic()
+    ttft_ms = (first_token_at - start) * 1000 if first_token_at is not None else None
+    if final:
+        prompt_eval_ms = final["prompt_eval_duration"] / 1e6 if final.get("prompt_eval_duration") else None
+        eval_ms = final["eval_duration"] / 1e6 if final.get("eval_duration") else None
+        eval_count = final.get("eval_count")
+    else:
+        prompt_eval_ms = None
+        eval_ms = (end - first_token_at) * 1000 if first_token_at is not None else None
+        eval_count = chunks
+    return StreamResult(
+        text="".join(parts).strip(),
+        ttft_ms=ttft_ms,
+        prompt_eval_ms=prompt_eval_ms,
+        eval_ms=eval_ms,
+        eval_count=eval_count,
+        early_stop=early_stop,
+    )
+
+
+def format_evidence(contexts: list[dict], embed_ms: float, search_ms: float, gen_ms: float) -> str:
+    ev_lines = []
+    for idx, ctx in enumerate(contexts, start=1):
+        meta = []
+        if ctx.get("doc_folder"):
+            meta.append(f"doc={ctx['doc_folder']}")
+        if ctx.get("record_type"):
+            meta.append(f"type={ctx['record_type']}")
+        if ctx.get("source_file"):
+            meta.append(f"file={Path(ctx['source_file']).name}")
+        if ctx.get("score") is not None:
+            meta.append(f"score={ctx['score']:.4f}")
+        meta.append(f"t_embed_ms={embed_ms:.1f} t_search_ms={search_ms:.1f} t_gen_ms={gen_ms:.1f}")
+        meta_part = " | ".join(meta)
+        text_part = ctx.get("text", "")
+        ev_lines.append(f"[{idx}] {meta_part}\n{text_part}")
+    return "\n\n".join(ev_lines)
+
+
+def load_progress(path: Path, questions: List[str]) -> Dict[int, dict]:
+    """행 번호 → 결과. 입력 CSV가 바뀌어 질문이 다른 기록과 깨진 마지막 줄(쓰는 중 종료)은 무시한다."""
+    done: Dict[int, dict] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            idx = entry.get("row")
+            if isinstance(idx, int) and 0 <= idx < len(questions) and entry.get("question") == questions[idx]:
+                done[idx] = entry["result"]
+    return done
+
+
+class ProgressLog:
+    """
+    질문이 끝날 때마다 결과를 한 줄씩 append하는 JSONL 사이드카. 중간에 죽어도 끝난 질문은 남고,
+    --resume 시 같은 행/같은 질문의 기록은 다시 묻지 않는다. 최종 CSV는 이 로그에서 만든다.
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            self.path.write_text("", encoding="utf-8")
+        self._fh = self.path.open("a", encoding="utf-8")
+
+    def append(self, idx: int, question: str, result: dict) -> None:
+        self._fh.write(json.dumps({"row": idx, "question": question, "result": result}, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+@dataclass
+class QARuntime:
+    """질문 간에 공유하는 클라이언트/설정과 backend별 동시 실행 제한."""
+
+    client: QdrantClient | LocalIndex  # --backend local이면 LocalIndex
+    args: argparse.Namespace
+    search_params: Optional[qmodels.SearchParams]
+    embed_sem: asyncio.Semaphore
+    qdrant_sem: asyncio.Semaphore
+    gen_sem: asyncio.Semaphore
+    search_api: Optional[str] = None
+    placeholder_cache: PlaceholderCache = field(default_factory=PlaceholderCache)
+    progress: Optional[ProgressLog] = None
+    embed_cache: Optional[EmbeddingCache] = None
+    search_cache: Optional[SearchResultCache] = None
+    collection_fp: Optional[str] = None
+    answer_cache: Optional[SemanticAnswerCache] = None
+    lexical: Optional[LexicalIndex] = None
+    analyzer: Optional[QueryAnalyzer] = None
+
+    def record(self, idx: int, question: str, result: dict) -> None:
+        if self.progress is not None:
+            self.progress.append(idx, question, result)
+
+
+async def call_limited(sem: asyncio.Semaphore, func, *args, **kwargs):
+    """sem 슬롯을 얻은 뒤 blocking 호출을 스레드에서 실행. 소요 ms는 슬롯 대기 시간을 제외한 호출 시간."""
+    async with sem:
+        start = time.monotonic()
+        result = await asyncio.to_thread(func, *args, **kwargs)
+        return result, (time.monotonic() - start) * 1000
+
+
+async def embed_question(rt: QARuntime, question: str) -> tuple[List[float], float]:
+    """질문 임베딩. 캐시에 있으면 Ollama를 부르지 않고 조회 시간만 embed_ms로 보고한다."""
+    args = rt.args
+    if rt.embed_cache is not None:
+        start = time.monotonic()
+        cached = await asyncio.to_thread(rt.embed_cache.get, args.embed_model, question, EMBED_DENSE_ENDPOINT)
+        if cached is not None:
+            return truncate_embedding(cached, args.dims), (time.monotonic() - start) * 1000
+    dense_vec, embed_ms = await call_limited(rt.embed_sem, embed_dense, question, model=args.embed_model, url=args.ollama_url)
+    if rt.embed_cache is not None:
+        # 절단 전 전체 벡터를 저장해 --dims가 다른 실행도 같은 항목을 쓴다 (ingest 캐시와 동일 규칙)
+        await asyncio.to_thread(rt.embed_cache.put, args.embed_model, question, dense_vec, EMBED_DENSE_ENDPOINT)
+    return truncate_embedding(dense_vec, args.dims), embed_ms
+
+
+def search_cache_key(rt: QARuntime, dense_vec: List[float], query_filter: Optional[QueryFilter] = None) -> Optional[str]:
+    if rt.search_cache is None:
+        return None
+    # local(exact)과 Qdrant(HNSW) 결과는 지문이 같아도 다르므로 backend/검색 경로별로 따로 캐시한다
+    params = {
+        **(search_params_json(rt.search_params) or {}),
+        "backend": rt.args.backend,
+        "search_api": rt.search_api,
+    }
+    if query_filter:
+        params["filter"] = query_filter.conditions()
+    return SearchResultCache.make_key(rt.args.collection, rt.collection_fp or "", dense_vec, rt.args.top_k, params)
+
+
+async def cached_search(
+    rt: QARuntime, dense_vec: List[float], query_filter: Optional[QueryFilter] = None
+) -> Optional[tuple[list[dict], float]]:
+    key = search_cache_key(rt, dense_vec, query_filter)
+    if key is None:
+        return None
+    start = time.monotonic()
+    contexts = await asyncio.to_thread(rt.search_cache.get, key)
+    if contexts is None:
+        return None
+    return contexts, (time.monotonic() - start) * 1000
+
+
+async def store_search(
+    rt: QARuntime, dense_vec: List[float], contexts: list[dict], query_filter: Optional[QueryFilter] = None
+) -> None:
+    key = search_cache_key(rt, dense_vec, query_filter)
+    if key is not None:
+        await asyncio.to_thread(rt.search_cache.put, key, rt.args.collection, rt.collection_fp or "", contexts)
+
+
+async def complete_question(
+    rt: QARuntime,
+    question: str,
+    dense_vec: Optional[List[float]],
+    contexts: list[dict],
+    embed_ms: float,
+    search_ms: float,
+    row_start: float,
+    retrieval: str = "dense",
+) -> dict:
+    """검색 이후 단계: (답변 캐시 조회) → placeholder 치환 → 생성 → 결과 행. lexical fast path면 dense_vec 없음."""
+    args = rt.args
+    if rt.answer_cache is not None and dense_vec is not None:
+        hit = await asyncio.to_thread(rt.answer_cache.lookup, dense_vec, contexts)
+        if hit is not None:
+            answer, evidence, similarity = hit
+            return {
+                "answer": answer,
+                "evidence": evidence,
+                "embed_ms": embed_ms,
+                "search_ms": search_ms,
+                "placeholder_ms": 0.0,
+                "gen_ms": 0.0,
+                "elapsed_sec": time.monotonic() - row_start,
+                "answer_cached": True,
+                "answer_similarity": similarity,
+                "retrieval": retrieval,
+                "contexts": len(contexts),
+            }
+    # placeholder 해소: 텍스트 내 {{ID}} 치환 (Qdrant 조회이므로 같은 제한을 공유)
+    augmented, placeholder_ms = await call_limited(
+        rt.qdrant_sem, resolve_placeholders, rt.client, args.collection, contexts, rt.placeholder_cache
+    )
+
+    pack_metrics: dict = {}
+    if args.pack_contexts:
+        augmented, pack_stats = pack_contexts(augmented, args.context_budget, args.dedup_threshold)
+        pack_metrics = {"ctx_tokens": pack_stats.tokens_after, "ctx_tokens_saved": pack_stats.tokens_saved}
+
+    prompt = build_prompt(question, augmented)
+    stream_metrics: dict = {}
+    if args.stream:
+        streamed, gen_ms = await call_limited(
+            rt.gen_sem,
+            generate_stream,
+            prompt,
+            model=args.llm_model,
+            url=args.ollama_url,
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=DEFAULT_MAX_TOKENS,
+            max_sentences=ANSWER_MAX_SENTENCES if args.early_stop else None,
+        )
+        answer = streamed.text
+        stream_metrics = {
+            "ttft_ms": streamed.ttft_ms,
+            "tokens_per_sec": streamed.tokens_per_sec,
+            "prompt_eval_ms": streamed.prompt_eval_ms,
+            "eval_ms": streamed.eval_ms,
+            "early_stop": streamed.early_stop,
+        }
+    else:
+        answer, gen_ms = await call_limited(
+            rt.gen_sem,
+            generate,
+            prompt,
+            model=args.llm_model,
+            url=args.ollama_url,
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=DEFAULT_MAX_TOKENS,
+        )
+    evidence = format_evidence(augmented, embed_ms, search_ms, gen_ms)
+    if rt.answer_cache is not None and dense_vec is not None and answer:
+        await asyncio.to_thread(rt.answer_cache.put, question, dense_vec, contexts, answer, evidence)
+    return {
+        "answer": answer,
+        "evidence": evidence,
+        "embed_ms": embed_ms,
+        "search_ms": search_ms,
+        "placeholder_ms": placeholder_ms,
+        "gen_ms": gen_ms,
+        "elapsed_sec": time.monotonic() - row_start,
+        **stream_metrics,
+        **pack_metrics,
+        "answer_cached": False,
+        "retrieval": retrieval,
+        "contexts": len(contexts),
+    }
+
+
+async def lexical_retrieve(rt: QARuntime, question: str) -> tuple[list[dict], bool, float]:
+    """lexical 색인 검색: (컨텍스트, fast path로 충분한 강한 일치인지, ms)."""
+    start = time.monotonic()
+    points, match = await asyncio.to_thread(rt.lexical.search, question, rt.args.top_k)
+    strong = bool(points) and match >= rt.args.lexical_min_match
+    return points_to_contexts(points), strong, (time.monotonic() - start) * 1000
+
+
+def merge_lexical(
+    rt: QARuntime,
+    contexts: list[dict],
+    search_ms: float,
+    lexical: Optional[tuple[list[dict], bool, float]],
+    query_filter: Optional[QueryFilter] = None,
+) -> tuple[list[dict], float, str]:
+    """
+    dense 결과에 lexical 결과를 합친다 (--lexical fuse만). lexical 검색 시간은 검색 시간에 포함.
+    dense 검색에 payload 필터가 적용됐으면 lexical 결과도 같은 필터로 거른다.
+    """
+    if lexical is None:
+        return contexts, search_ms, "dense"
+    lexical_contexts, _, lexical_ms = lexical
+    if rt.args.lexical == "fuse":
+        if query_filter:
+            lexical_contexts = [ctx for ctx in lexical_contexts if query_filter.matches(ctx)]
+        return fuse_rrf([contexts, lexical_contexts], rt.args.top_k), search_ms + lexical_ms, "fused"
+    return contexts, search_ms + lexical_ms, "dense"
+
+
+def analyze_question(rt: QARuntime, question: str) -> Optional[QueryFilter]:
+    """--query-filter: 질문에서 문서 번호/제목/유형을 찾아 payload 필터로. 걸리는 것이 없으면 None(전체 검색)."""
+    if rt.analyzer is None:
+        return None
+    return rt.analyzer.analyze(question) or None
+
+
+def applied_filter(query_filter: Optional[QueryFilter], contexts: list[dict]) -> Optional[QueryFilter]:
+    """
+    실제로 결과를 낸 필터. 더 엄격한 필터에서 결과가 나왔다면 모두 그 필터에 맞으므로, 완화 순서대로
+    결과 전체가 맞는 첫 필터다 (검색 캐시 hit에도 같은 판정).
+    """
+    applied = query_filter
+    while applied and not all(applied.matches(ctx) for ctx in contexts):
+        applied = applied.relaxed()
+    return applied
+
+
+def filter_result(query_filter: Optional[QueryFilter], applied: Optional[QueryFilter]) -> dict:
+    """[FILTER] 집계용: 적용된 필터와 완화 여부."""
+    return {"filter": applied.describe() if applied else "", "filter_fallback": applied != query_filter}
+
+
+async def search_question(
+    rt: QARuntime, dense_vec: List[float], query_filter: Optional[QueryFilter]
+) -> tuple[list[dict], float]:
+    """검색 캐시 → Qdrant/local dense 검색(filtered_search). 필터를 완화해 다시 검색한 시간도 search_ms에 합산된다."""
+    args = rt.args
+    cached = await cached_search(rt, dense_vec, query_filter)
+    if cached is not None:
+        return cached
+    contexts, search_ms = await call_limited(
+        rt.qdrant_sem,
+        filtered_search,
+        rt.client,
+        args.collection,
+        dense_vec,
+        args.qdrant_url,
+        args.top_k,
+        rt.search_params,
+        rt.search_api,
+        query_filter,
+    )
+    await store_search(rt, dense_vec, contexts, query_filter)
+    return contexts, search_ms
+
+
+async def answer_question(rt: QARuntime, question: str) -> dict:
+    args = rt.args
+    row_start = time.monotonic()
+    lexical = None
+    if rt.lexical is not None:
+        lexical = await lexical_retrieve(rt, question)
+        lexical_contexts, strong, lexical_ms = lexical
+        if args.lexical == "fast" and strong:
+            # 용어가 그대로 일치하는 질문: 임베딩/벡터 검색 생략
+            return await complete_question(
+                rt, question, None, lexical_contexts, 0.0, lexical_ms, row_start, retrieval="lexical"
+            )
+    dense_vec, embed_ms = await embed_question(rt, question)
+    query_filter = analyze_question(rt, question)
+    contexts, search_ms = await search_question(rt, dense_vec, query_filter)
+    applied = applied_filter(query_filter, contexts)
+    contexts, search_ms, retrieval = merge_lexical(rt, contexts, search_ms, lexical, applied)
+    result = await complete_question(
+        rt, question, dense_vec, contexts, embed_ms, search_ms, row_start, retrieval=retrieval
+    )
+    return {**result, **filter_result(query_filter, applied)}
+
+
+async def run_questions_batched(rt: QARuntime, questions: List[str], max_inflight: int) -> List[Optional[dict]]:
+    """
+    batch 검색 모드: 모든 질문을 먼저 임베딩하고, search_batch_size개씩 batch query 한 번으로 검색한 뒤
+    placeholder/생성을 동시에 진행한다. qa_search_ms는 batch 요청 시간을 질문 수로 나눈 값.
+    --lexical fast면 강한 lexical 일치 질문은 임베딩/batch 검색에서 뺀다. payload 필터는 요청 단위로 걸리므로
+    --query-filter면 같은 필터의 질문끼리 묶어 batch 요청한다.
+    """
+    args = rt.args
+    indices = [i for i, q in enumerate(questions) if q]
+    starts = {i: time.monotonic() for i in indices}
+    lexical_by_idx: Dict[int, tuple[list[dict], bool, float]] = {}
+    if rt.lexical is not None:
+        lexed = await asyncio.gather(*(lexical_retrieve(rt, questions[i]) for i in indices))
+        lexical_by_idx = dict(zip(indices, lexed))
+    fast = {i for i, (_, strong, _) in lexical_by_idx.items() if args.lexical == "fast" and strong}
+    dense_indices = [i for i in indices if i not in fast]
+    embedded = await asyncio.gather(*(embed_question(rt, questions[i]) for i in dense_indices))
+
+    vec_by_idx = {i: vec for i, (vec, _) in zip(dense_indices, embedded)}
+    filter_by_idx = {i: analyze_question(rt, questions[i]) for i in dense_indices}
+    contexts_by_idx: Dict[int, tuple[list[dict], float]] = {}
+    for i in dense_indices:
+        cached = await cached_search(rt, vec_by_idx[i], filter_by_idx[i])
+        if cached is not None:
+            contexts_by_idx[i] = cached
+    misses = [i for i in dense_indices if i not in contexts_by_idx]
+    size = args.search_batch_size
+
+    async def search_chunk(chunk: List[int], query_filter: Optional[QueryFilter]) -> tuple[List[list[dict]], float]:
+        return await call_limited(
+            rt.qdrant_sem,
+            batch_search,
+            rt.client,
+            args.collection,
+            [vec_by_idx[i] for i in chunk],
+            args.qdrant_url,
+            args.top_k,
+            rt.search_params,
+            rt.search_api,
+            query_filter,
+        )
+
+    # 필터 결과가 빈 질문은 완화한 필터로 다시 묶어 검색 (search_question과 같은 fallback)
+    pending: Dict[int, Optional[QueryFilter]] = {i: filter_by_idx[i] for i in misses}
+    while pending:
+        groups: Dict[Optional[QueryFilter], List[int]] = {}
+        for i, flt in pending.items():
+            groups.setdefault(flt, []).append(i)
+        chunks = [(flt, idxs[k : k + size]) for flt, idxs in groups.items() for k in range(0, len(idxs), size)]
+        searched = await asyncio.gather(*(search_chunk(chunk, flt) for flt, chunk in chunks))
+        pending = {}
+        for (flt, chunk), (chunk_contexts, chunk_ms) in zip(chunks, searched):
+            for i, contexts in zip(chunk, chunk_contexts):
+                prev_ms = contexts_by_idx[i][1] if i in contexts_by_idx else 0.0
+                contexts_by_idx[i] = (contexts, prev_ms + chunk_ms / len(chunk))
+                if flt and not contexts:
+                    pending[i] = flt.relaxed()
+    for i in misses:
+        await store_search(rt, vec_by_idx[i], contexts_by_idx[i][0], filter_by_idx[i])
+
+    inflight = asyncio.Semaphore(max_inflight)
+    results: List[Optional[dict]] = [None] * len(questions)
+
+    async def worker(idx: int, embed_ms: float) -> None:
+        async with inflight:
+            if idx in fast:
+                contexts, _, lexical_ms = lexical_by_idx[idx]
+                results[idx] = await complete_question(
+                    rt, questions[idx], None, contexts, 0.0, lexical_ms, starts[idx], retrieval="lexical"
+                )
+            else:
+                contexts, search_ms = contexts_by_idx[idx]
+                applied = applied_filter(filter_by_idx[idx], contexts)
+                contexts, search_ms, retrieval = merge_lexical(rt, contexts, search_ms, lexical_by_idx.get(idx), applied)
+                result = await complete_question(
+                    rt, questions[idx], vec_by_idx[idx], contexts, embed_ms, search_ms, starts[idx], retrieval=retrieval
+                )
+                results[idx] = {**result, **filter_result(filter_by_idx[idx], applied)}
+        rt.record(idx, questions[idx], results[idx])
+
+    await asyncio.gather(
+        *(worker(i, 0.0) for i in sorted(fast)),
+        *(worker(i, embed_ms) for i, (_, embed_ms) in zip(dense_indices, embedded)),
+    )
+    return results
+
+
+async def run_questions(rt: QARuntime, questions: List[str], max_inflight: int) -> List[Optional[dict]]:
+    """질문들을 동시에 처리하고 입력 순서대로 결과를 돌려준다. 빈 질문은 None."""
+    args = rt.args
+    # to_thread 기본 풀(min(32, cpu+4))이 backend 제한보다 작으면 제한만큼 동시 실행되지 않는다.
+    workers = args.embed_concurrency + args.search_concurrency + args.gen_concurrency
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    if args.batch_search:
+        return await run_questions_batched(rt, questions, max_inflight)
+    inflight = asyncio.Semaphore(max_inflight)
+    results: List[Optional[dict]] = [None] * len(questions)
+
+    async def worker(idx: int, question: str) -> None:
+        async with inflight:
+            results[idx] = await answer_question(rt, question)
+        rt.record(idx, question, results[idx])
+
+    await asyncio.gather(*(worker(i, q) for i, q in enumerate(questions) if q))
+    return results
+
+
+# backend 호출에서 응답에 영향이 없는 인자 (cassette 키에서 제외)
+CASSETTE_IGNORED_ARGS = ("client", "url", "qdrant_url", "session", "keep_alive", "timeout", "api")
+
+
+def install_cassette(cassette: Cassette) -> None:
+    """
+    Ollama/Qdrant를 부르는 함수들을 record/replay 래퍼로 바꾼다. 호출부가 모듈 전역 이름으로 부르므로
+    (resolve_placeholders → fetch_placeholder_payloads 등) 이 모듈 안의 모든 경로에 적용된다.
+    """
+    global embed_dense, hybrid_search, batch_search, fetch_placeholder_payload, fetch_placeholder_payloads
+    global generate, generate_stream, collection_filenames, collection_embed_dims
+    ignore = CASSETTE_IGNORED_ARGS
+    embed_dense = cassette.wrap("embed_dense", embed_dense, ignore=ignore)
+    hybrid_search = cassette.wrap("hybrid_search", hybrid_search, ignore=ignore)
+    # batch 검색/placeholder 일괄 조회는 묶이는 항목이 실행마다 달라질 수 있어 항목 단위로 기록.
+    # batch 검색은 질문 벡터별 키가 hybrid_search와 같아 --batch-search 유무와 관계없이 replay된다.
+    batch_search = cassette.wrap_batch(
+        "hybrid_search", batch_search, "dense_vecs", item_key="dense_vec", aligned=True, ignore=ignore
+    )
+    fetch_placeholder_payload = cassette.wrap("fetch_placeholder_payload", fetch_placeholder_payload, ignore=ignore)
+    fetch_placeholder_payloads = cassette.wrap_batch("placeholder", fetch_placeholder_payloads, "keys", ignore=ignore)
+    collection_filenames = cassette.wrap("collection_filenames", collection_filenames, ignore=ignore)
+    collection_embed_dims = cassette.wrap("collection_embed_dims", collection_embed_dims, ignore=ignore, decode=tuple)
+    generate = cassette.wrap("generate", generate, ignore=ignore)
+    generate_stream = cassette.wrap(
+        "generate_stream", generate_stream, ignore=ignore, encode=asdict, decode=lambda value: StreamResult(**value)
+    )
+
+
+def filter_summary(results: List[Optional[dict]]) -> str:
+    """필터 적용률(완화 포함)과 필터/전체 검색 질문의 평균 검색 ms, 평균 컨텍스트 수."""
+    done = [r for r in results if r and r.get("retrieval", "dense") != "lexical"]
+    filtered = [r for r in done if r.get("filter")]
+    fallback = sum(1 for r in done if r.get("filter_fallback"))
+    unfiltered = [r for r in done if not r.get("filter")]
+
+    def mean(rows: List[dict], key: str) -> str:
+        return f"{sum(r.get(key, 0) for r in rows) / len(rows):.1f}" if rows else "-"
+
+    return (
+        f"filtered={len(filtered)}/{len(done)} ({len(filtered) / max(len(done), 1):.1%}) fallback={fallback} "
+        f"search_ms filtered={mean(filtered, 'search_ms')} unfiltered={mean(unfiltered, 'search_ms')} "
+        f"contexts filtered={mean(filtered, 'contexts')} unfiltered={mean(unfiltered, 'contexts')}"
+    )
+
+
+def answer_config_signature(args: argparse.Namespace) -> str:
+    """답변 캐시 범위: 같은 검색 컨텍스트라도 답변을 바꾸는 설정이 다르면 다른 캐시로 본다."""
+    config = {
+        "embed_model": args.embed_model,
+        "dims": args.dims,
+        "llm_model": args.llm_model,
+        "system_prompt": SYSTEM_PROMPT,
+        "max_sentences": ANSWER_MAX_SENTENCES,
+        "temperature": DEFAULT_TEMPERATURE,
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "top_k": args.top_k,
+        "early_stop": args.early_stop,
+        "pack": [args.context_budget, args.dedup_threshold] if args.pack_contexts else None,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Dense QA over Qdrant using Ollama + Qwen.")
     parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Qdrant 컬렉션명")
     parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
     parser.add_argument("--ollama-url", default=os.environ.get("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--prefer-grpc", action="store_true", help="Qdrant gRPC 전송 사용 (기본: REST)")
+    parser.add_argument("--grpc-port", type=int, default=DEFAULT_GRPC_PORT, help=f"Qdrant gRPC 포트 (기본: {DEFAULT_GRPC_PORT})")
     parser.add_argument("--embed-model", default="snowflake-arctic-embed2", help="Ollama 임베딩 모델명")
     parser.add_argument("--llm-model", default="qwen2.5:14b-instruct", help="답변 생성 모델명 (Ollama)")
     parser.add_argument("--csv", required=True, type=Path, help="입력 CSV 경로")
@@ -183,13 +1192,217 @@ def main() -> None:
     parser.add_argument("--answer-col", default="answer", help="답변 컬럼명")
     parser.add_argument("--evidence-col", default="evidence", help="검색 컨텍스트를 저장할 컬럼명")
     parser.add_argument("--top-k", type=int, default=7, help="retrieval 개수 (dense-only)")
+    parser.add_argument(
+        "--quant-rescore",
+        choices=tuple(QUANT_RESCORE_CHOICES),
+        default="auto",
+        help="양자화 컬렉션 검색 후 원본 벡터로 재채점 (auto: 서버 기본값)",
+    )
+    parser.add_argument(
+        "--quant-oversampling",
+        type=float,
+        help="양자화 검색 시 top_k * N 후보를 뽑아 재채점 (예: 2.0)",
+    )
+    parser.add_argument("--quant-ignore", action="store_true", help="양자화 벡터를 무시하고 원본 벡터로 검색")
+    parser.add_argument(
+        "--dims",
+        type=int,
+        help="질문 임베딩을 앞 N차원으로 절단+재정규화 (기본: ingest가 컬렉션 메타데이터에 남긴 embed_dims, 지정하면 컬렉션 차원과 맞는지 확인)",
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=DEFAULT_EMBED_CONCURRENCY,
+        help=f"동시 임베딩 요청 수 (기본: {DEFAULT_EMBED_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--search-concurrency",
+        type=int,
+        default=DEFAULT_SEARCH_CONCURRENCY,
+        help=f"동시 Qdrant 요청 수(검색+placeholder 조회) (기본: {DEFAULT_SEARCH_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--gen-concurrency",
+        type=int,
+        default=DEFAULT_GEN_CONCURRENCY,
+        help=f"동시 생성 요청 수, Ollama OLLAMA_NUM_PARALLEL 이하 권장 (기본: {DEFAULT_GEN_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=DEFAULT_MAX_INFLIGHT,
+        help=f"동시에 처리 중인 질문 수 상한 (기본: {DEFAULT_MAX_INFLIGHT})",
+    )
+    parser.add_argument(
+        "--placeholder-cache-size",
+        type=int,
+        default=DEFAULT_PLACEHOLDER_CACHE_SIZE,
+        help=f"placeholder 조회 결과 LRU 항목 수 (기본: {DEFAULT_PLACEHOLDER_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--batch-search",
+        action="store_true",
+        help="질문을 모두 먼저 임베딩한 뒤 batch query API로 묶어서 검색",
+    )
+    parser.add_argument(
+        "--search-batch-size",
+        type=int,
+        default=DEFAULT_SEARCH_BATCH_SIZE,
+        help=f"--batch-search 시 요청당 질문 수 (기본: {DEFAULT_SEARCH_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Ollama 스트리밍 생성 사용, TTFT/tokens_per_sec/prompt_eval/eval 컬럼 추가",
+    )
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help=f"--stream 시 답변이 {ANSWER_MAX_SENTENCES}문장을 채우면 생성 중단",
+    )
+    parser.add_argument(
+        "--pack-contexts",
+        action="store_true",
+        help="같은 테이블 레코드(ID/ID#n/ID#summary) 합치기 + 근사 중복 제거 + 토큰 예산 내로 컨텍스트 채우기",
+    )
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=DEFAULT_CONTEXT_BUDGET,
+        help=f"--pack-contexts 시 컨텍스트 토큰 예산(추정치, 0이면 무제한) (기본: {DEFAULT_CONTEXT_BUDGET})",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEFAULT_DEDUP_THRESHOLD,
+        help=f"문자 3-gram 포함 비율이 이 값 이상이면 중복으로 버림 (기본: {DEFAULT_DEDUP_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--progress-log",
+        type=Path,
+        help="질문별 결과를 즉시 append하는 JSONL 경로 (기본: <out-csv>.progress.jsonl)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="progress 로그에 답이 있는 질문은 건너뛰고 나머지만 실행",
+    )
+    parser.add_argument(
+        "--embed-cache",
+        type=Path,
+        default=DEFAULT_CACHE_PATH,
+        help=f"질문 임베딩 캐시 sqlite 경로, ingest와 공유 (기본: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument("--no-embed-cache", action="store_true", help="질문 임베딩 캐시 비활성화")
+    parser.add_argument(
+        "--search-cache",
+        action="store_true",
+        help="검색 결과 캐시 사용 (컬렉션 내용 지문+질문 벡터+top_k+검색 파라미터 키, 시작 시 컬렉션 전체 scroll 1회)",
+    )
+    parser.add_argument(
+        "--search-cache-path",
+        type=Path,
+        default=DEFAULT_SEARCH_CACHE_PATH,
+        help=f"검색 결과 캐시 sqlite 경로 (기본: {DEFAULT_SEARCH_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--answer-cache",
+        action="store_true",
+        help="의미 기반 답변 캐시: 질문 벡터 유사도 ≥ --answer-similarity 이고 검색 컨텍스트 집합이 같으면 생성 생략",
+    )
+    parser.add_argument(
+        "--answer-similarity",
+        type=float,
+        default=DEFAULT_ANSWER_SIMILARITY,
+        help=f"답변 캐시 hit 판정 cosine 유사도 (기본: {DEFAULT_ANSWER_SIMILARITY})",
+    )
+    parser.add_argument(
+        "--answer-cache-path",
+        type=Path,
+        default=DEFAULT_ANSWER_CACHE_PATH,
+        help=f"답변 캐시 sqlite 경로 (기본: {DEFAULT_ANSWER_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("qdrant", "local"),
+        default="qdrant",
+        help="검색 backend. local: export된 memmap 행렬로 프로세스 내 exact 검색 (양자화 검색 옵션은 무시)",
+    )
+    parser.add_argument(
+        "--local-index",
+        type=Path,
+        help="--backend local 인덱스 디렉터리 (기본: output/local_index/<collection>)",
+    )
+    parser.add_argument(
+        "--export-local-index",
+        action="store_true",
+        help="--backend local 실행 전에 Qdrant 컬렉션을 인덱스 디렉터리로 export (내용이 바뀐 뒤 갱신용)",
+    )
+    parser.add_argument(
+        "--local-index-dtype",
+        choices=LOCAL_DTYPE_CHOICES,
+        default=DEFAULT_LOCAL_DTYPE,
+        help=f"--export-local-index 저장 dtype (기본: {DEFAULT_LOCAL_DTYPE}, float16은 절반 크기)",
+    )
+    parser.add_argument(
+        "--cassette",
+        type=Path,
+        help="Ollama/Qdrant 호출 record/replay 파일(JSONL). replay면 서비스 없이 QA 자체 처리 시간을 측정",
+    )
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="replay", help="--cassette 모드 (기본: replay)")
+    parser.add_argument(
+        "--replay-latency",
+        type=parse_replay_latency,
+        default=DEFAULT_REPLAY_LATENCY,
+        help="replay 시 호출 지연: none, recorded(기록된 소요 시간), 또는 고정 ms (기본: none)",
+    )
+    parser.add_argument(
+        "--lexical",
+        choices=("off", "fast", "fuse"),
+        default="off",
+        help=(
+            "문자 n-gram BM25 색인 사용. fast: 용어가 강하게 일치하면 임베딩/벡터 검색 없이 lexical 결과만 사용, "
+            "fuse: dense 결과와 RRF로 합침"
+        ),
+    )
+    parser.add_argument("--lexical-index", type=Path, help="lexical 색인 디렉터리 (기본: output/lexical_index/<collection>)")
+    parser.add_argument(
+        "--lexical-min-match",
+        type=float,
+        default=DEFAULT_LEXICAL_MIN_MATCH,
+        help=f"--lexical fast 기준: 1위 문서가 포함한 질의 n-gram idf 비율 (기본: {DEFAULT_LEXICAL_MIN_MATCH})",
+    )
+    parser.add_argument(
+        "--query-filter",
+        action="store_true",
+        help="질문의 문서 번호(TP-030-050-030)/제목은 filename, 수식/표 질문은 record_type payload 필터로 검색 범위 제한",
+    )
+    parser.add_argument(
+        "--query-filter-fields",
+        nargs="+",
+        choices=FILTER_FIELDS,
+        default=list(FILTER_FIELDS),
+        help=f"--query-filter로 거를 payload 필드 (기본: {' '.join(FILTER_FIELDS)})",
+    )
+    add_http_args(parser)
     args = parser.parse_args()
+    configure_from_args(args)
+    if args.early_stop and not args.stream:
+        parser.error("--early-stop requires --stream")
+    if args.cassette and (args.search_cache or args.answer_cache):
+        parser.error("--cassette cannot be combined with --search-cache/--answer-cache")
+    if args.export_local_index and args.backend != "local":
+        parser.error("--export-local-index requires --backend local")
+    for name in ("search_batch_size", "embed_concurrency", "search_concurrency", "gen_concurrency", "max_inflight"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be >= 1")
+    search_params = build_search_params(
+        quant_rescore=QUANT_RESCORE_CHOICES[args.quant_rescore],
+        quant_oversampling=args.quant_oversampling,
+        quant_ignore=args.quant_ignore,
+    )
 
     rows = []
-    per_row_elapsed: list[float] = []
-    per_row_embed_ms: list[float] = []
-    per_row_search_ms: list[float] = []
-    per_row_gen_ms: list[float] = []
     with args.csv.open(newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         fieldnames = reader.fieldnames or []
@@ -204,140 +1417,200 @@ def main() -> None:
             raise SystemExit(f"CSV에 '{args.question_col}' 컬럼이 없습니다. 필드: {fieldnames}")
         rows = [row for row in reader]
 
-    client = QdrantClient(url=args.qdrant_url)
-
-    placeholder_lookup_cache: dict[tuple[str, Optional[str]], Optional[dict]] = {}
+    # Excel 호환을 위해 utf-8-sig로 BOM 포함 저장
+    default_out = args.csv.with_name("output.csv")
+    out_path = args.out_csv if args.out_csv else default_out
+    progress_path = args.progress_log or out_path.with_suffix(".progress.jsonl")
+    progress = ProgressLog(progress_path, resume=args.resume)
+    questions = [(row.get(qcol) or "").strip() for row in rows]
+    done = load_progress(progress_path, questions) if args.resume else {}
+    if args.resume:
+        print(f"[INFO] resume: {len(done)} answered rows in {progress_path}, {sum(1 for q in questions if q) - len(done)} remaining")
 
-    for row in rows:
-        question = (row.get(qcol) or "").strip()
-        if not question:
-            row[args.answer_col] = ""
-            continue
-        row_start = time.monotonic()
-        embed_start = time.monotonic()
-        dense_vec = embed_dense(question, model=args.embed_model, url=args.ollama_url)
-        embed_ms = (time.monotonic() - embed_start) * 1000
-
-        search_start = time.monotonic()
-        contexts = hybrid_search(client, args.collection, dense_vec, args.qdrant_url, args.top_k)
-        search_ms = (time.monotonic() - search_start) * 1000
-
-        # placeholder 해소: 텍스트 내 {{ID}} 치환
-        augmented = []
-        ph_pattern = re.compile(r"\{\{([^{}#]+(?:#[^{}]+)?)\}\}")
-        for ctx in contexts:
-            text = ctx.get("text", "")
-            placeholders_map = ctx.get("placeholders") or {}
-
-            def replace_placeholder(match: re.Match) -> str:
-                pid = match.group(1)
-                if "#" in pid:
-                    return match.group(0)
-                image_link_hint = placeholders_map.get(pid) if isinstance(placeholders_map, dict) else None
-                cache_key = (pid, image_link_hint)
-                if cache_key in placeholder_lookup_cache:
-                    fetched_payload = placeholder_lookup_cache[cache_key]
-                else:
-                    fetched_payload = fetch_placeholder_payload(client, args.collection, pid, image_link_hint)
-                    placeholder_lookup_cache[cache_key] = fetched_payload
-                if fetched_payload:
-                    comp_type = (
-                        fetched_payload.get("record_type")
-                        or fetched_payload.get("component_type")
-                        or ""
-                    )
-                    body = (
-                        fetched_payload.get("original")
-                        or fetched_payload.get("text")
-                        or fetched_payload.get("content")
-                        or ""
-                    )
-                    # 비어있거나 No Description이면 사용하지 않음
-                    if not body or str(body).strip().lower() == "no description":
-                        pid_upper = pid.upper()
-                        if pid_upper.startswith("IMG"):
-                            return "[이미지 있음]"
-                        if pid_upper.startswith("TB"):
-                            return "[테이블 있음]"
-                        return "[참고 있음]"
-                    label = "[참고]"
-                    if "image" in str(comp_type):
-                        label = "[이미지 참고]"
-                    elif "table" in str(comp_type):
-                        label = "[테이블 참고]"
-                    if body:
-                        return f"{label} {body}"
-                # fallback: 적재 실패 시 플레이스홀더 존재만 표시
-                pid_upper = pid.upper()
-                if pid_upper.startswith("IMG"):
-                    return "[이미지 있음]"
-                if pid_upper.startswith("TB"):
-                    return "[테이블 있음]"
-                return "[참고 있음]"
-
-            new_text = ph_pattern.sub(replace_placeholder, text)
-            ctx = dict(ctx)
-            ctx["text"] = new_text
-            augmented.append(ctx)
-
-        prompt = build_prompt(question, augmented)
-        gen_start = time.monotonic()
-        answer = generate(
-            prompt, model=args.llm_model, url=args.ollama_url, temperature=DEFAULT_TEMPERATURE, max_tokens=DEFAULT_MAX_TOKENS
+    cassette: Optional[Cassette] = None
+    if args.cassette:
+        cassette = Cassette(args.cassette, args.cassette_mode, args.replay_latency)
+        install_cassette(cassette)
+        # 임베딩 캐시 hit이면 embed 호출이 기록되지 않아 다른 환경의 replay가 빗나간다.
+        args.no_embed_cache = True
+        print(f"[INFO] cassette {args.cassette_mode}: {args.cassette} (embed cache off)")
+    if args.backend == "local":
+        local_dir = args.local_index or default_index_dir(args.collection)
+        if args.export_local_index:
+            start = time.monotonic()
+            qdrant = connect_qdrant(args.qdrant_url, args.prefer_grpc, args.grpc_port)
+            export_local_index(qdrant, args.collection, local_dir, args.local_index_dtype)
+            qdrant.close()
+            print(f"[INFO] exported '{args.collection}' to {local_dir} ({time.monotonic() - start:.2f}s)")
+        client = LocalIndex(local_dir)
+        search_api = "local"
+        print(
+            f"[INFO] local index {local_dir}: {len(client)} points, dim={client.dim}, "
+            f"dtype={client.matrix.dtype}, distance={client.distance}"
+        )
+    else:
+        client = connect_qdrant(args.qdrant_url, args.prefer_grpc, args.grpc_port)
+        if cassette is not None and cassette.mode == "replay":
+            search_api = "replay"  # 검색 경로는 cassette 키에 들어가지 않으므로 probe 생략
+        else:
+            search_api = detect_search_api(client, args.collection, args.qdrant_url, batch=args.batch_search)
+    try:
+        args.dims = resolve_query_dims(client, args.collection, args.dims)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.dims:
+        print(f"[INFO] query embedding dims={args.dims}")
+    runtime = QARuntime(
+        client=client,
+        args=args,
+        search_params=search_params,
+        embed_sem=asyncio.Semaphore(args.embed_concurrency),
+        qdrant_sem=asyncio.Semaphore(args.search_concurrency),
+        gen_sem=asyncio.Semaphore(args.gen_concurrency),
+        placeholder_cache=PlaceholderCache(args.placeholder_cache_size),
+        search_api=search_api,
+        progress=progress,
+    )
+    print(f"[INFO] search_api={runtime.search_api}")
+    if not args.no_embed_cache:
+        runtime.embed_cache = EmbeddingCache(args.embed_cache)
+    if args.search_cache or args.answer_cache:
+        start = time.monotonic()
+        # local 인덱스는 export 시점 지문을 meta에 들고 있다 (같은 계산식)
+        runtime.collection_fp = (
+            client.fingerprint if isinstance(client, LocalIndex) else collection_fingerprint(client, args.collection)
+        )
+        print(f"[INFO] collection fingerprint {runtime.collection_fp[:12]} ({time.monotonic() - start:.2f}s)")
+    if args.search_cache:
+        runtime.search_cache = SearchResultCache(args.search_cache_path)
+        dropped = runtime.search_cache.drop_stale(args.collection, runtime.collection_fp)
+        print(f"[INFO] search cache: dropped {dropped} stale entries")
+    if args.answer_cache:
+        runtime.answer_cache = SemanticAnswerCache(
+            args.collection,
+            runtime.collection_fp,
+            answer_config_signature(args),
+            path=args.answer_cache_path,
+            threshold=args.answer_similarity,
+        )
+        print(f"[INFO] answer cache: dropped {runtime.answer_cache.dropped} stale entries")
+    if args.lexical != "off":
+        lexical_dir = args.lexical_index or default_lexical_dir(args.collection)
+        runtime.lexical = LexicalIndex(lexical_dir)
+        print(
+            f"[INFO] lexical index {lexical_dir}: {len(runtime.lexical)} records, "
+            f"{runtime.lexical.meta['terms']} n-grams (mode={args.lexical})"
+        )
+    if args.query_filter:
+        start = time.monotonic()
+        filenames = (
+            client.distinct_values("filename")
+            if isinstance(client, LocalIndex)
+            else collection_filenames(client, args.collection)
         )
-        gen_ms = (time.monotonic() - gen_start) * 1000
-        row[args.answer_col] = answer
-        # 간단한 evidence 로그/저장
-        ev_lines = []
-        for idx, ctx in enumerate(augmented, start=1):
-            meta = []
-            if ctx.get("doc_folder"):
-                meta.append(f"doc={ctx['doc_folder']}")
-            if ctx.get("record_type"):
-                meta.append(f"type={ctx['record_type']}")
-            if ctx.get("source_file"):
-                meta.append(f"file={Path(ctx['source_file']).name}")
-            if ctx.get("score") is not None:
-                meta.append(f"score={ctx['score']:.4f}")
-            meta.append(f"t_embed_ms={embed_ms:.1f} t_search_ms={search_ms:.1f} t_gen_ms={gen_ms:.1f}")
-            meta_part = " | ".join(meta)
-            text_part = ctx.get("text", "")
-            ev_lines.append(f"[{idx}] {meta_part}\n{text_part}")
-        evidence_text = "\n\n".join(ev_lines)
-        row[args.evidence_col] = evidence_text
-        per_row_embed_ms.append(embed_ms)
-        per_row_search_ms.append(search_ms)
-        per_row_gen_ms.append(gen_ms)
-        per_row_elapsed.append(time.monotonic() - row_start)
+        runtime.analyzer = QueryAnalyzer(filenames, args.query_filter_fields)
+        print(f"[INFO] query filter: {runtime.analyzer.stats()} ({time.monotonic() - start:.2f}s)")
+    pending = ["" if idx in done else q for idx, q in enumerate(questions)]
+    wall_start = time.monotonic()
+    try:
+        asyncio.run(run_questions(runtime, pending, args.max_inflight))
+    finally:
+        progress.close()
+        for cache in (runtime.embed_cache, runtime.search_cache, runtime.answer_cache, cassette):
+            if cache is not None:
+                cache.close()
+    wall_elapsed = time.monotonic() - wall_start
+    # 이번 실행분 + 이전 실행분 모두 로그에서 다시 읽어 CSV를 만든다.
+    answered = load_progress(progress_path, questions)
+    results: List[Optional[dict]] = [answered.get(idx) if q else None for idx, q in enumerate(questions)]
 
     fieldnames = list(rows[0].keys()) if rows else [qcol]
     # per-question total elapsed(sec) 컬럼 추가
     elapsed_col = "qa_elapsed_sec"
     embed_col = "qa_embed_ms"
     search_col = "qa_search_ms"
+    placeholder_col = "qa_placeholder_ms"
     gen_col = "qa_gen_ms"
-    for col in (args.answer_col, args.evidence_col, embed_col, search_col, gen_col, elapsed_col):
+    for col in (args.answer_col, args.evidence_col, embed_col, search_col, placeholder_col, gen_col, elapsed_col):
         if col not in fieldnames:
             fieldnames.append(col)
-    # Excel 호환을 위해 utf-8-sig로 BOM 포함 저장
-    default_out = args.csv.with_name("output.csv")
-    out_path = args.out_csv if args.out_csv else default_out
+    # --stream 시 생성 세부 지표 (값이 없으면 빈 칸)
+    stream_cols = {
+        "qa_ttft_ms": ("ttft_ms", "{:.1f}"),
+        "qa_tokens_per_sec": ("tokens_per_sec", "{:.2f}"),
+        "qa_prompt_eval_ms": ("prompt_eval_ms", "{:.1f}"),
+        "qa_eval_ms": ("eval_ms", "{:.1f}"),
+        "qa_early_stop": ("early_stop", "{:d}"),
+    }
+    if args.stream:
+        fieldnames.extend(col for col in stream_cols if col not in fieldnames)
+    # --pack-contexts 시 컨텍스트 토큰(추정치)과 절감량
+    pack_cols = {"qa_ctx_tokens": "ctx_tokens", "qa_ctx_tokens_saved": "ctx_tokens_saved"}
+    if args.pack_contexts:
+        fieldnames.extend(col for col in pack_cols if col not in fieldnames)
+    cached_col = "qa_answer_cached"
+    if args.answer_cache and cached_col not in fieldnames:
+        fieldnames.append(cached_col)
+    retrieval_col = "qa_retrieval"
+    if args.lexical != "off" and retrieval_col not in fieldnames:
+        fieldnames.append(retrieval_col)
+    filter_cols = {"qa_filter": "filter", "qa_filter_fallback": "filter_fallback", "qa_contexts": "contexts"}
+    if args.query_filter:
+        fieldnames.extend(col for col in filter_cols if col not in fieldnames)
     with out_path.open("w", newline="", encoding="utf-8-sig") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        if rows:
-            for idx, row in enumerate(rows):
-                if idx < len(per_row_elapsed):
-                    row[elapsed_col] = f"{per_row_elapsed[idx]:.3f}"
-                if idx < len(per_row_embed_ms):
-                    row[embed_col] = f"{per_row_embed_ms[idx]:.1f}"
-                if idx < len(per_row_search_ms):
-                    row[search_col] = f"{per_row_search_ms[idx]:.1f}"
-                if idx < len(per_row_gen_ms):
-                    row[gen_col] = f"{per_row_gen_ms[idx]:.1f}"
-                writer.writerow(row)
-    total_elapsed = sum(per_row_elapsed)
-    print(f"[DONE] Answers written to {out_path} (total_elapsed={total_elapsed:.2f}s, rows={len(rows)})")
+        for row, result in zip(rows, results):
+            if result is None:
+                row[args.answer_col] = ""
+            else:
+                row[args.answer_col] = result["answer"]
+                row[args.evidence_col] = result["evidence"]
+                row[elapsed_col] = f"{result['elapsed_sec']:.3f}"
+                row[embed_col] = f"{result['embed_ms']:.1f}"
+                row[search_col] = f"{result['search_ms']:.1f}"
+                row[placeholder_col] = f"{result['placeholder_ms']:.1f}"
+                row[gen_col] = f"{result['gen_ms']:.1f}"
+                if args.stream:
+                    for col, (key, fmt) in stream_cols.items():
+                        value = result.get(key)
+                        row[col] = fmt.format(value) if value is not None else ""
+                if args.pack_contexts:
+                    for col, key in pack_cols.items():
+                        row[col] = str(result.get(key, ""))
+                if args.answer_cache:
+                    row[cached_col] = "1" if result.get("answer_cached") else "0"
+                if args.lexical != "off":
+                    row[retrieval_col] = result.get("retrieval", "")
+                if args.query_filter:
+                    for col, key in filter_cols.items():
+                        value = result.get(key, "")
+                        row[col] = str(int(value)) if isinstance(value, bool) else str(value)
+            writer.writerow(row)
+    # total_elapsed는 질문별 소요 합(동시 실행 시 wall보다 큼)
+    total_elapsed = sum(r["elapsed_sec"] for r in results if r)
+    if args.pack_contexts:
+        saved = sum(r.get("ctx_tokens_saved", 0) for r in results if r)
+        kept = sum(r.get("ctx_tokens", 0) for r in results if r)
+        print(f"[PACK] ctx_tokens={kept} saved={saved} ({saved / max(kept + saved, 1):.1%}, estimated)")
+    print(
+        f"[DONE] Answers written to {out_path} "
+        f"(wall={wall_elapsed:.2f}s, total_elapsed={total_elapsed:.2f}s, rows={len(rows)}, "
+        f"{runtime.placeholder_cache.stats()})"
+    )
+    if args.lexical != "off":
+        routes = Counter(r.get("retrieval", "dense") for r in results if r)
+        print(
+            f"[LEXICAL] lexical={routes['lexical']} fused={routes['fused']} dense={routes['dense']} "
+            f"(min_match={args.lexical_min_match})"
+        )
+    if args.query_filter:
+        print(f"[FILTER] {filter_summary(results)}")
+    cache_stats = [
+        c.stats() for c in (runtime.embed_cache, runtime.search_cache, runtime.answer_cache, cassette) if c is not None
+    ]
+    if cache_stats:
+        print(f"[CACHE] {' '.join(cache_stats)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Query analyzer that turns document codes/titles, furnace numbers and question types into payload filters.
+
+질문에 "TP-030-050-030" 같은 표준 번호나 문서 제목이 있으면 그 문서(filename payload)만, "3고로"/"3BF"처럼
+고로 번호가 있으면 그 고로를 언급하거나 어느 고로도 언급하지 않는 레코드(furnace payload)만, "수식"/"표"를
+묻는 질문이면 해당 record_type만 검색하도록 Qdrant 필터를 만든다. 세 필드 모두 ingest가 기본으로 keyword
+payload index를 만드는 필드라 필터 검색도 인덱스를 탄다. 문서 목록은 시작 시 컬렉션에서 한 번 읽는다
+(facet, 구버전 서버면 scroll).
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+
+FILTER_FIELDS = ("filename", "record_type", "furnace")
+# 값 목록 payload(ingest가 본문에서 뽑은 고로 번호). 목록이 비었거나 없는 레코드(공통 내용)는 필터를 통과한다.
+LIST_FIELDS = ("furnace",)
+# 필터 결과가 없을 때 조건을 푸는 순서 (문서 조건을 가장 오래 유지)
+RELAX_ORDER = ("record_type", "furnace", "filename")
+FILENAME_FACET_LIMIT = 10000
+FILENAME_SCROLL_PAGE = 1024
+# 제목 일치는 공백 제거 후 이 글자 수 이상인 제목만 본다 ("고로"처럼 짧은 제목은 거의 모든 질문에 걸림)
+MIN_TITLE_CHARS = 4
+
+# 표준 번호: TP-030-050-030, TP 030-050-030, 030-050-030 (영문 접두어는 선택, 숫자 3자리 x3으로 비교)
+DOC_CODE_RE = re.compile(r"(?<![0-9])(\d{3})\s*-\s*(\d{3})\s*-\s*(\d{3})(?![0-9])")
+# filename에서 제목만 남기기: 개정 표기, 문서관리 시스템 id 접미어, 확장자
+_REV_RE = re.compile(r"\(\s*rev\.?\s*\d+\s*\)", re.IGNORECASE)
+_SYSTEM_SUFFIX_RE = re.compile(r"_[0-9a-f]{16}(?:_\w+)?$", re.IGNORECASE)
+_EXT_RE = re.compile(r"\.(?:pdf|md|json|docx?|hwp)$", re.IGNORECASE)
+_CODE_PREFIX_RE = re.compile(r"^[A-Za-z]{0,3}\s*-?\s*\d{3}\s*-\s*\d{3}\s*-\s*\d{3}")
+# 고로 번호: 3고로, 3 고로, 제3고로, 3호 고로, 3BF, #3 BF, 3·4고로. 앞이 숫자/하이픈이면 제외("TP-030-010-010 고로"의 제목 부분)
+FURNACE_RE = re.compile(
+    r"(?<![0-9A-Za-z-])(?:제\s*|#\s*)?([1-9](?:\s*[,·/]\s*[1-9])*)\s*(?:호\s*)?(?:고로|BF)(?![A-Za-z])", re.IGNORECASE
+)
+
+# 질문 유형 → record_type. 본문(text)은 특징적인 표현이 없고, text로 제한하면 표/수식 근거를 잃으므로 제한하지 않는다.
+QUESTION_TYPE_PATTERNS = {
+    "formula": (re.compile(r"수식|공식|계산식|산출식|산식"), ("image_formula",)),
+    # "표"는 단독 단어(조사 허용)일 때만: 표준/대표/목표 등 제외
+    "table": (
+        re.compile(r"테이블|기준표|조견표|(?<![가-힣])표(?:에서|에|의|를|는|로|가)?(?![가-힣])"),
+        ("table_str", "table_unstr"),
+    ),
+}
+
+
+def _squash(text: str) -> str:
+    return re.sub(r"\s+", "", text).lower()
+
+
+def doc_code_key(text: str) -> Optional[str]:
+    """문자열의 첫 표준 번호를 숫자 9자리 키로 ("TP-030-050-030" → "030050030")."""
+    m = DOC_CODE_RE.search(text)
+    return "".join(m.groups()) if m else None
+
+
+def furnace_numbers(text: str) -> List[str]:
+    """본문/질문에 나온 고로 번호 목록 ("3고로 및 4BF" → ["3", "4"]). ingest의 furnace payload와 질문 분석이 같이 쓴다."""
+    return sorted({num for m in FURNACE_RE.finditer(text) for num in re.findall(r"[1-9]", m.group(1))})
+
+
+def payload_value_matches(key: str, value, allowed: Sequence[str]) -> bool:
+    """필드 하나의 조건 판정. LIST_FIELDS는 값 중 하나라도 허용 값이거나 값이 없으면 일치."""
+    if key in LIST_FIELDS:
+        return not value or any(v in allowed for v in value)
+    return value in allowed
+
+
+def doc_title(filename: str) -> str:
+    """filename에서 번호/개정/시스템 접미어를 뗀 제목."""
+    name = _SYSTEM_SUFFIX_RE.sub("", _EXT_RE.sub("", filename.strip()))
+    name = _REV_RE.sub("", _CODE_PREFIX_RE.sub("", name))
+    return name.strip(" -_")
+
+
+@dataclass(frozen=True)
+class QueryFilter:
+    filenames: tuple = ()
+    record_types: tuple = ()
+    furnaces: tuple = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.filenames or self.record_types or self.furnaces)
+
+    def conditions(self) -> Dict[str, List[str]]:
+        """필드 → 허용 값 목록 (비어 있는 필드는 제외)."""
+        fields = {
+            "filename": list(self.filenames),
+            "record_type": list(self.record_types),
+            "furnace": list(self.furnaces),
+        }
+        return {key: values for key, values in fields.items() if values}
+
+    def to_qdrant(self) -> qmodels.Filter:
+        must = []
+        for key, values in self.conditions().items():
+            condition = qmodels.FieldCondition(key=key, match=qmodels.MatchAny(any=values))
+            if key in LIST_FIELDS:
+                # 해당 고로를 언급하거나, 어느 고로도 언급하지 않는 레코드
+                condition = qmodels.Filter(
+                    should=[condition, qmodels.IsEmptyCondition(is_empty=qmodels.PayloadField(key=key))]
+                )
+            must.append(condition)
+        return qmodels.Filter(must=must)
+
+    def matches(self, payload: dict) -> bool:
+        return all(payload_value_matches(key, payload.get(key), values) for key, values in self.conditions().items())
+
+    def relaxed(self) -> Optional["QueryFilter"]:
+        """결과가 없을 때 다음으로 시도할 필터: RELAX_ORDER 순서로 조건을 하나씩 빼고, 남는 조건이 없으면 None."""
+        fields = {"record_type": "record_types", "furnace": "furnaces", "filename": "filenames"}
+        for key in RELAX_ORDER:
+            if getattr(self, fields[key]):
+                return replace(self, **{fields[key]: ()}) or None
+        return None
+
+    def describe(self) -> str:
+        return " ".join(f"{key}={'|'.join(values)}" for key, values in self.conditions().items())
+
+
+class QueryAnalyzer:
+    """컬렉션 filename 목록으로 만든 번호/제목 사전으로 질문을 QueryFilter로 바꾼다. 정규식만 쓰므로 질문당 수십 µs."""
+
+    def __init__(self, filenames: Iterable[str], fields: Sequence[str] = FILTER_FIELDS) -> None:
+        self.fields = set(fields)
+        self.filenames = sorted({name for name in filenames if name})
+        self._by_code: Dict[str, List[str]] = {}
+        self._by_title: Dict[str, List[str]] = {}
+        for name in self.filenames:
+            code = doc_code_key(name)
+            if code:
+                self._by_code.setdefault(code, []).append(name)
+            title = _squash(doc_title(name))
+            if len(title) >= MIN_TITLE_CHARS:
+                self._by_title.setdefault(title, []).append(name)
+
+    def analyze(self, question: str) -> QueryFilter:
+        filenames: List[str] = []
+        if "filename" in self.fields:
+            for m in DOC_CODE_RE.finditer(question):
+                filenames.extend(self._by_code.get("".join(m.groups()), []))
+            squashed = _squash(question)
+            for title, names in self._by_title.items():
+                if title in squashed:
+                    filenames.extend(names)
+        record_types: List[str] = []
+        if "record_type" in self.fields:
+            for pattern, types in QUESTION_TYPE_PATTERNS.values():
+                if pattern.search(question):
+                    record_types.extend(types)
+        furnaces = furnace_numbers(question) if "furnace" in self.fields else []
+        return QueryFilter(tuple(sorted(set(filenames))), tuple(sorted(set(record_types))), tuple(furnaces))
+
+    def stats(self) -> str:
+        return f"{len(self.filenames)} documents, {len(self._by_code)} codes, {len(self._by_title)} titles"
+
+
+def collection_filenames(client: QdrantClient, collection: str) -> List[str]:
+    """컬렉션의 filename 값 목록. keyword index facet으로 읽고, 미지원 서버(<1.12)면 scroll."""
+    try:
+        hits = client.facet(collection_name=collection, key="filename", limit=FILENAME_FACET_LIMIT, exact=True).hits
+        return sorted(str(hit.value) for hit in hits)
+    except Exception:
+        pass
+    names = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=FILENAME_SCROLL_PAGE,
+            offset=offset,
+            with_payload=["filename"],
+            with_vectors=False,
+        )
+        for point in points:
+            name = (point.payload or {}).get("filename")
+            if name:
+                names.add(str(name))
+        if offset is None:
+            break
+    return sorted(names)